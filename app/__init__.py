@@ -1,9 +1,18 @@
 from flask import Flask
 
+from app.market import asgi as market_asgi
+from app.market import bulk as market_bulk
 from app.market import database as market_db
+from app.market import loadtest as market_loadtest
 from app.market import logger as market_logger
+from app.market import metrics as market_metrics
+from app.market import orders as market_orders
+from app.market import readmodel as market_readmodel
 from app.market import routes as market_routes
+from app.market import seed as market_seed
+from app.market import slowlog as market_slowlog
 from app.market import updates
+from app.market.config import MARKET_DB_URL, MARKET_UPDATER_IN_APP
 
 
 def create_app() -> Flask:
@@ -11,11 +20,28 @@ def create_app() -> Flask:
     app.config.from_pyfile('config.py')
 
     market_db.init_db()
+    market_orders.load_books()
+    market_readmodel.rebuild()
     market_db.init_app(app)
+    market_metrics.init_app(app)
+    market_bulk.init_app(app)
+    market_seed.init_app(app)
+    market_loadtest.init_app(app)
+    market_slowlog.init_app(app)
+    updates.init_app(app)
 
     market_logger.init()
 
     app.register_blueprint(market_routes.bp, url_prefix='/market')
 
-    updates.run_updates()
+    updates.run_follower()
+    if MARKET_UPDATER_IN_APP:
+        updates.run_updates()
     return app
+
+
+def create_asgi_app(db_url: str = MARKET_DB_URL) -> market_asgi.MarketApp:
+    '''
+    The same application for ASGI servers, e.g. 'uvicorn --factory app:create_asgi_app'
+    '''
+    return market_asgi.MarketApp(create_app(), db_url)
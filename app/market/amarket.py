@@ -0,0 +1,205 @@
+'''
+Async counterparts of market functions.
+
+Every function runs the same sync code from 'market', 'history' and 'batch'
+in AsyncSession by 'run_sync', so queries go through async driver
+(aiosqlite) and the event loop isn't blocked while SQLite works.
+'''
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar, Union
+
+from sqlalchemy import pool
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.market import batch, exceptions, groupcommit, history, market
+from app.market.config import (
+    MARKET_DB_POOL_CLASS,
+    MARKET_DB_POOL_SIZE,
+    MARKET_DB_PRAGMAS,
+    MARKET_DB_READ_POOL_SIZE,
+    MARKET_DB_URL,
+    MARKET_DB_WRITE_BEGIN,
+)
+from app.market.connections import is_file_db, set_pragmas, use_explicit_begin
+from app.market.database import SESSIONS, track_statements
+from app.market.logger import get_logger
+
+T = TypeVar('T')
+
+AsyncSessionFactory = sessionmaker(class_=AsyncSession)
+AsyncReadSessionFactory = sessionmaker(class_=AsyncSession)
+# Engines of 'write' and 'read' sessions, set by 'init_db'
+engines: dict[str, AsyncEngine] = {}
+
+# SQLite has one writer at a time, so writers wait in the event loop
+# instead of SQLite busy handler, which doesn't keep order of waiters
+write_lock: Optional[asyncio.Lock] = None
+
+
+async def init_db(url: str = MARKET_DB_URL) -> None:
+    '''
+    Schema is created by sync 'database.init_db'
+    '''
+    global write_lock  # pylint: disable=global-statement,invalid-name
+    await dispose_db()
+    write_lock = asyncio.Lock()
+
+    engine = make_async_engine(url)
+    if is_file_db(engine.sync_engine):
+        read_engine = make_async_engine(url, readonly=True)
+    else:
+        read_engine = engine
+
+    AsyncSessionFactory.configure(bind=engine)
+    AsyncReadSessionFactory.configure(bind=read_engine)
+    engines.update(write=engine, read=read_engine)
+
+
+async def dispose_db() -> None:
+    for engine in engines.values():
+        await engine.dispose()
+    engines.clear()
+    for factory in (AsyncSessionFactory, AsyncReadSessionFactory):
+        factory.configure(bind=None)
+
+
+def make_async_engine(url: str, readonly: bool = False) -> AsyncEngine:
+    async_url = make_url(url).set(drivername='sqlite+aiosqlite')
+
+    pool_class = getattr(pool, MARKET_DB_POOL_CLASS)
+    pool_args: dict[str, Any] = {}
+    if issubclass(pool_class, pool.QueuePool):
+        pool_class = pool.AsyncAdaptedQueuePool
+        pool_args['pool_size'] = (
+            MARKET_DB_READ_POOL_SIZE if readonly else MARKET_DB_POOL_SIZE
+        )
+
+    engine = create_async_engine(
+        async_url,
+        poolclass=pool_class,
+        connect_args={'check_same_thread': False},
+        **pool_args,
+    )
+
+    pragmas = dict(MARKET_DB_PRAGMAS)
+    if readonly:
+        pragmas['query_only'] = 'ON'
+    set_pragmas(engine.sync_engine, pragmas)
+    use_explicit_begin(
+        engine.sync_engine, 'BEGIN' if readonly else MARKET_DB_WRITE_BEGIN
+    )
+    # Statements run in the context of request, so they are counted in its stats
+    track_statements(engine.sync_engine)
+
+    return engine
+
+
+@asynccontextmanager
+async def create_session(readonly: bool = False) -> AsyncIterator[AsyncSession]:
+    if readonly or write_lock is None:
+        async with session_scope(readonly) as session:
+            yield session
+    else:
+        async with write_lock, session_scope(readonly) as session:
+            yield session
+
+    for callback in session.sync_session.info.pop('after_commit', []):
+        callback()
+
+
+@asynccontextmanager
+async def session_scope(readonly: bool) -> AsyncIterator[AsyncSession]:
+    kind = 'read' if readonly else 'write'
+    SESSIONS.inc(kind, 'open')
+    if readonly:
+        session = AsyncReadSessionFactory()
+    else:
+        session = AsyncSessionFactory()
+    try:
+        yield session
+        await session.commit()
+        SESSIONS.inc(kind, 'commit')
+    except SQLAlchemyError as error:
+        await session.rollback()
+        SESSIONS.inc(kind, 'rollback')
+        get_logger().error(error)
+        raise exceptions.DatabaseError(error) from error
+    except BaseException:
+        await session.rollback()
+        SESSIONS.inc(kind, 'rollback')
+        raise
+    finally:
+        await session.close()
+
+
+async def run(func: Callable[..., T], *args: Any, readonly: bool = False) -> T:
+    '''
+    Runs function decorated by 'db_session' in new async session
+    '''
+    unwrapped = inspect.unwrap(func)
+    async with create_session(readonly) as session:
+        return await session.run_sync(
+            lambda sync_session: unwrapped(*args, session=sync_session)
+        )
+
+
+async def get_users() -> list[dict[str, Any]]:
+    return await run(market.get_users, readonly=True)
+
+
+async def add_user(login: str) -> None:
+    await run(market.add_user, login)
+
+
+async def get_operations(login: str) -> list[dict[str, Any]]:
+    return await run(market.get_operations, login, readonly=True)
+
+
+async def get_operations_page(
+    login: str, after: Optional[str], limit: int
+) -> tuple[list[dict[str, Any]], Optional[str]]:
+    return await run(history.get_operations_page, login, after, limit, readonly=True)
+
+
+async def add_operation(
+    login: str,
+    crypto_name: str,
+    operation_type: str,
+    amount: int,
+    time_str: Union[str, datetime],
+) -> None:
+    args = (login, crypto_name, operation_type, amount, time_str)
+    if groupcommit.MARKET_GROUP_COMMIT:
+        # Event loop isn't blocked while the writer commits
+        await asyncio.wrap_future(groupcommit.submit(market.add_operation, *args))
+        return
+    await run(market.add_operation, *args)
+
+
+async def add_operations(
+    login: str, operations: list[dict[str, Any]], atomic: bool = True
+) -> list[dict[str, str]]:
+    async with create_session() as session:
+        return await session.run_sync(batch.apply_operations, login, operations, atomic)
+
+
+async def get_balance(login: str) -> dict[str, int]:
+    return await run(market.get_balance, login, readonly=True)
+
+
+async def get_portfolio(login: str) -> list[dict[str, Any]]:
+    return await run(market.get_portfolio, login, readonly=True)
+
+
+async def get_crypto() -> list[dict[str, Any]]:
+    return await run(market.get_crypto, readonly=True)
+
+
+async def add_crypto(crypto_name: str, purchase_cost: int, sale_cost: int) -> None:
+    await run(market.add_crypto, crypto_name, purchase_cost, sale_cost)
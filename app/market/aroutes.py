@@ -0,0 +1,202 @@
+'''
+Async handlers of the main routes with the same JSON as 'routes.bp'.
+
+Handlers are served by 'asgi.MarketApp' and use 'amarket'. Path parameters
+are passed by name, the request only to handlers taking 'request'. Handler
+returns None to pass the request to the Flask application.
+'''
+import functools
+import inspect
+import json
+import re
+from datetime import date
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+from urllib.parse import parse_qsl
+
+from werkzeug.http import http_date
+
+from app.market import amarket, exceptions, schemas
+from app.market.config import MARKET_PAGE_MAX_SIZE, MARKET_PAGE_SIZE
+
+Scope = dict[str, Any]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int) -> None:
+        self.status = status
+        super().__init__(status)
+
+
+class Request(NamedTuple):
+    method: str
+    args: dict[str, str]
+    headers: dict[str, str]
+    body: bytes
+
+    @classmethod
+    def from_scope(cls, scope: Scope, body: bytes) -> 'Request':
+        return cls(
+            scope['method'],
+            dict(parse_qsl(scope['query_string'].decode('latin-1'))),
+            {
+                k.decode('latin-1').lower(): v.decode('latin-1')
+                for k, v in scope['headers']
+            },
+            body,
+        )
+
+    def get_json(self) -> Any:
+        '''
+        Like 'flask.Request.get_json': 415 for other content type, 400 for bad JSON
+        '''
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip()
+        if mimetype != 'application/json' and not mimetype.endswith('+json'):
+            raise HTTPError(415)
+        try:
+            return json.loads(self.body)
+        except ValueError as error:
+            raise HTTPError(400) from error
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes = b''
+    headers: tuple[tuple[str, str], ...] = ()
+
+
+Handler = Callable[..., Awaitable[Optional[Response]]]
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def json_response(
+    data: Any, status: int = 200, headers: tuple[tuple[str, str], ...] = ()
+) -> Response:
+    # The same output as 'flask.jsonify' in production mode
+    body = json.dumps(data, default=json_default, sort_keys=True, separators=(',', ':'))
+    return Response(
+        status, f'{body}\n'.encode(), (('content-type', 'application/json'),) + headers
+    )
+
+
+async def users_get() -> Response:
+    return json_response(await amarket.get_users())
+
+
+async def users_post(request: Request) -> Response:
+    data = schemas.user(request.get_json())
+
+    await amarket.add_user(data['login'])
+    return Response(201)
+
+
+async def operations_get(request: Request, login: str) -> Optional[Response]:
+    if 'stream' in request.args:
+        # Streaming is served by Flask application
+        return None
+    if 'after' not in request.args and 'limit' not in request.args:
+        return json_response(await amarket.get_operations(login))
+
+    try:
+        limit = int(request.args.get('limit', MARKET_PAGE_SIZE))
+    except ValueError:
+        return Response(422)
+    if not 0 < limit <= MARKET_PAGE_MAX_SIZE:
+        return Response(422)
+
+    operations, cursor = await amarket.get_operations_page(
+        login, request.args.get('after'), limit
+    )
+    headers = (('x-next-cursor', cursor),) if cursor is not None else ()
+    return json_response(operations, headers=headers)
+
+
+async def operations_post(request: Request, login: str) -> Response:
+    data = schemas.operation(request.get_json())
+
+    await amarket.add_operation(login, **data)
+    return Response(201)
+
+
+async def operations_batch_post(request: Request, login: str) -> Response:
+    data = schemas.operations_batch(request.get_json())
+
+    try:
+        results = await amarket.add_operations(
+            login, data['operations'], data['atomic']
+        )
+    except exceptions.BatchError as error:
+        return json_response(error.results, 400)
+
+    status = 201 if all(result['status'] == 'ok' for result in results) else 207
+    return json_response(results, status)
+
+
+async def balance_get(login: str) -> Response:
+    return json_response(await amarket.get_balance(login))
+
+
+async def portfolio_get(login: str) -> Response:
+    return json_response(await amarket.get_portfolio(login))
+
+
+async def crypto_get() -> Response:
+    return json_response(await amarket.get_crypto())
+
+
+async def crypto_post(request: Request) -> Response:
+    data = schemas.crypto(request.get_json())
+
+    await amarket.add_crypto(**data)
+    return Response(201)
+
+
+# Rules are the same as rules of Flask routes, so they are the same labels
+# of request metrics
+ROUTES: list[tuple[str, dict[str, Handler]]] = [
+    ('/market/users', {'GET': users_get, 'POST': users_post}),
+    (
+        '/market/users/<string:login>/operations',
+        {'GET': operations_get, 'POST': operations_post},
+    ),
+    (
+        '/market/users/<string:login>/operations/batch',
+        {'POST': operations_batch_post},
+    ),
+    ('/market/users/<string:login>/balance', {'GET': balance_get}),
+    ('/market/users/<string:login>/portfolio', {'GET': portfolio_get}),
+    ('/market/crypto', {'GET': crypto_get, 'POST': crypto_post}),
+]
+
+
+class Route(NamedTuple):
+    rule: str
+    pattern: re.Pattern[str]
+    handlers: dict[str, Handler]
+
+
+def compile_routes() -> list[Route]:
+    return [
+        Route(
+            rule,
+            re.compile('^' + re.sub(r'<(?:\w+:)?(\w+)>', r'(?P<\1>[^/]+)', rule) + '$'),
+            handlers,
+        )
+        for rule, handlers in ROUTES
+    ]
+
+
+def is_stream(path: str, request: Request) -> bool:
+    '''
+    Response of Flask application is streamed: rate feed or operations stream
+    '''
+    return path == '/market/crypto/stream' or 'stream' in request.args
+
+
+@functools.cache
+def takes_request(handler: Handler) -> bool:
+    return 'request' in inspect.signature(handler).parameters
@@ -0,0 +1,214 @@
+'''
+ASGI application with the same routes and JSON as 'routes.bp'.
+
+Main routes are served by async handlers of 'aroutes', other routes
+and methods are passed to the Flask application in a worker thread,
+which reads the request body as it arrives.
+'''
+import asyncio
+import io
+import threading
+from typing import Any, Iterable, Optional
+
+from flask import Flask
+
+from app.market import amarket, exceptions, metrics
+from app.market.aroutes import (
+    Handler,
+    HTTPError,
+    Request,
+    Response,
+    Scope,
+    compile_routes,
+    is_stream,
+    json_response,
+    takes_request,
+)
+from app.market.config import MARKET_ASGI_MAX_STREAMS, MARKET_DB_URL
+from app.market.logger import get_logger
+from app.market.wsgibridge import (
+    Receive,
+    ReceiveStream,
+    Send,
+    forward,
+    wsgi_environ,
+)
+
+
+class MarketApp:
+    '''
+    ASGI application. 'db_url' is used for async engine at startup.
+    Streams of Flask application hold worker threads, so at most
+    'max_streams' run at once, others get 503.
+    '''
+
+    def __init__(
+        self,
+        flask_app: Flask,
+        db_url: str = MARKET_DB_URL,
+        max_streams: int = MARKET_ASGI_MAX_STREAMS,
+    ) -> None:
+        self.flask_app = flask_app
+        self.db_url = db_url
+        self.routes = compile_routes()
+        self.max_streams = max_streams
+        self.streams = 0
+        # Servers without lifespan support start the engine on a request
+        self.init_lock = asyncio.Lock()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        handler, rule, params = self.match(scope['method'], scope['path'])
+        if handler is None:
+            # Body is left for the Flask application
+            request = Request.from_scope(scope, b'')
+            await self.pass_to_flask(scope, request, None, receive, send)
+            return
+
+        body = await read_body(receive)
+        request = Request.from_scope(scope, body)
+        if takes_request(handler):
+            params['request'] = request
+        metrics.request_stats.start()
+        response = await self.handle(handler, params)
+        if response is None:
+            await self.pass_to_flask(scope, request, body, receive, send)
+            return
+        metrics.request_stats.finish(rule, request.method, response.status)
+        await send_response(send, response)
+
+    async def pass_to_flask(
+        self,
+        scope: Scope,
+        request: Request,
+        body: Optional[bytes],
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if not is_stream(scope['path'], request):
+            await self.call_flask(scope, body, receive, send)
+        elif self.streams >= self.max_streams:
+            await send_response(send, Response(503, headers=(('retry-after', '1'),)))
+        else:
+            self.streams += 1
+            try:
+                await self.call_flask(scope, body, receive, send)
+            finally:
+                self.streams -= 1
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await amarket.init_db(self.db_url)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await amarket.dispose_db()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def match(
+        self, method: str, path: str
+    ) -> tuple[Optional[Handler], str, dict[str, Any]]:
+        '''
+        Handler, rule and parameters of the route matching 'path'
+        '''
+        for route in self.routes:
+            match = route.pattern.match(path)
+            if match is not None:
+                return route.handlers.get(method), route.rule, match.groupdict()
+        return None, '', {}
+
+    async def handle(
+        self, handler: Handler, params: dict[str, Any]
+    ) -> Optional[Response]:
+        if not amarket.engines:
+            async with self.init_lock:
+                # Concurrent requests would dispose the engines of each other
+                if not amarket.engines:
+                    await amarket.init_db(self.db_url)
+        try:
+            return await handler(**params)
+        except HTTPError as error:
+            return Response(error.status)
+        except exceptions.ValidationError as error:
+            return json_response(error.as_dict(), 422)
+        except exceptions.MarketError as error:
+            return json_response({'message': str(error)}, 400)
+        except exceptions.DatabaseError as error:
+            return json_response({'message': str(error)}, 500)
+
+    async def call_flask(
+        self, scope: Scope, body: Optional[bytes], receive: Receive, send: Send
+    ) -> None:
+        '''
+        Runs Flask application in one worker thread and streams its response.
+        Without 'body' the worker reads it from 'receive'. After the client
+        disconnects the worker closes the response at its next chunk, so
+        streams end with their connections.
+        '''
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[tuple[str, Any]] = asyncio.Queue(maxsize=16)
+        disconnected = threading.Event()
+        stream = ReceiveStream(receive, loop, body)
+
+        def put(item: tuple[str, Any]) -> None:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(
+            status: str, headers: list[tuple[str, str]], _exc_info: Any = None
+        ) -> None:
+            put(('start', (int(status.split(' ', 1)[0]), headers)))
+
+        def put_chunks(result: Iterable[bytes]) -> None:
+            try:
+                for chunk in result:
+                    if disconnected.is_set():
+                        break
+                    put(('body', chunk))
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        def run() -> None:
+            try:
+                result = self.flask_app.wsgi_app(
+                    wsgi_environ(scope, io.BufferedReader(stream)), start_response
+                )
+                # Messages after the body are read by watcher
+                stream.finish()
+                put_chunks(result)
+            except Exception as error:  # pylint: disable=broad-except
+                get_logger().error(error)
+            finally:
+                put(('end', None))
+
+        worker = loop.run_in_executor(None, run)
+        watcher = asyncio.ensure_future(stream.wait_disconnect())
+        watcher.add_done_callback(lambda _: disconnected.set())
+        try:
+            await forward(queue, send, disconnected)
+        finally:
+            watcher.cancel()
+            await worker
+
+
+async def read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def send_response(send: Send, response: Response) -> None:
+    headers = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in response.headers]
+    headers.append((b'content-length', str(len(response.body)).encode()))
+    await send(
+        {'type': 'http.response.start', 'status': response.status, 'headers': headers}
+    )
+    await send({'type': 'http.response.body', 'body': response.body})
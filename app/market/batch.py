@@ -0,0 +1,49 @@
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.market import exceptions
+from app.market.database import create_session, savepoint
+from app.market.trading import apply_operation
+
+OPERATION_FIELDS = ('crypto_name', 'operation_type', 'amount', 'time_str')
+
+
+def add_operations(
+    login: str, operations: list[dict[str, Any]], atomic: bool = True
+) -> list[dict[str, str]]:
+    with create_session() as session:
+        results = apply_operations(session, login, operations, atomic)
+
+    return results
+
+
+def apply_operations(
+    session: Session, login: str, operations: list[dict[str, Any]], atomic: bool
+) -> list[dict[str, str]]:
+    '''
+    Applies operations in one transaction, every operation in its own
+    SAVEPOINT. If 'atomic' is set and any operation fails, BatchError with
+    per-item results is raised, so the whole batch is rolled back.
+    '''
+    results = []
+    for operation in operations:
+        try:
+            with savepoint(session):
+                apply_operation(
+                    session, login, *(operation[f] for f in OPERATION_FIELDS)
+                )
+        except (exceptions.MarketError, exceptions.DatabaseError) as error:
+            results.append({'status': 'error', 'error': str(error)})
+        else:
+            results.append({'status': 'ok'})
+
+    if atomic and any(r['status'] == 'error' for r in results):
+        raise exceptions.BatchError(
+            [
+                r if r['status'] == 'error' else {'status': 'rolled_back'}
+                for r in results
+            ]
+        )
+
+    return results
@@ -0,0 +1,166 @@
+import json
+from itertools import islice
+from typing import IO, Any, Callable, Iterable, Iterator, Optional, Union
+
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from app.market import exceptions, schemas
+from app.market.cache import rates, users
+from app.market.config import MARKET_BULK_CHUNK_SIZE
+from app.market.database import Base, create_session
+from app.market.models import Crypto, User
+
+# Row of input -> values of model, ValidationError is raised if row is invalid
+Converter = Callable[[Any], dict[str, Any]]
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(bulk_add_users_command)
+    app.cli.add_command(bulk_add_crypto_command)
+
+
+def parse_ndjson(lines: Iterable[Union[str, bytes]]) -> Iterator[Any]:
+    '''
+    Lazily parses JSON object per line, invalid lines are turned into None
+    '''
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def add_users(
+    rows: Iterable[Any], chunk_size: int = MARKET_BULK_CHUNK_SIZE
+) -> dict[str, Any]:
+    '''
+    Rows are {"login": ...} objects like in POST /market/users
+    '''
+    return bulk_insert(
+        User, 'login', 'login', user_values, rows, chunk_size, users.set_incomplete
+    )
+
+
+def add_crypto(
+    rows: Iterable[Any], chunk_size: int = MARKET_BULK_CHUNK_SIZE
+) -> dict[str, Any]:
+    '''
+    Rows are {"crypto_name": ..., "purchase_cost": ..., "sale_cost": ...}
+    objects like in POST /market/crypto
+    '''
+    return bulk_insert(
+        Crypto, 'name', 'crypto_name', crypto_values, rows, chunk_size, rates.invalidate
+    )
+
+
+def user_values(row: Any) -> dict[str, Any]:
+    return schemas.user(row)
+
+
+def crypto_values(row: Any) -> dict[str, Any]:
+    data = schemas.crypto(row)
+    return {
+        'name': data['crypto_name'],
+        'purchase_cost': data['purchase_cost'],
+        'sale_cost': data['sale_cost'],
+    }
+
+
+def bulk_insert(
+    model: Base,
+    key: str,
+    field: str,
+    to_values: Converter,
+    rows: Iterable[Any],
+    chunk_size: int,
+    on_commit: Optional[Callable[[], None]] = None,
+) -> dict[str, Any]:
+    '''
+    Inserts rows by chunks, one multi-row INSERT and one commit per chunk.
+    Rows violating unique 'key' are reported as conflicts by their index
+    in input, rows rejected by 'to_values' are reported as invalid with
+    errors of their schema.
+    'on_commit' is called after every committed chunk.
+    '''
+    report: dict[str, Any] = {'created': 0, 'conflicts': [], 'invalid': []}
+
+    indexed_rows = enumerate(rows)
+    while chunk := list(islice(indexed_rows, chunk_size)):
+        valid: dict[Any, tuple[int, dict[str, Any]]] = {}
+        for index, row in chunk:
+            try:
+                values = to_values(row)
+            except exceptions.ValidationError as error:
+                report['invalid'].append({'row': index, 'errors': error.errors})
+                continue
+            if values[key] in valid:
+                report['conflicts'].append({'row': index, field: values[key]})
+            else:
+                valid[values[key]] = (index, values)
+
+        if valid:
+            report['created'] += insert_chunk(model, key, field, valid, report)
+            if on_commit is not None:
+                on_commit()
+
+    return report
+
+
+def insert_chunk(
+    model: Base,
+    key: str,
+    field: str,
+    valid: dict[Any, tuple[int, dict[str, Any]]],
+    report: dict[str, Any],
+) -> int:
+    column = getattr(model, key)
+    with create_session() as session:
+        existing = session.execute(select(column).where(column.in_(list(valid))))
+        for value in existing.scalars():
+            index, _ = valid.pop(value)
+            report['conflicts'].append({'row': index, field: value})
+
+        if not valid:
+            return 0
+
+        # Rows inserted concurrently after SELECT are skipped, not failed
+        statement = (
+            insert(model)
+            .values([values for _, values in valid.values()])
+            .on_conflict_do_nothing(index_elements=[key])
+        )
+        created = session.execute(statement).rowcount
+
+    return int(created)
+
+
+def echo_report(report: dict[str, Any]) -> None:
+    click.echo(json.dumps(report))
+
+
+@click.command('bulk-add-users')
+@click.argument('file', type=click.File('r'))
+@click.option('--chunk-size', default=MARKET_BULK_CHUNK_SIZE, show_default=True)
+@with_appcontext
+def bulk_add_users_command(file: IO[str], chunk_size: int) -> None:
+    '''
+    Register users from NDJSON FILE ('-' for stdin)
+    '''
+    echo_report(add_users(parse_ndjson(file), chunk_size))
+
+
+@click.command('bulk-add-crypto')
+@click.argument('file', type=click.File('r'))
+@click.option('--chunk-size', default=MARKET_BULK_CHUNK_SIZE, show_default=True)
+@with_appcontext
+def bulk_add_crypto_command(file: IO[str], chunk_size: int) -> None:
+    '''
+    Add crypto from NDJSON FILE ('-' for stdin)
+    '''
+    echo_report(add_crypto(parse_ndjson(file), chunk_size))
@@ -0,0 +1,276 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Iterable, NamedTuple, Optional
+
+from app.market.config import MARKET_RATE_CACHE_MAX_AGE, MARKET_READ_MODEL_MAX_AGE
+from app.market.orderbook import books
+
+
+class Rate(NamedTuple):
+    # Field order matches the columns of 'crypto' table,
+    # so '_asdict()' gives the same dict as 'serialized()'
+    id: int
+    name: str
+    purchase_cost: int
+    sale_cost: int
+    last_updated: datetime
+
+
+class RateTable:
+    '''
+    Versioned in-memory copy of 'crypto' table.
+
+    Readers get immutable snapshots without locking, writers replace
+    the whole dict under the lock and bump the version. Loads from DB
+    are stored only if no publish happened while they were running.
+    Listeners get rates which differ from the stored ones. Rates may be
+    updated by another process, so they are fresh for 'max_age' after
+    they were stored.
+    '''
+
+    def __init__(
+        self, max_age: float = MARKET_RATE_CACHE_MAX_AGE.total_seconds()
+    ) -> None:
+        self._lock = threading.Lock()
+        self._rates: dict[str, Rate] = {}
+        # time.monotonic() of storing rate, by name
+        self._stored: dict[str, float] = {}
+        self._complete = False
+        self._synced_at = 0.0
+        self._max_age = max_age
+        self._listeners: list[Callable[[list[Rate]], Any]] = []
+        self.version = 0
+
+    def get(self, name: str) -> Optional[Rate]:
+        return self._rates.get(name)
+
+    def fresh(self, name: str) -> Optional[Rate]:
+        '''
+        Returns rate stored within 'max_age' or None
+        '''
+        rate, stored = self._rates.get(name), self._stored.get(name)
+        if rate is None or stored is None or time.monotonic() - stored >= self._max_age:
+            return None
+        return rate
+
+    def all(self) -> Optional[list[Rate]]:
+        '''
+        Returns all rates or None if the table isn't fully loaded
+        or wasn't synced within 'max_age'
+        '''
+        by_name, complete = self._rates, self._complete
+        if not complete or time.monotonic() - self._synced_at >= self._max_age:
+            return None
+        return list(by_name.values())
+
+    def publish(self, committed: Iterable[Rate], complete: bool = False) -> None:
+        '''
+        Publishes committed rates. 'complete' means that 'committed'
+        are all rows of the table and replace current content.
+        '''
+        with self._lock:
+            self._publish(committed, complete)
+
+    def store(
+        self, loaded: Iterable[Rate], version: int, complete: bool = False
+    ) -> None:
+        '''
+        Stores rates loaded from DB if table is still at 'version'
+        '''
+        with self._lock:
+            if version == self.version:
+                self._publish(loaded, complete)
+
+    def listen(self, callback: Callable[[list[Rate]], Any]) -> None:
+        '''
+        Calls 'callback' with changed rates after they are stored,
+        in the order of changes
+        '''
+        self._listeners.append(callback)
+
+    def _publish(self, published: Iterable[Rate], complete: bool) -> None:
+        new_rates = {} if complete else dict(self._rates)
+        new_stored = {} if complete else dict(self._stored)
+        now = time.monotonic()
+        changed = []
+        for rate in published:
+            if self._rates.get(rate.name) != rate:
+                changed.append(rate)
+            new_rates[rate.name] = rate
+            new_stored[rate.name] = now
+
+        self._rates, self._stored = new_rates, new_stored
+        self.version += 1
+        if complete:
+            self._complete = True
+            self._synced_at = now
+        if changed:
+            for callback in self._listeners:
+                callback(changed)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is not None:
+                new_rates = dict(self._rates)
+                new_rates.pop(name, None)
+                self._rates = new_rates
+            self._complete = False
+            self.version += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rates = {}
+            self._stored = {}
+            self._complete = False
+            self.version += 1
+
+
+class UserIds:
+    '''
+    In-memory login -> user id map. Ids never change for existing
+    login, so only deletion of users requires 'reset()'.
+    '''
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+
+    def get(self, login: str) -> Optional[int]:
+        return self._ids.get(login)
+
+    def put(self, login: str, user_id: int) -> None:
+        self._ids[login] = user_id
+
+    def invalidate(self, login: str) -> None:
+        self._ids.pop(login, None)
+
+    def reset(self) -> None:
+        self._ids = {}
+
+
+class Rollup:
+    '''
+    Cached end of the last rolled up candle of the first level,
+    0 until the first rollup of this process.
+    '''
+
+    def __init__(self) -> None:
+        self.until = 0
+
+    def reset(self) -> None:
+        self.until = 0
+
+
+class UserSnapshot(NamedTuple):
+    id: int
+    login: str
+    balance: int
+    # (crypto_id, amount) ordered by crypto_id
+    portfolio: tuple[tuple[int, int], ...]
+    # time.monotonic() before it was read from DB
+    loaded: float
+
+
+class UserTable:
+    '''
+    In-memory users with their balances and portfolios. A snapshot of user
+    is read by one transaction, so its balance and portfolio are consistent.
+
+    Snapshot is fresh until its user is changed by this process or it's
+    older than 'max_age'. Readers get snapshots without locking, writers
+    change dicts under the lock and never replace a snapshot by an older one.
+    '''
+
+    def __init__(self, max_age: float = MARKET_READ_MODEL_MAX_AGE) -> None:
+        self._lock = threading.Lock()
+        self._users: dict[str, UserSnapshot] = {}
+        # time.monotonic() of the last commit changing user, by id
+        self._changed: dict[int, float] = {}
+        # Ids of changed users whose snapshots weren't reloaded yet
+        self._stale: set[int] = set()
+        # time.monotonic() before all users were read
+        self._complete_at: Optional[float] = None
+        self.max_age = max_age
+
+    def get(self, login: str) -> Optional[UserSnapshot]:
+        snapshot = self._users.get(login)
+        if snapshot is None or not self.is_fresh(snapshot):
+            return None
+        return snapshot
+
+    def all(self) -> Optional[list[UserSnapshot]]:
+        '''
+        Returns all users by id, users of 'stale()' among them, or None
+        if all users weren't read within 'max_age'. Snapshots aren't
+        older than the read of all users, so only changed ones are stale.
+        '''
+        complete_at = self._complete_at
+        if complete_at is None or time.monotonic() - complete_at >= self.max_age:
+            return None
+        return sorted(self._users.values(), key=lambda snapshot: snapshot.id)
+
+    def stale(self) -> set[int]:
+        with self._lock:
+            return set(self._stale)
+
+    def is_fresh(self, snapshot: UserSnapshot) -> bool:
+        return (
+            time.monotonic() - snapshot.loaded < self.max_age
+            and snapshot.loaded > self._changed.get(snapshot.id, -1.0)
+        )
+
+    def store(self, snapshots: Iterable[UserSnapshot]) -> None:
+        with self._lock:
+            for snapshot in snapshots:
+                stored = self._users.get(snapshot.login)
+                if stored is None or stored.loaded < snapshot.loaded:
+                    self._users[snapshot.login] = snapshot
+                if snapshot.loaded > self._changed.get(snapshot.id, -1.0):
+                    self._stale.discard(snapshot.id)
+
+    def store_all(self, snapshots: Iterable[UserSnapshot], loaded: float) -> None:
+        '''
+        Replaces all users by 'snapshots' read at 'loaded', users
+        stored while they were read are kept
+        '''
+        with self._lock:
+            by_login = {snapshot.login: snapshot for snapshot in snapshots}
+            for login, stored in self._users.items():
+                if stored.loaded > loaded:
+                    by_login[login] = stored
+            self._users = by_login
+            self._stale = {
+                user_id for user_id in self._stale if self._changed[user_id] >= loaded
+            }
+            self._complete_at = loaded
+
+    def invalidate(self, ids: Iterable[int]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for user_id in ids:
+                self._changed[user_id] = now
+                self._stale.add(user_id)
+
+    def set_incomplete(self) -> None:
+        self._complete_at = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._users = {}
+            self._changed = {}
+            self._stale = set()
+            self._complete_at = None
+
+
+rates = RateTable()
+user_ids = UserIds()
+users = UserTable()
+rolled = Rollup()
+
+
+def reset() -> None:
+    rates.reset()
+    user_ids.reset()
+    users.reset()
+    books.reset()
+    rolled.reset()
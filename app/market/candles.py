@@ -0,0 +1,296 @@
+import calendar
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from flask import Blueprint, Response, jsonify, request
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.market import exceptions
+from app.market.cache import Rate, rolled
+from app.market.config import (
+    MARKET_CANDLE_INTERVALS,
+    MARKET_CANDLE_MAX_COUNT,
+    MARKET_PAGE_SIZE,
+    MARKET_RATE_RETENTION,
+)
+from app.market.database import create_session, db_read_session
+from app.market.models import Crypto, RateCandle, RateRollup, RateTick, fields
+from app.market.schemas import MAX_INT
+
+bp = Blueprint('candles', __name__)
+
+# Rollup levels, candles of every level are built from the previous one
+INTERVALS = sorted(MARKET_CANDLE_INTERVALS.values())
+# (start, purchase_open, ..., sale_close)
+CANDLE_FIELDS = fields(RateCandle)[2:]
+
+Candle = tuple[int, ...]
+
+
+def unix_time(time: datetime) -> int:
+    return calendar.timegm(time.utctimetuple())
+
+
+def record_ticks(session: Session, rates: Iterable[Rate]) -> None:
+    '''
+    Adds costs of updated rates to history by one executemany INSERT
+    '''
+    values = [
+        {
+            'crypto_id': rate.id,
+            'time': unix_time(rate.last_updated),
+            'purchase_cost': rate.purchase_cost,
+            'sale_cost': rate.sale_cost,
+        }
+        for rate in rates
+    ]
+    if not values:
+        return
+
+    statement = insert(RateTick)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[RateTick.crypto_id, RateTick.time],
+            set_={
+                'purchase_cost': statement.excluded.purchase_cost,
+                'sale_cost': statement.excluded.sale_cost,
+            },
+        ),
+        values,
+    )
+
+
+def source(level: int) -> tuple[list[Any], list[Any]]:
+    '''
+    Columns (crypto_id, time, purchase OHLC, sale OHLC) and filter of rows
+    which candles of 'level' are built from. Tick is a candle of one cost.
+    '''
+    if level == 0:
+        purchase, sale = RateTick.purchase_cost, RateTick.sale_cost
+        columns = [RateTick.crypto_id, RateTick.time]
+        return columns + [purchase] * 4 + [sale] * 4, []
+
+    columns = [getattr(RateCandle, field) for field in fields(RateCandle)]
+    return columns[:1] + columns[2:], [RateCandle.interval == INTERVALS[level - 1]]
+
+
+def rollup_query(level: int, since: int, until: int) -> Any:
+    '''
+    OHLC of 'level' for all crypto in [since, until) by window functions
+    '''
+    (crypto_id, time, *ohlc), where = source(level)
+    interval = INTERVALS[level]
+    start = time - time % interval
+    window = {
+        'partition_by': (crypto_id, start),
+        'order_by': time,
+        'rows': (None, None),
+    }
+
+    aggregates = []
+    for open_, high, low, close in (ohlc[:4], ohlc[4:]):
+        aggregates += [
+            func.first_value(open_).over(**window),
+            func.max(high).over(**window),
+            func.min(low).over(**window),
+            func.last_value(close).over(**window),
+        ]
+
+    return (
+        select(crypto_id, literal(interval), start, *aggregates)
+        .where(*where, time >= since, time < until)
+        .distinct()
+    )
+
+
+def rollup(now: Optional[datetime] = None) -> dict[int, int]:
+    '''
+    Builds complete candles of every level which aren't built yet and
+    deletes rows older than retention. Returns new watermarks by interval.
+    '''
+    now_time = unix_time(now or datetime.utcnow())
+
+    with create_session() as session:
+        watermarks = dict(
+            session.execute(select(RateRollup.interval, RateRollup.until)).all()
+        )
+
+        source_until = now_time
+        for level, interval in enumerate(INTERVALS):
+            since = watermarks.get(interval, 0)
+            until = source_until - source_until % interval
+            if until > since:
+                session.execute(
+                    insert(RateCandle)
+                    .prefix_with('OR REPLACE')
+                    .from_select(fields(RateCandle), rollup_query(level, since, until))
+                )
+                watermarks[interval] = until
+            source_until = watermarks.get(interval, 0)
+
+        statement = insert(RateRollup)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[RateRollup.interval],
+                set_={'until': statement.excluded.until},
+            ),
+            [{'interval': i, 'until': until} for i, until in watermarks.items()],
+        )
+        prune(session, now_time, watermarks)
+
+    rolled.until = watermarks.get(INTERVALS[0], 0)
+    return watermarks
+
+
+def rollup_if_due(now: Optional[datetime] = None) -> None:
+    now_time = unix_time(now or datetime.utcnow())
+    # Rollup is done when the first level has a new complete candle
+    if now_time - now_time % INTERVALS[0] > rolled.until:
+        rollup(now)
+
+
+def prune(session: Session, now_time: int, watermarks: dict[int, int]) -> None:
+    '''
+    Rows are kept until they are rolled up into the next level
+    '''
+    for level, interval in enumerate([0] + INTERVALS):
+        retention = MARKET_RATE_RETENTION.get(interval)
+        if retention is None:
+            continue
+
+        limit = now_time - int(retention.total_seconds())
+        if level < len(INTERVALS):
+            limit = min(limit, watermarks.get(INTERVALS[level], 0))
+
+        if interval == 0:
+            session.execute(delete(RateTick).where(RateTick.time < limit))
+        else:
+            session.execute(
+                delete(RateCandle).where(
+                    RateCandle.interval == interval, RateCandle.start < limit
+                )
+            )
+
+
+@db_read_session
+def get_candles(
+    crypto_name: str, interval: int, since: int, until: int, session: Session
+) -> list[dict[str, Any]]:
+    '''
+    Candles of 'interval' starting in [since, until). Rolled up candles are
+    read from their level, the rest is built from finer levels and ticks.
+    '''
+    crypto_id = session.execute(
+        select(Crypto.id).where(Crypto.name == crypto_name)
+    ).scalar_one_or_none()
+    if crypto_id is None:
+        raise exceptions.MarketError('Crypto not found')
+
+    watermarks = dict(
+        session.execute(select(RateRollup.interval, RateRollup.until)).all()
+    )
+    level = INTERVALS.index(interval)
+    since -= since % interval
+
+    candles = read_candles(session, crypto_id, level, since, until, watermarks)
+    return [dict(zip(CANDLE_FIELDS, candle)) for candle in candles]
+
+
+def read_candles(
+    session: Session,
+    crypto_id: int,
+    level: int,
+    since: int,
+    until: int,
+    watermarks: dict[int, int],
+) -> list[Candle]:
+    interval = INTERVALS[level]
+    rolled_to = min(max(watermarks.get(interval, 0), since), until)
+
+    candles: list[Candle] = []
+    if since < rolled_to:
+        candles += session.execute(
+            select(*(getattr(RateCandle, field) for field in CANDLE_FIELDS))
+            .where(
+                RateCandle.crypto_id == crypto_id,
+                RateCandle.interval == interval,
+                RateCandle.start >= since,
+                RateCandle.start < rolled_to,
+            )
+            .order_by(RateCandle.start)
+        ).all()
+
+    if rolled_to < until:
+        if level == 0:
+            (_, time, *ohlc), _ = source(0)
+            rows = session.execute(
+                select(time, *ohlc)
+                .where(
+                    RateTick.crypto_id == crypto_id,
+                    RateTick.time >= rolled_to,
+                    RateTick.time < until,
+                )
+                .order_by(RateTick.time)
+            ).all()
+        else:
+            rows = read_candles(
+                session, crypto_id, level - 1, rolled_to, until, watermarks
+            )
+        candles += aggregate(rows, interval)
+
+    return [tuple(candle) for candle in candles]
+
+
+def aggregate(rows: Iterable[Candle], interval: int) -> list[Candle]:
+    '''
+    Merges candles or ticks ordered by time into candles of 'interval'
+    '''
+    candles: list[Candle] = []
+    for time, *ohlc in rows:
+        start = time - time % interval
+        if not candles or candles[-1][0] != start:
+            candles.append((start, *ohlc))
+            continue
+
+        last = candles[-1]
+        candles[-1] = (
+            start,
+            last[1],
+            max(last[2], ohlc[1]),
+            min(last[3], ohlc[2]),
+            ohlc[3],
+            last[5],
+            max(last[6], ohlc[5]),
+            min(last[7], ohlc[6]),
+            ohlc[7],
+        )
+    return candles
+
+
+@bp.route('/crypto/<string:crypto_name>/candles', methods=['GET'])
+def crypto_candles(crypto_name: str) -> Optional[Response]:
+    '''
+    GET - Get OHLC candles of crypto costs
+    '''
+    if request.method == 'GET':
+        interval = MARKET_CANDLE_INTERVALS.get(request.args.get('interval', '1m'))
+        if interval is None:
+            return Response(status=422)
+        try:
+            until = int(request.args.get('to', unix_time(datetime.utcnow()) + 1))
+            since = int(request.args.get('from', until - interval * MARKET_PAGE_SIZE))
+        except ValueError:
+            return Response(status=422)
+        if not 0 <= since < until <= MAX_INT:
+            # SQLite INTEGER overflows on binding
+            return Response(status=422)
+        if until - since > interval * MARKET_CANDLE_MAX_COUNT:
+            return Response(status=422)
+
+        candles = get_candles(crypto_name, interval, since, until)
+
+        return jsonify(candles)
+
+    return None
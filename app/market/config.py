@@ -5,5 +5,109 @@ DATETIME_FORMAT = """%a, %d %b %Y %H:%M:%S GMT"""
 
 MARKET_LOGGER_NAME = 'market_logger'
 MARKET_LOGGER_LEVEL = 'DEBUG'
+# 'text' or 'json' (one object per line with fields passed by 'extra')
+MARKET_LOGGER_FORMAT = 'text'
+# Records are written by background thread from queue of this size.
+# When it's full the new record is dropped, or the oldest with 'oldest'.
+MARKET_LOGGER_QUEUE_SIZE = 10000
+MARKET_LOGGER_DROP = 'newest'
 MARKET_DB_URL = 'sqlite:///app.market.sqlite'
 MARKET_DB_URL_TEST = 'sqlite:///app.market.testing.sqlite'
+
+# Applied to every new SQLite connection.
+# WAL lets readers work while writer commits, 'synchronous = NORMAL'
+# in WAL mode syncs only on checkpoints: committed transactions may be
+# lost on power failure but database can't be corrupted.
+MARKET_DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+}
+# 'BEGIN IMMEDIATE' takes write lock at start of write transaction,
+# 'BEGIN' (deferred) takes it at first write
+MARKET_DB_WRITE_BEGIN = 'BEGIN IMMEDIATE'
+# Class name from 'sqlalchemy.pool'
+MARKET_DB_POOL_CLASS = 'QueuePool'
+MARKET_DB_POOL_SIZE = 5
+MARKET_DB_READ_POOL_SIZE = 10
+# Statements running longer are logged with their caller and route
+MARKET_SLOW_QUERY_THRESHOLD = 0.1  # seconds
+# Executions of statement p95 of 'flask slow-queries' is computed over
+MARKET_SLOW_QUERY_WINDOW = 1000
+
+MARKET_BATCH_MAX_SIZE = 1000
+# Trades of concurrent requests are committed by one writer thread
+# in transactions of up to BATCH_SIZE trades, the first trade of
+# transaction waits for others at most MAX_WAIT
+MARKET_GROUP_COMMIT = False
+MARKET_GROUP_COMMIT_BATCH_SIZE = 100
+MARKET_GROUP_COMMIT_MAX_WAIT = 0.002  # seconds
+# True serves GET routes of users, balances and portfolios from memory.
+# Writes of this process are seen at once, writes of other processes
+# sharing DB after MAX_AGE at most. False reads DB on every request.
+MARKET_READ_MODEL = False
+MARKET_READ_MODEL_MAX_AGE = 1.0  # seconds
+MARKET_BULK_CHUNK_SIZE = 500
+# Rows inserted per transaction by 'flask seed-db'
+MARKET_SEED_CHUNK_SIZE = 20000
+
+MARKET_PAGE_SIZE = 100
+MARKET_PAGE_MAX_SIZE = 1000
+MARKET_STREAM_BATCH_SIZE = 1000
+
+# Events of GET /market/crypto/stream kept for resuming by Last-Event-ID
+MARKET_FEED_HISTORY = 60
+# Subscriber whose queue is full is disconnected
+MARKET_FEED_QUEUE_SIZE = 100
+MARKET_FEED_KEEPALIVE = 15  # seconds
+# Streams of Flask application served by ASGI application at once, every
+# stream holds a worker thread until it ends or its client disconnects
+MARKET_ASGI_MAX_STREAMS = 8
+
+# Candle intervals of GET /market/crypto/<name>/candles in seconds.
+# Every interval is rolled up from the previous one, the first from ticks.
+MARKET_CANDLE_INTERVALS = {'1m': 60, '1h': 60 * 60, '1d': 24 * 60 * 60}
+# How long ticks (key 0) and candles of interval are kept, None is forever
+MARKET_RATE_RETENTION = {
+    0: timedelta(days=2),
+    60: timedelta(days=14),
+    60 * 60: timedelta(days=365),
+    24 * 60 * 60: None,
+}
+MARKET_CANDLE_MAX_COUNT = 1000
+
+# Every rate is updated once per interval, by crypto name or the default.
+# Trades at rates older than CRYPTO_UPDATE_DELTA are rejected, so intervals
+# must be shorter by the time an update takes.
+MARKET_RATE_INTERVAL = timedelta(seconds=9)
+MARKET_RATE_INTERVALS: dict[str, timedelta] = {}
+# Rates due within this time are updated in one transaction
+MARKET_RATE_BATCH_WINDOW = 0.5  # seconds
+MARKET_RATE_BATCH_MAX_SIZE = 10000
+# New and deleted crypto is found by updater this often
+MARKET_RATE_SYNC_INTERVAL = timedelta(seconds=5)
+# Every process reloads rates this often, so rates updated by another
+# process reach its rate cache and GET /market/crypto/stream
+MARKET_RATE_FOLLOW_INTERVAL = timedelta(seconds=1)
+# Trades use cached rate for this long after it was loaded or published,
+# must be shorter than MARKET_RATE_INTERVAL
+MARKET_RATE_CACHE_MAX_AGE = timedelta(seconds=2)
+# Rates are updated by one process holding the lease in DB, the others
+# wait to take it over when it isn't renewed for TTL. Clocks of hosts
+# sharing DB must differ by less than TTL - heartbeat.
+MARKET_UPDATER_LEASE_TTL = timedelta(seconds=15)
+MARKET_UPDATER_HEARTBEAT = timedelta(seconds=5)
+# False leaves updates to 'flask run-updater' process
+MARKET_UPDATER_IN_APP = True
+
+# Model of 'app.market.prices' updating rates: 'uniform' changes every cost
+# by random whole percent up to MARKET_PRICE_JITTER, 'gbm' is geometric
+# Brownian motion with drift and volatility per update.
+# The same seed gives the same rates.
+MARKET_PRICE_MODEL = 'uniform'
+MARKET_PRICE_SEED = None
+MARKET_PRICE_JITTER = 10  # %
+MARKET_PRICE_DRIFT = 0.0
+MARKET_PRICE_VOLATILITY = 0.02
@@ -0,0 +1,62 @@
+'''
+Setup of SQLite connections shared by sync and async engines
+'''
+import threading
+from typing import Any
+
+from sqlalchemy import event, pool
+from sqlalchemy.engine import URL, Connection, Engine
+
+
+class SharedPool(pool.StaticPool):  # pylint: disable=abstract-method
+    '''
+    The only connection of in-memory database, threads take it in turn,
+    because transactions can't be nested on it
+    '''
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._turn = threading.RLock()
+
+    def _do_get(self) -> Any:
+        self._turn.acquire()  # pylint: disable=consider-using-with
+        return super()._do_get()
+
+    def _do_return_conn(self, conn: Any) -> None:
+        super()._do_return_conn(conn)
+        self._turn.release()
+
+
+def is_file_db(engine: Engine) -> bool:
+    return not is_memory_url(engine.url)
+
+
+def is_memory_url(url: URL) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def set_pragmas(engine: Engine, pragmas: dict[str, Any]) -> None:
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def use_explicit_begin(engine: Engine, begin: str = 'BEGIN') -> None:
+    '''
+    pysqlite begins transactions only before DML and doesn't know about
+    SAVEPOINT, so releasing the first savepoint commits everything.
+    BEGIN is emitted by SQLAlchemy instead to make savepoints work.
+    'BEGIN IMMEDIATE' takes write lock at start, so writers wait for each
+    other by 'busy_timeout' instead of failing to upgrade read lock.
+    '''
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection: Any, _: Any) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def on_begin(connection: Connection) -> None:
+        connection.exec_driver_sql(begin)
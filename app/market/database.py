@@ -1,50 +1,232 @@
+import time
 from contextlib import contextmanager
 from functools import wraps
-from typing import Any, Callable, TypeVar, cast
+from typing import Any, Callable, Iterable, Iterator, TypeVar, cast
 
 import click
 from flask import Flask
 from flask.cli import with_appcontext
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, pool
+from sqlalchemy.engine import Connection, Engine, make_url
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
-from app.market import exceptions
-from app.market.config import MARKET_DB_URL
+from app.market import cache, exceptions, metrics, slowlog
+from app.market.config import (
+    MARKET_DB_POOL_CLASS,
+    MARKET_DB_POOL_SIZE,
+    MARKET_DB_PRAGMAS,
+    MARKET_DB_READ_POOL_SIZE,
+    MARKET_DB_URL,
+    MARKET_DB_WRITE_BEGIN,
+)
+from app.market.connections import (
+    SharedPool,
+    is_file_db,
+    is_memory_url,
+    set_pragmas,
+    use_explicit_begin,
+)
 from app.market.logger import get_logger
 
 F = TypeVar('F', bound=Callable[..., Any])
 
 Base = declarative_base()
 SessionFactory = sessionmaker()
+# Bound to read-only engine, so reads never wait for writers
+ReadSessionFactory = sessionmaker()
+# Engines of 'write' and 'read' sessions, set by 'init_db'
+engines: dict[str, Engine] = {}
+
+SESSIONS = metrics.Counter(
+    'market_db_sessions_total',
+    'Sessions of sync and async create_session by event: open, commit, rollback',
+    ('kind', 'event'),
+)
+STATEMENTS = metrics.Counter(
+    'market_sql_statements_total', 'Executed SQL statements', ('statement',)
+)
+STATEMENTS_DURATION = metrics.Counter(
+    'market_sql_duration_seconds_total', 'Time of SQL statements', ('statement',)
+)
 
 
 def init_db(url: str = MARKET_DB_URL) -> None:
-    engine = create_engine(url)
+    for old_engine in engines.values():
+        old_engine.dispose()
+
+    engine = make_engine(url)
+    if is_file_db(engine):
+        read_engine = make_engine(url, readonly=True)
+    else:
+        # Separate connection to in-memory database is another database
+        read_engine = engine
 
     SessionFactory.configure(bind=engine)
+    ReadSessionFactory.configure(bind=read_engine)
+    engines.update(write=engine, read=read_engine)
 
     Base.metadata.create_all(bind=engine)
+    create_indexes(engine)
+
+    cache.reset()
+
+
+def make_engine(url: str, readonly: bool = False) -> Engine:
+    pool_args: dict[str, Any] = {}
+    if url.startswith('sqlite'):
+        # Connections are used by threads of server and by updates thread
+        pool_args['connect_args'] = {'check_same_thread': False}
+
+    if is_memory_url(make_url(url)):
+        # Every connection to in-memory database is another database,
+        # so all threads share one connection
+        pool_args['poolclass'] = SharedPool
+    else:
+        pool_args['poolclass'] = getattr(pool, MARKET_DB_POOL_CLASS)
+        if issubclass(pool_args['poolclass'], pool.QueuePool):
+            pool_args['pool_size'] = (
+                MARKET_DB_READ_POOL_SIZE if readonly else MARKET_DB_POOL_SIZE
+            )
+
+    engine = create_engine(url, **pool_args)
+
+    if engine.dialect.name == 'sqlite':
+        pragmas = dict(MARKET_DB_PRAGMAS)
+        if readonly:
+            pragmas['query_only'] = 'ON'
+        set_pragmas(engine, pragmas)
+        use_explicit_begin(engine, 'BEGIN' if readonly else MARKET_DB_WRITE_BEGIN)
+
+    track_statements(engine)
+    return engine
+
+
+def create_indexes(engine: Engine) -> list[str]:
+    '''
+    'create_all' skips existing tables, so indexes added to models later
+    are created here. Returns names of created indexes.
+    '''
+    created = []
+    with engine.begin() as connection:
+        existing = {
+            table.name: {
+                index['name'] for index in inspect(connection).get_indexes(table.name)
+            }
+            for table in Base.metadata.sorted_tables
+        }
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing[table.name]:
+                    index.create(bind=connection)
+                    created.append(index.name)
+
+    return created
+
+
+def track_statements(engine: Engine) -> None:
+    '''
+    Counts executed statements and their time by the first keyword, adds them
+    to stats of the current request and to aggregates of slow-query log
+    '''
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(connection: Connection, *_: Any) -> None:
+        connection.info['statement_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(
+        connection: Connection,
+        _: Any,
+        statement: str,
+        parameters: Any,
+        __: Any,
+        executemany: bool,
+    ) -> None:
+        duration = time.perf_counter() - connection.info['statement_start']
+        kind = (statement[:16].split(None, 1) or ['OTHER'])[0].upper()
+        STATEMENTS.inc(kind)
+        STATEMENTS_DURATION.inc(kind, amount=duration)
+        metrics.request_stats.add_statement(duration)
+        slowlog.record(statement, parameters, duration, executemany)
+
+
+def pool_stats() -> Iterable[tuple[tuple[str, str], float]]:
+    for kind, engine in engines.items():
+        if kind == 'read' and engine is engines['write']:
+            continue
+        for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+            # Only QueuePool has all of them
+            value = getattr(engine.pool, state, None)
+            if callable(value):
+                yield (kind, state), value()
+
+
+POOL = metrics.Gauge(
+    'market_db_pool_connections',
+    'Connections of pool by state: size, checkedin, checkedout, overflow',
+    ('engine', 'state'),
+    pool_stats,
+)
 
 
 def init_app(app: Flask) -> None:
     app.cli.add_command(clear_db_command)
+    app.cli.add_command(create_indexes_command)
 
 
 @contextmanager
-def create_session(**kwargs: int) -> Session:
+def create_session(readonly: bool = False, **kwargs: int) -> Session:
+    kind = 'read' if readonly else 'write'
+    SESSIONS.inc(kind, 'open')
     try:
-        session = SessionFactory(**kwargs)
+        if readonly:
+            session = ReadSessionFactory(**kwargs)
+        else:
+            session = SessionFactory(**kwargs)
         yield session
         session.commit()
+        SESSIONS.inc(kind, 'commit')
     except SQLAlchemyError as error:
         session.rollback()
+        SESSIONS.inc(kind, 'rollback')
         get_logger().error(error)
         raise exceptions.DatabaseError(error) from error
+    except BaseException:
+        session.rollback()
+        SESSIONS.inc(kind, 'rollback')
+        raise
     finally:
         session.close()
 
+    for callback in session.info.pop('after_commit', []):
+        callback()
+
+
+def after_commit(session: Session, callback: Callable[[], None]) -> None:
+    '''
+    Calls 'callback' after the session opened by 'create_session'
+    is successfully committed
+    '''
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@contextmanager
+def savepoint(session: Session) -> Iterator[None]:
+    '''
+    Runs block in SAVEPOINT, so its failure rolls back only its own
+    changes and 'after_commit' callbacks
+    '''
+    callbacks = session.info.setdefault('after_commit', [])
+    count = len(callbacks)
+    try:
+        with session.begin_nested():
+            yield
+    except Exception:
+        del callbacks[count:]
+        raise
+
 
 def db_session(func: F) -> F:
     @wraps(func)
@@ -55,11 +237,22 @@ def db_session(func: F) -> F:
     return cast(F, wrapper)
 
 
+def db_read_session(func: F) -> F:
+    @wraps(func)
+    def wrapper(*args: int, **kwargs: int) -> Any:
+        with create_session(readonly=True) as session:
+            return func(*args, session=session, **kwargs)
+
+    return cast(F, wrapper)
+
+
 def clear_db() -> None:
     with create_session() as session:
         for table in reversed(Base.metadata.sorted_tables):
             session.execute(table.delete())
 
+    cache.reset()
+
 
 @click.command('clear-db')
 @with_appcontext
@@ -68,3 +261,13 @@ def clear_db_command() -> None:
     Clear database
     '''
     clear_db()
+
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes_command() -> None:
+    '''
+    Create missing indexes in existing database
+    '''
+    created = create_indexes(engines['write'])
+    click.echo('\n'.join(created) or 'All indexes exist')
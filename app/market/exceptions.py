@@ -1,3 +1,5 @@
+from typing import Any
+
 from sqlalchemy.exc import SQLAlchemyError
 
 
@@ -22,4 +24,23 @@ class MarketError(Exception):
     #     return error_dict
 
 
+class BatchError(MarketError):
+    def __init__(self, results: list[dict[str, str]]) -> None:
+        self.results = results
+        super().__init__('Batch has been rolled back')
+
+
+class ValidationError(MarketError):
+    '''
+    Request doesn't match its schema, 'errors' are {"field", "message"}
+    '''
+
+    def __init__(self, errors: list[dict[str, str]]) -> None:
+        self.errors = errors
+        super().__init__('Invalid request')
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'message': str(self), 'errors': self.errors}
+
+
 DatabaseError = SQLAlchemyError
@@ -0,0 +1,214 @@
+import json
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Generator, Iterable, NamedTuple, Optional
+
+from flask import Blueprint, Response, request
+from werkzeug.http import http_date
+
+from app.market import cache, market
+from app.market.cache import Rate
+from app.market.config import (
+    MARKET_FEED_HISTORY,
+    MARKET_FEED_KEEPALIVE,
+    MARKET_FEED_QUEUE_SIZE,
+)
+
+bp = Blueprint('feed', __name__)
+
+
+class Event(NamedTuple):
+    id: int
+    # Encoded once and sent to every subscriber as is
+    text: str
+
+
+class Subscriber:
+    def __init__(self, queue_size: int) -> None:
+        self.queue: queue.Queue[Event] = queue.Queue(queue_size)
+        self.evicted = False
+
+
+class RateFeed:
+    '''
+    Fan-out of rate changes to subscribers of SSE stream.
+
+    Every publish of the rate cache becomes one event with changed rates,
+    so updates of rates reach subscribers after they are committed. Events are
+    put into bounded queues of subscribers; subscriber whose queue is
+    full is evicted, its stream ends after queued events and the client
+    resumes by Last-Event-ID from the last 'history' events.
+    '''
+
+    def __init__(
+        self,
+        history: int = MARKET_FEED_HISTORY,
+        queue_size: int = MARKET_FEED_QUEUE_SIZE,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._rates: dict[str, Rate] = {}
+        self._history: deque[Event] = deque(maxlen=history)
+        self._subscribers: set[Subscriber] = set()
+        self._queue_size = queue_size
+        self.last_id = 0
+
+    def publish(self, rates: Iterable[Rate]) -> Optional[Event]:
+        '''
+        Sends rates whose costs changed since the previous publish to all
+        subscribers. Returns the event or None if all rates are the same
+        as published ones.
+        '''
+        with self._lock:
+            rates = [rate for rate in rates if self._rates.get(rate.name) != rate]
+            if not rates:
+                return None
+
+            changed = [rate for rate in rates if self.is_changed(rate)]
+            self._rates.update((rate.name, rate) for rate in rates)
+            self.last_id += 1
+            event = Event(
+                self.last_id,
+                encode(
+                    self.last_id, 'rates', changed, max(r.last_updated for r in rates)
+                ),
+            )
+            self._history.append(event)
+
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.evicted = True
+                    self._subscribers.discard(subscriber)
+
+            return event
+
+    def is_changed(self, rate: Rate) -> bool:
+        old = self._rates.get(rate.name)
+        return old is None or (old.purchase_cost, old.sale_cost) != (
+            rate.purchase_cost,
+            rate.sale_cost,
+        )
+
+    def is_empty(self) -> bool:
+        return not self._rates
+
+    def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        current: Iterable[Rate] = (),
+    ) -> Subscriber:
+        '''
+        New subscriber gets events after 'last_event_id' if they are still
+        in history, otherwise it gets snapshot of all known rates or of
+        'current' rates if nothing was published yet
+        '''
+        subscriber = Subscriber(self._queue_size)
+        with self._lock:
+            backlog = None
+            if last_event_id is not None and self.can_resume(last_event_id):
+                backlog = [e for e in self._history if e.id > last_event_id]
+            if backlog is None or len(backlog) > self._queue_size:
+                rates = list(self._rates.values() or current)
+                backlog = [Event(self.last_id, encode(self.last_id, 'snapshot', rates))]
+
+            for event in backlog:
+                subscriber.queue.put_nowait(event)
+            self._subscribers.add(subscriber)
+
+        return subscriber
+
+    def can_resume(self, last_event_id: int) -> bool:
+        # Ids of another process or evicted from history can't be resumed
+        oldest = self._history[0].id - 1 if self._history else self.last_id
+        return oldest <= last_event_id <= self.last_id
+
+    def events(
+        self, subscriber: Subscriber, keepalive: float = MARKET_FEED_KEEPALIVE
+    ) -> Generator[str, None, None]:
+        '''
+        Messages of subscriber until it's evicted or the client disconnects
+        '''
+        try:
+            while not (subscriber.evicted and subscriber.queue.empty()):
+                try:
+                    yield subscriber.queue.get(timeout=keepalive).text
+                except queue.Empty:
+                    # Comment line, lets server notice closed connection
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rates = {}
+            self._history.clear()
+            self._subscribers = set()
+            self.last_id = 0
+
+
+def encode(
+    event_id: int,
+    event_type: str,
+    rates: list[Rate],
+    last_updated: Optional[datetime] = None,
+) -> str:
+    '''
+    SSE message. Every tick updates all rates, so 'last_updated' of event
+    is the freshness of all rates, 'rates' are only changed ones.
+    '''
+    if last_updated is None:
+        last_updated = max((rate.last_updated for rate in rates), default=None)
+    data = json.dumps(
+        {
+            'last_updated': last_updated and http_date(last_updated),
+            'rates': [serialized_rate(rate) for rate in rates],
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+
+def serialized_rate(rate: Rate) -> dict[str, Any]:
+    # The same fields and date format as in GET /market/crypto
+    return {**rate._asdict(), 'last_updated': http_date(rate.last_updated)}
+
+
+feed = RateFeed()
+cache.rates.listen(feed.publish)
+
+
+@bp.route('/crypto/stream', methods=['GET'])
+def crypto_stream() -> Optional[Response]:
+    '''
+    GET - Stream of rate changes (Server-Sent Events)
+    '''
+    if request.method == 'GET':
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get(
+            'last_event_id'
+        )
+        try:
+            last_id = int(last_event_id) if last_event_id is not None else None
+        except ValueError:
+            return Response(status=422)
+
+        # Rates weren't published in this process yet
+        current = []
+        if feed.is_empty():
+            current = [Rate(**crypto) for crypto in market.get_crypto()]
+        subscriber = feed.subscribe(last_id, current)
+
+        return Response(
+            feed.events(subscriber),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    return None
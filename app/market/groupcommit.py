@@ -0,0 +1,189 @@
+'''
+Group commit of writes. With MARKET_GROUP_COMMIT calls of functions
+decorated by 'grouped' are queued to one writer thread, which applies
+up to MARKET_GROUP_COMMIT_BATCH_SIZE of them in one transaction, waiting
+at most MARKET_GROUP_COMMIT_MAX_WAIT for the batch to fill. Every call
+runs in its own SAVEPOINT, so a failed call is rolled back alone and
+only its caller gets the error. Callers return after the commit.
+'''
+import atexit
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any, Callable, NamedTuple, Optional, TypeVar, cast
+
+from app.market import exceptions, metrics
+from app.market.config import (
+    MARKET_GROUP_COMMIT,
+    MARKET_GROUP_COMMIT_BATCH_SIZE,
+    MARKET_GROUP_COMMIT_MAX_WAIT,
+)
+from app.market.database import create_session, savepoint
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+BATCH_SIZE = metrics.Histogram(
+    'market_group_commit_batch_size',
+    'Calls committed by one transaction of group commit',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+WAIT = metrics.Histogram(
+    'market_group_commit_wait_seconds', 'Time from queueing of call to its commit'
+)
+
+
+class Call(NamedTuple):
+    func: Callable[..., Any]
+    args: tuple[Any, ...]
+    kwargs: dict[str, Any]
+    future: 'Future[Any]'
+    queued: float
+
+
+class GroupCommitWriter(threading.Thread):
+    def __init__(
+        self,
+        batch_size: int = MARKET_GROUP_COMMIT_BATCH_SIZE,
+        max_wait: float = MARKET_GROUP_COMMIT_MAX_WAIT,
+    ) -> None:
+        super().__init__(name='group-commit', daemon=True)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        # None stops the writer after calls queued before it
+        self.calls: queue.SimpleQueue[Optional[Call]] = queue.SimpleQueue()
+        self.stopped = False
+        self._lock = threading.Lock()
+
+    def submit(
+        self, func: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> 'Future[Any]':
+        '''
+        Queues call of 'func' with 'session' keyword argument,
+        future is done after the batch is committed
+        '''
+        future: Future[Any] = Future()
+        with self._lock:
+            if self.stopped:
+                raise exceptions.MarketError('Writer is stopped')
+            self.calls.put(Call(func, args, kwargs, future, time.monotonic()))
+        return future
+
+    def run(self) -> None:
+        while True:
+            batch = self.collect()
+            if batch is None:
+                return
+            self.commit(batch)
+
+    def collect(self) -> Optional[list[Call]]:
+        '''
+        Waits for the first call, then takes calls queued until the batch
+        is full or 'max_wait' has passed
+        '''
+        call = self.calls.get()
+        if call is None:
+            return None
+
+        batch = [call]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                call = self.calls.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if call is None:
+                # Writer stops after this batch
+                self.calls.put(None)
+                break
+            batch.append(call)
+        return batch
+
+    def commit(self, batch: list[Call]) -> None:
+        outcomes: list[tuple[bool, Any]] = []
+        try:
+            with create_session() as session:
+                for call in batch:
+                    try:
+                        with savepoint(session):
+                            result = call.func(
+                                *call.args, session=session, **call.kwargs
+                            )
+                    except Exception as error:  # pylint: disable=broad-except
+                        outcomes.append((False, error))
+                    else:
+                        outcomes.append((True, result))
+        except Exception as error:  # pylint: disable=broad-except
+            # Nothing is written, every call fails and the writer goes on
+            outcomes = [(False, error)] * len(batch)
+
+        BATCH_SIZE.observe(len(batch))
+        now = time.monotonic()
+        for call, (ok, value) in zip(batch, outcomes):
+            WAIT.observe(now - call.queued)
+            if ok:
+                call.future.set_result(value)
+            else:
+                call.future.set_exception(value)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        '''
+        Stops after queued calls are committed
+        '''
+        with self._lock:
+            if not self.stopped:
+                self.stopped = True
+                self.calls.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+
+writer: Optional[GroupCommitWriter] = None
+writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter:
+    '''
+    Starts writer once per process, it's stopped at exit. A stopped or
+    dead writer is replaced.
+    '''
+    global writer  # pylint: disable=global-statement
+
+    with writer_lock:
+        if writer is None or writer.stopped or not writer.is_alive():
+            writer = GroupCommitWriter()
+            writer.start()
+        return writer
+
+
+def stop_writer(timeout: Optional[float] = None) -> None:
+    with writer_lock:
+        if writer is not None:
+            writer.stop(timeout)
+
+
+atexit.register(stop_writer)
+
+
+def submit(func: Callable[..., Any], *args: Any, **kwargs: Any) -> 'Future[Any]':
+    '''
+    Queues call of function decorated by 'db_session' to the writer
+    '''
+    return get_writer().submit(inspect.unwrap(func), *args, **kwargs)
+
+
+def grouped(func: F) -> F:
+    '''
+    Function decorated by 'db_session' is committed by the writer
+    together with concurrent calls if MARKET_GROUP_COMMIT is set
+    '''
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not MARKET_GROUP_COMMIT:
+            return func(*args, **kwargs)
+        return submit(func, *args, **kwargs).result()
+
+    return cast(F, wrapper)
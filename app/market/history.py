@@ -0,0 +1,110 @@
+import base64
+import binascii
+from typing import Any, Iterable, Iterator, Optional
+
+from flask import Response, json, stream_with_context
+from sqlalchemy import String, literal, tuple_, type_coerce
+from sqlalchemy.orm import Query, Session, lazyload
+
+from app.market import exceptions
+from app.market.config import MARKET_STREAM_BATCH_SIZE
+from app.market.database import create_session, db_read_session
+from app.market.models import Operation, User, serialized
+from app.market.schemas import MAX_INT
+
+
+# 'created' is compared as stored text, because 'func.now()' of SQLite
+# and DateTime of SQLAlchemy store the same time in different formats
+created_text = type_coerce(Operation.created, String)
+
+
+def encode_cursor(created: str, operation_id: int) -> str:
+    '''
+    Opaque cursor pointing right after operation in (created, id) order
+    '''
+    cursor = f'{operation_id},{created}'
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        operation_id, created = base64.urlsafe_b64decode(cursor).decode().split(',')
+        if not 0 <= int(operation_id) <= MAX_INT:
+            raise ValueError(operation_id)
+        return created, int(operation_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise exceptions.MarketError('Wrong cursor') from error
+
+
+def operations_query(session: Session, login: str) -> Query:
+    # User is joined for filtering, so eager loading of 'Operation.user' is skipped
+    return (
+        session.query(Operation)
+        .options(lazyload(Operation.user))
+        .join(Operation.user)
+        .where(User.login == login)
+        .order_by(Operation.created, Operation.id)
+    )
+
+
+@db_read_session
+def get_operations_page(
+    login: str, after: Optional[str], limit: int, session: Session
+) -> tuple[list[dict[str, Any]], Optional[str]]:
+    '''
+    Returns at most 'limit' operations after cursor 'after' and cursor
+    of the next page or None if it's the last page
+    '''
+    query = operations_query(session, login).add_columns(created_text)
+    if after is not None:
+        created, operation_id = decode_cursor(after)
+        query = query.where(
+            tuple_(created_text, Operation.id)
+            > tuple_(literal(created, String), operation_id)
+        )
+
+    rows = query.limit(limit + 1).all()
+    operations = [serialized(operation) for operation, _ in rows[:limit]]
+    if len(rows) <= limit:
+        return operations, None
+
+    operation, created = rows[limit - 1]
+    return operations, encode_cursor(created, operation.id)
+
+
+def iter_operations(
+    login: str, batch_size: int = MARKET_STREAM_BATCH_SIZE
+) -> Iterator[dict[str, Any]]:
+    '''
+    Lazily yields all operations of user fetching them by 'batch_size' rows,
+    so memory doesn't depend on length of history
+    '''
+    with create_session(readonly=True) as session:
+        for operation in operations_query(session, login).yield_per(batch_size):
+            yield serialized(operation)
+
+
+def stream_operations(login: str, stream_format: str) -> Response:
+    '''
+    Whole history written by chunks as NDJSON or JSON list
+    '''
+    operations = iter_operations(login)
+
+    chunks: Iterator[str]
+    if stream_format == 'ndjson':
+        chunks = (json.dumps(operation) + '\n' for operation in operations)
+        mimetype = 'application/x-ndjson'
+    elif stream_format == 'json':
+        chunks = json_list_chunks(operations)
+        mimetype = 'application/json'
+    else:
+        return Response(status=422)
+
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+def json_list_chunks(items: Iterable[Any]) -> Iterator[str]:
+    yield '['
+    for i, item in enumerate(items):
+        yield (',' if i else '') + json.dumps(item)
+    yield ']'
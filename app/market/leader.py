@@ -0,0 +1,106 @@
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.market import metrics
+from app.market.config import MARKET_UPDATER_HEARTBEAT, MARKET_UPDATER_LEASE_TTL
+from app.market.database import db_session
+from app.market.logger import get_logger
+from app.market.models import Lease as LeaseRow
+
+TRANSITIONS = metrics.Counter(
+    'market_lease_transitions_total',
+    'Leases taken and lost by this process',
+    ('lease', 'event'),
+)
+
+
+@db_session
+def acquire(name: str, holder: str, ttl: timedelta, session: Session) -> bool:
+    '''
+    Takes or renews the lease if it's free, expired or held by 'holder'
+    by one statement, so two processes can't take it at once
+    '''
+    now = datetime.utcnow()
+    statement = insert(LeaseRow).values(name=name, holder=holder, expires=now + ttl)
+    result = session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[LeaseRow.name],
+            set_={'holder': holder, 'expires': now + ttl},
+            where=(LeaseRow.holder == holder) | (LeaseRow.expires <= now),
+        )
+    )
+    return result.rowcount == 1  # type: ignore[no-any-return]
+
+
+@db_session
+def release(name: str, holder: str, session: Session) -> None:
+    session.execute(
+        delete(LeaseRow).where(LeaseRow.name == name, LeaseRow.holder == holder)
+    )
+
+
+class Lease:
+    '''
+    Lease of job 'name' held by this process. It's renewed every heartbeat
+    and considered held for TTL since the start of the last renewal,
+    which isn't later than the expiry seen by other processes.
+    '''
+
+    def __init__(
+        self,
+        name: str,
+        ttl: timedelta = MARKET_UPDATER_LEASE_TTL,
+        heartbeat: timedelta = MARKET_UPDATER_HEARTBEAT,
+        holder: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat.total_seconds()
+        self.holder = holder or (
+            f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        )
+        self.renew_at = 0.0
+        self._held_until = 0.0
+        # Result of the last renewal, the lease may have expired since
+        self._taken = False
+
+    @property
+    def held(self) -> bool:
+        return time.monotonic() < self._held_until
+
+    def keep(self) -> bool:
+        '''
+        Takes or renews the lease when heartbeat is due,
+        returns whether it's held
+        '''
+        start = time.monotonic()
+        if start < self.renew_at:
+            return self.held
+
+        taken = acquire(self.name, self.holder, self.ttl)
+        self._held_until = start + self.ttl.total_seconds() if taken else 0.0
+        self.renew_at = start + self.heartbeat
+
+        if taken != self._taken:
+            self._taken = taken
+            event = 'taken' if taken else 'lost'
+            TRANSITIONS.inc(self.name, event)
+            get_logger().info('Lease %s %s by %s', self.name, event, self.holder)
+        return self.held
+
+    def release(self) -> None:
+        if self.held:
+            self._held_until = 0.0
+            self.renew_at = 0.0
+            self._taken = False
+            release(self.name, self.holder)
+            TRANSITIONS.inc(self.name, 'released')
+            get_logger().info('Lease %s released by %s', self.name, self.holder)
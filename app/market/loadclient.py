@@ -0,0 +1,181 @@
+import http.client
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+
+from flask import Flask
+
+from app.market.config import CRYPTO_UPDATE_DELTA, DATETIME_FORMAT, MARKET_PAGE_SIZE
+
+# Virtual users re-read rates so often, like clients showing them
+RATES_REFRESH = 5  # seconds
+# Value of one purchase is up to this part of the starting balance
+PURCHASE_VALUE = 2000
+
+# (status, JSON body or None)
+Result = tuple[int, Any]
+Send = Callable[[str, str, Optional[Any]], Result]
+# Endpoint -> (seconds, error kind or None) of every request
+Samples = dict[str, list[tuple[float, Optional[str]]]]
+
+ERRORS = {
+    'Crypto exchange rate has been updated': 'stale_rate',
+    'Not enough money to purchase': 'insufficient_funds',
+    'Not enough crypto to sale': 'insufficient_crypto',
+}
+
+
+def error_kind(status: int, body: Any) -> Optional[str]:
+    '''
+    Kind of failed response for the error breakdown, None if it succeeded
+    '''
+    if status < 400:
+        return None
+    message = body.get('message', '') if isinstance(body, dict) else ''
+    if message in ERRORS:
+        return ERRORS[message]
+    if 'database is locked' in message:
+        return 'db_locked'
+    return f'http_{status}'
+
+
+def http_sender(url: str) -> Send:
+    '''
+    Keep-alive connection of one virtual user to a running server
+    '''
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(
+        parts.hostname or 'localhost', parts.port, timeout=30
+    )
+
+    def send(method: str, path: str, data: Optional[Any] = None) -> Result:
+        body = None if data is None else json.dumps(data)
+        headers = {'Content-Type': 'application/json'} if body else {}
+        connection.request(method, parts.path.rstrip('/') + path, body, headers)
+        response = connection.getresponse()
+        text = response.read()
+        return response.status, json.loads(text) if text else None
+
+    return send
+
+
+def app_sender(app: Flask) -> Send:
+    '''
+    Requests to the application in this process, without HTTP server
+    '''
+    client = app.test_client()
+
+    def send(method: str, path: str, data: Optional[Any] = None) -> Result:
+        response = client.open(path, method=method, json=data)
+        return response.status_code, response.get_json(silent=True)
+
+    return send
+
+
+class VirtualUser:
+    '''
+    Registers itself, then repeats random actions of the mix until
+    'deadline'. Trades use current time as 'time_str' right after
+    reading rates, like a client confirming a shown rate.
+    '''
+
+    def __init__(
+        self, name: str, send: Send, mix: dict[str, int], rng: random.Random
+    ) -> None:
+        self.login = name
+        self.send = send
+        self.rng = rng
+        self.actions, self.weights = zip(*mix.items())
+        self.samples: Samples = {}
+        # Crypto name -> purchase cost
+        self.rates: dict[str, int] = {}
+        self.holdings: Counter[str] = Counter()
+        self.rates_read = 0.0
+        # The oldest 'last_updated' of read rates
+        self.rates_updated = datetime.min
+
+    def request(self, name: str, method: str, path: str, data: Any = None) -> Result:
+        start = time.perf_counter()
+        try:
+            status, body = self.send(method, path, data)
+        except (OSError, http.client.HTTPException):
+            status, body = 599, None
+        seconds = time.perf_counter() - start
+        kind = 'connection' if status == 599 else error_kind(status, body)
+        self.samples.setdefault(name, []).append((seconds, kind))
+        return status, body
+
+    def run(self, deadline: float) -> None:
+        self.request('register', 'POST', '/market/users', {'login': self.login})
+        while time.monotonic() < deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            getattr(self, action)()
+
+    def refresh_rates(self) -> None:
+        '''
+        Rates are re-read periodically and when they are too old to trade
+        by, so stale rate errors mean that the server doesn't update them
+        '''
+        if (
+            self.rates
+            and time.monotonic() - self.rates_read < RATES_REFRESH
+            and datetime.utcnow() - self.rates_updated < CRYPTO_UPDATE_DELTA
+        ):
+            return
+        status, body = self.request('rates', 'GET', '/market/crypto')
+        if status == 200 and body:
+            self.rates = {crypt['name']: crypt['purchase_cost'] for crypt in body}
+            self.rates_read = time.monotonic()
+            self.rates_updated = min(
+                datetime.strptime(crypt['last_updated'], DATETIME_FORMAT)
+                for crypt in body
+            )
+
+    def register(self) -> None:
+        login = f'{self.login}-{self.rng.getrandbits(48):x}'
+        self.request('register', 'POST', '/market/users', {'login': login})
+
+    def trade(self, operation_type: str, crypto_name: str, amount: int) -> bool:
+        status, _ = self.request(
+            operation_type,
+            'POST',
+            f'/market/users/{self.login}/operations',
+            {
+                'crypto_name': crypto_name,
+                'operation_type': operation_type,
+                'amount': amount,
+                'time_str': datetime.utcnow().strftime(DATETIME_FORMAT),
+            },
+        )
+        return status < 400
+
+    def purchase(self) -> None:
+        self.refresh_rates()
+        if not self.rates:
+            return
+        crypto_name = self.rng.choice(list(self.rates))
+        amount = self.rng.randint(1, max(1, PURCHASE_VALUE // self.rates[crypto_name]))
+        if self.trade('purchase', crypto_name, amount):
+            self.holdings[crypto_name] += amount
+
+    def sale(self) -> None:
+        held = [name for name, amount in self.holdings.items() if amount > 0]
+        if not held:
+            self.purchase()
+            return
+        self.refresh_rates()
+        crypto_name = self.rng.choice(held)
+        amount = self.rng.randint(1, self.holdings[crypto_name])
+        if self.trade('sale', crypto_name, amount):
+            self.holdings[crypto_name] -= amount
+
+    def portfolio(self) -> None:
+        self.request('portfolio', 'GET', f'/market/users/{self.login}/portfolio')
+
+    def history(self) -> None:
+        path = f'/market/users/{self.login}/operations?limit={MARKET_PAGE_SIZE}'
+        self.request('history', 'GET', path)
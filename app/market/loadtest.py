@@ -0,0 +1,155 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Optional
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+from app.market.loadclient import Samples, Send, VirtualUser, app_sender, http_sender
+
+# Endpoint -> weight in the mix of virtual user actions
+DEFAULT_MIX = {'register': 1, 'purchase': 5, 'sale': 3, 'portfolio': 3, 'history': 2}
+MIX = ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items())
+PERCENTILES = (50, 90, 99)
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(loadtest_command)
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    '''
+    'purchase=5,sale=3' -> {'purchase': 5, 'sale': 3}
+    '''
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise ValueError(f'Wrong mix item: {item!r}')
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError('Mix has no actions')
+    return mix
+
+
+def report(samples: list[Samples], seconds: float) -> dict[str, Any]:
+    '''
+    Throughput, latency percentiles and error breakdown by endpoint
+    '''
+    merged: Samples = {}
+    for user_samples in samples:
+        for endpoint, values in user_samples.items():
+            merged.setdefault(endpoint, []).extend(values)
+
+    endpoints: dict[str, dict[str, Any]] = {}
+    for endpoint, values in sorted(merged.items()):
+        latencies = sorted(latency * 1000 for latency, _ in values)
+        errors = Counter(error for _, error in values if error is not None)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'ok': len(values) - sum(errors.values()),
+            'throughput': len(values) / seconds,
+            'latency_ms': {
+                **{f'p{q}': percentile(latencies, q) for q in PERCENTILES},
+                'max': latencies[-1],
+            },
+            'errors': dict(errors),
+        }
+
+    total = sum(map(len, merged.values()))
+    trades = sum(endpoints.get(e, {}).get('ok', 0) for e in ('purchase', 'sale'))
+    return {
+        'seconds': seconds,
+        'requests': total,
+        'throughput': total / seconds,
+        'trades_per_second': trades / seconds,
+        'endpoints': endpoints,
+    }
+
+
+def percentile(ordered: list[float], q: int) -> float:
+    return ordered[min(len(ordered) - 1, len(ordered) * q // 100)]
+
+
+def run_load(
+    make_sender: Callable[[], Send],
+    users: int,
+    duration: float,
+    mix: Optional[dict[str, int]] = None,
+    seed: Optional[int] = None,
+) -> dict[str, Any]:
+    '''
+    Runs 'users' virtual users in threads for 'duration' seconds
+    '''
+    rng = random.Random(seed)
+    prefix = f'load{rng.getrandbits(32):08x}'
+    virtual_users = [
+        VirtualUser(
+            f'{prefix}-{i}',
+            make_sender(),
+            mix or DEFAULT_MIX,
+            random.Random(rng.random()),
+        )
+        for i in range(users)
+    ]
+
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=user.run, args=(start + duration,))
+        for user in virtual_users
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return report([user.samples for user in virtual_users], time.monotonic() - start)
+
+
+def echo_report(result: dict[str, Any]) -> None:
+    click.echo(
+        f'{result["requests"]} requests in {result["seconds"]:.1f}s: '
+        f'{result["throughput"]:.1f} req/s, '
+        f'{result["trades_per_second"]:.1f} trades/s'
+    )
+    for endpoint, stats in result['endpoints'].items():
+        latency = ' '.join(f'{q}={ms:.1f}ms' for q, ms in stats['latency_ms'].items())
+        errors = ' '.join(f'{kind}={n}' for kind, n in sorted(stats['errors'].items()))
+        click.echo(
+            f'  {endpoint:<10} {stats["requests"]:>7} {stats["ok"]:>7} ok  '
+            f'{latency}  {errors}'
+        )
+
+
+@click.command('loadtest')
+@click.option('--url', help='Running server, e.g. http://127.0.0.1:5000')
+@click.option('--users', default=10, show_default=True, help='Virtual users')
+@click.option('--duration', default=30.0, show_default=True, help='Seconds')
+@click.option('--mix', default=MIX, show_default=True, help='Weights of actions')
+@click.option('--seed', type=int)
+@click.option('--json', 'as_json', is_flag=True, help='Print report as JSON')
+@with_appcontext
+def loadtest_command(
+    url: Optional[str], mix: str, as_json: bool, **options: Any
+) -> None:
+    '''
+    Drive the API by concurrent virtual users, without --url the
+    application is called in this process
+    '''
+    try:
+        weights = parse_mix(mix)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--mix') from error
+
+    make_sender = (
+        (lambda: http_sender(url)) if url else (lambda: app_sender(current_app))
+    )
+    result = run_load(make_sender, mix=weights, **options)
+    if as_json:
+        click.echo(json.dumps(result))
+    else:
+        echo_report(result)
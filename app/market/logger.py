@@ -1,21 +1,151 @@
+import atexit
+import json
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
 
-from app.market.config import MARKET_LOGGER_LEVEL, MARKET_LOGGER_NAME
+from app.market import metrics
+from app.market.config import (
+    MARKET_LOGGER_DROP,
+    MARKET_LOGGER_FORMAT,
+    MARKET_LOGGER_LEVEL,
+    MARKET_LOGGER_NAME,
+    MARKET_LOGGER_QUEUE_SIZE,
+)
 
+DATE_FORMAT = '%d/%m/%Y %H:%M:%S'
+TEXT_FORMAT = '%(levelname)s %(asctime)s %(funcName)s(%(lineno)d) %(message)s'
+# Attributes of every record, the others are passed by 'extra'
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
 
-def init() -> None:
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(
-        logging.Formatter(
-            '%(levelname)s %(asctime)s %(funcName)s(%(lineno)d) %(message)s',
-            datefmt='%d/%m/%Y %H:%M:%S',
+DROPPED = metrics.Counter(
+    'market_log_records_dropped_total', 'Log records dropped by full queue'
+)
+
+# Getting logger by name takes the lock of logging module
+_logger = logging.getLogger(MARKET_LOGGER_NAME)
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    One JSON object per line, fields passed by 'extra' are included
+    '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'function': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES
         )
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    '''
+    Puts records to bounded queue without waiting. When the queue is full
+    the new record is dropped, or the oldest one with drop='oldest'.
+    '''
+
+    def __init__(self, records: 'queue.Queue[Any]', drop: str = 'newest') -> None:
+        super().__init__(records)
+        self.records = records
+        self.drop = drop
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records don't leave the process, so only the message is merged
+        # while its arguments are current, formatting is left to listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.records.put_nowait(record)
+            return
+        except queue.Full:
+            if self.drop != 'oldest':
+                DROPPED.inc()
+                return
+        try:
+            self.records.get_nowait()
+            DROPPED.inc()
+            self.records.put_nowait(record)
+        except (queue.Empty, queue.Full):
+            # Listener or another thread was faster
+            DROPPED.inc()
+
+
+class BlockingStopQueueListener(QueueListener):
+    '''
+    Waits for free place in the full queue on stop, so the sentinel
+    isn't lost. The handler is removed before, so the listener frees it.
+    '''
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+def make_formatter(kind: str = MARKET_LOGGER_FORMAT) -> logging.Formatter:
+    if kind == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def init(
+    kind: str = MARKET_LOGGER_FORMAT,
+    stream: Any = None,
+    queue_size: int = MARKET_LOGGER_QUEUE_SIZE,
+) -> None:
+    '''
+    Records are written to 'stream' (stderr) by background thread,
+    calling init again replaces the handler of the previous call
+    '''
+    global _listener, _handler  # pylint: disable=global-statement
+
+    shutdown()
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(make_formatter(kind))
+
+    records: 'queue.Queue[Any]' = queue.Queue(queue_size)
+    _handler = DroppingQueueHandler(records, MARKET_LOGGER_DROP)
+    _listener = BlockingStopQueueListener(
+        records, stream_handler, respect_handler_level=True
     )
+    _listener.start()
+
+    _logger.addHandler(_handler)
+    _logger.setLevel(MARKET_LOGGER_LEVEL)
+
+
+def shutdown() -> None:
+    '''
+    Writes queued records and removes the handler of 'init'
+    '''
+    global _listener, _handler  # pylint: disable=global-statement
+
+    if _handler is not None:
+        _logger.removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
-    market_logger = logging.getLogger(MARKET_LOGGER_NAME)
-    market_logger.addHandler(stream_handler)
-    market_logger.setLevel(MARKET_LOGGER_LEVEL)
+atexit.register(shutdown)
 
 
 def get_logger() -> logging.Logger:
-    return logging.getLogger(MARKET_LOGGER_NAME)
+    return _logger
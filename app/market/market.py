@@ -1,84 +1,117 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Callable, Collection, Optional, Union
 
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.orm import Session
 
-from app.market import exceptions
-from app.market.config import CRYPTO_UPDATE_DELTA
-from app.market.database import db_session
-from app.market.models import Crypto, Operation, Portfolio, User, serialized
+from app.market import candles, groupcommit, readmodel, trading
+from app.market.cache import Rate, rates, user_ids
+from app.market.database import after_commit, db_read_session, db_session
+from app.market.models import (
+    Crypto,
+    Operation,
+    Portfolio,
+    User,
+    select_columns,
+    serialized_rows,
+)
 
 
-@db_session
+@db_read_session
 def get_users(session: Session) -> list[dict[str, Any]]:
-    users = session.query(User).all()
-    return serialized(users)
+    snapshots = readmodel.get_all(session)
+    if snapshots is not None:
+        return [
+            {'id': user.id, 'login': user.login, 'balance': user.balance}
+            for user in snapshots
+        ]
+
+    # Read functions select column tuples, ORM objects aren't built
+    users = session.execute(select_columns(User)).all()
+    return serialized_rows(User, users)
 
 
 @db_session
 def add_user(login: str, session: Session) -> None:
-    session.add(User(login))
+    user = User(login)
+    session.add(user)
+    session.flush()
 
+    user_id = user.id
+    after_commit(session, lambda: user_ids.put(login, user_id))
+    readmodel.add(session, user_id, login, user.balance)
 
-@db_session
+
+@db_read_session
 def get_operations(login: str, session: Session) -> list[dict[str, Any]]:
-    operations = (
-        session.query(Operation)
-        .join(Operation.user)
+    operations = session.execute(
+        select_columns(Operation)
+        .join(User, User.id == Operation.user_id)
         .where(User.login == login)
-        .order_by(Operation.created)
-        .all()
-    )
-    return serialized(operations)
+        .order_by(Operation.created, Operation.id)
+    ).all()
+    return serialized_rows(Operation, operations)
 
 
+@groupcommit.grouped
 @db_session
 def add_operation(
     login: str,
     crypto_name: str,
     operation_type: str,
     amount: int,
-    time_str: str,
+    time_str: Union[str, datetime],
     session: Session,
 ) -> None:
-    if amount <= 0:
-        raise exceptions.MarketError('Amount must be positive')
-
-    time = datetime.strptime(time_str, """%a, %d %b %Y %H:%M:%S GMT""")
-
-    crypto = session.query(Crypto).where(Crypto.name == crypto_name).one()
-
-    if (time - crypto.last_updated) >= CRYPTO_UPDATE_DELTA:
-        raise exceptions.MarketError('Crypto exchange rate has been updated')
-
-    user = session.query(User).where(User.login == login).one()
-
-    if operation_type == 'purchase':
-        purchase(session, user, crypto, amount)
-    elif operation_type == 'sale':
-        sale(session, user, crypto, amount)
-    else:
-        raise exceptions.MarketError('Wrong operation type')
+    trading.apply_operation(
+        session, login, crypto_name, operation_type, amount, time_str
+    )
 
 
-@db_session
+@db_read_session
 def get_balance(login: str, session: Session) -> dict[str, int]:
+    snapshot = readmodel.get_user(session, login)
+    if snapshot is not None:
+        return {'balance': snapshot.balance}
+
     balance = session.query(User.balance).where(User.login == login).one().balance
     return {'balance': balance}
 
 
-@db_session
+@db_read_session
 def get_portfolio(login: str, session: Session) -> list[dict[str, Any]]:
-    portfolio = (
-        session.query(Portfolio).join(Portfolio.user).where(User.login == login).all()
-    )
-    return serialized(portfolio)
+    snapshot = readmodel.get_user(session, login)
+    if snapshot is not None:
+        return [
+            {'user_id': snapshot.id, 'crypto_id': crypto_id, 'amount': amount}
+            for crypto_id, amount in snapshot.portfolio
+        ]
+
+    portfolio = session.execute(
+        select_columns(Portfolio)
+        .join(User, User.id == Portfolio.user_id)
+        .where(User.login == login)
+    ).all()
+    return serialized_rows(Portfolio, portfolio)
 
 
-@db_session
+@db_read_session
 def get_crypto(session: Session) -> list[dict[str, Any]]:
-    crypto = session.query(Crypto).all()
-    return serialized(crypto)
+    cached = rates.all()
+    if cached is None:
+        cached = load_rates(session)
+    return [rate._asdict() for rate in cached]
+
+
+def load_rates(session: Session) -> list[Rate]:
+    '''
+    Loads all rates into cache, changed ones reach its listeners
+    '''
+    version = rates.version
+    crypto = session.execute(select_columns(Crypto)).all()
+    loaded = [Rate(*crypt) for crypt in crypto]
+    rates.store(loaded, version, complete=True)
+    return loaded
 
 
 @db_session
@@ -90,70 +123,77 @@ def add_crypto(
 ) -> None:
     session.add(Crypto(crypto_name, purchase_cost, sale_cost))
 
+    after_commit(session, lambda: rates.invalidate(crypto_name))
 
-def purchase(session: Session, user: User, crypto: Crypto, amount: int) -> None:
-    if user.balance < crypto.purchase_cost * amount:
-        raise exceptions.MarketError('Not enough money to purchase')
-
-    user.balance -= crypto.purchase_cost * amount
 
-    session.add(
-        Operation(
-            user.id,
-            crypto.id,
-            'purchase',
-            amount,
-            crypto.purchase_cost,
-            crypto.sale_cost,
-        )
-    )
-
-    # Using 'first()' because we just create portfolio if portfolio doesn't exist
-    portfolio = (
-        session.query(Portfolio)
-        .where(Portfolio.user_id == user.id)
-        .where(Portfolio.crypto_id == crypto.id)
-        .first()
-    )
-
-    if portfolio is None:
-        session.add(Portfolio(user.id, crypto.id, amount))
-    else:
-        portfolio.amount += amount
-
-
-def sale(session: Session, user: User, crypto: Crypto, amount: int) -> None:
-    # Using 'first()' because we raise MarketError if portfolio doesn't exist
-    portfolio = (
-        session.query(Portfolio)
-        .where(Portfolio.user_id == user.id)
-        .where(Portfolio.crypto_id == crypto.id)
-        .first()
-    )
+@db_session
+def update_crypto(
+    crypto_name: str, purchase_cost: int, sale_cost: int, session: Session
+) -> None:
+    crypto = session.query(Crypto).where(Crypto.name == crypto_name).one()
+    crypto.purchase_cost = purchase_cost
+    crypto.sale_cost = sale_cost
+    crypto.last_updated = utcnow()
 
-    if portfolio is None or portfolio.amount < amount:
-        raise exceptions.MarketError('Not enough crypto to sale')
+    rate = trading.to_rate(crypto)
+    candles.record_ticks(session, [rate])
+    after_commit(session, lambda: rates.publish([rate]))
 
-    user.balance += crypto.sale_cost * amount
 
-    session.add(
-        Operation(
-            user.id,
-            crypto.id,
-            'sale',
-            amount,
-            crypto.purchase_cost,
-            crypto.sale_cost,
+@db_session
+def update_all_crypto(
+    new_costs: Callable[[list[int]], list[int]],
+    session: Session,
+    ids: Optional[Collection[int]] = None,
+) -> list[Rate]:
+    '''
+    Updates costs of all crypto, or of crypto with 'ids', in one transaction
+    with one executemany UPDATE, so readers never see a half-updated set
+    of rates. 'new_costs' maps list of current costs to list of new costs.
+    Returns updated rates.
+    '''
+    query = select(Crypto.id, Crypto.name, Crypto.purchase_cost, Crypto.sale_cost)
+    if ids is not None:
+        query = query.where(Crypto.id.in_(ids))
+    crypto = session.execute(query).all()
+    if not crypto:
+        return []
+
+    crypto_ids, names, purchase_costs, sale_costs = zip(*crypto)
+    now = utcnow()
+    new_rates = [
+        Rate(*rate, now)
+        for rate in zip(
+            crypto_ids,
+            names,
+            new_costs(list(purchase_costs)),
+            new_costs(list(sale_costs)),
         )
+    ]
+
+    session.execute(
+        update(Crypto.__table__)
+        .where(Crypto.id == bindparam('rate_id'))
+        .values(
+            purchase_cost=bindparam('rate_purchase_cost'),
+            sale_cost=bindparam('rate_sale_cost'),
+            last_updated=now,
+        ),
+        [
+            {
+                'rate_id': rate.id,
+                'rate_purchase_cost': rate.purchase_cost,
+                'rate_sale_cost': rate.sale_cost,
+            }
+            for rate in new_rates
+        ],
     )
 
-    portfolio.amount -= amount
+    candles.record_ticks(session, new_rates)
+    after_commit(session, lambda: rates.publish(new_rates, complete=ids is None))
+    return new_rates
 
 
-@db_session
-def update_crypto(
-    crypto_name: str, purchase_cost: int, sale_cost: int, session: Session
-) -> None:
-    crypto = session.query(Crypto).where(Crypto.name == crypto_name).one()
-    crypto.purchase_cost = purchase_cost
-    crypto.sale_cost = sale_cost
+def utcnow() -> datetime:
+    # The same precision as 'func.now()' of SQLite
+    return datetime.utcnow().replace(microsecond=0)
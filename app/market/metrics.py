@@ -0,0 +1,295 @@
+import abc
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from flask import Blueprint, Flask, Response, request
+
+bp = Blueprint('metrics', __name__)
+
+Labels = tuple[str, ...]
+# Label values -> value, or -> [bucket counts..., sum, count] of histogram
+Values = dict[Labels, list[float]]
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Shards of finished threads are merged when there are more of them
+MAX_SHARDS = 64
+
+
+class Shards:
+    '''
+    Values of metric by thread. Every thread updates its own shard without
+    locks, the lock is taken only to add a shard of a new thread and to
+    collect. Shards of finished threads are merged into one, so servers
+    starting thread per request don't leak them.
+    '''
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[tuple[threading.Thread, Values]] = []
+        self._finished: Values = {}
+
+    def get(self) -> Values:
+        try:
+            return self._local.shard  # type: ignore[no-any-return]
+        except AttributeError:
+            shard: Values = {}
+            with self._lock:
+                if len(self._shards) >= MAX_SHARDS:
+                    self._merge_finished()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def values(self, labels: Labels) -> list[float]:
+        shard = self.get()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0.0] * self._width
+        return values
+
+    def collect(self) -> Values:
+        with self._lock:
+            self._merge_finished()
+            # Copying a dict is atomic, lists of values are copied after
+            shards = [shard.copy() for _, shard in self._shards]
+            shards.append(self._finished)
+            total: Values = {}
+            for shard in shards:
+                for labels, values in shard.items():
+                    merge(total.setdefault(labels, [0.0] * self._width), values)
+        return total
+
+    def _merge_finished(self) -> None:
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+            for labels, values in shard.items():
+                merge(self._finished.setdefault(labels, [0.0] * self._width), values)
+        self._shards = alive
+
+    def reset(self) -> None:
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._finished = {}
+
+
+def merge(total: list[float], values: list[float]) -> None:
+    for i, value in enumerate(list(values)):
+        total[i] += value
+
+
+class Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, description: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        registry.append(self)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[tuple[str, Labels, tuple[str, ...], float]]:
+        '''
+        (name suffix, label names, label values, value) of every sample
+        '''
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Labels = ()) -> None:
+        super().__init__(name, description, labels)
+        self._shards = Shards(1)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._shards.values(labels)[0] += amount
+
+    def samples(self) -> Iterable[tuple[str, Labels, tuple[str, ...], float]]:
+        for labels, (value,) in sorted(self._shards.collect().items()):
+            yield '', self.labels, labels, value
+
+    def reset(self) -> None:
+        self._shards.reset()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Labels = (),
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        # Buckets, +Inf, sum and count
+        self._shards = Shards(len(buckets) + 3)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Only the first bucket containing value is counted, cumulative
+        # counts are summed on collect
+        values = self._shards.values(labels)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def samples(self) -> Iterable[tuple[str, Labels, tuple[str, ...], float]]:
+        for labels, values in sorted(self._shards.collect().items()):
+            cumulative = 0.0
+            bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                yield '_bucket', (*self.labels, 'le'), (*labels, bound), cumulative
+            yield '_sum', self.labels, labels, values[-2]
+            yield '_count', self.labels, labels, values[-1]
+
+    def reset(self) -> None:
+        self._shards.reset()
+
+
+class Gauge(Metric):
+    '''
+    Values are read by 'collect' on every scrape
+    '''
+
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Labels,
+        collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]],
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.collect = collect
+
+    def samples(self) -> Iterable[tuple[str, Labels, tuple[str, ...], float]]:
+        for labels, value in self.collect():
+            yield '', self.labels, labels, value
+
+
+registry: list[Metric] = []
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render() -> str:
+    '''
+    Prometheus text exposition format 0.0.4
+    '''
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for suffix, names, values, value in metric.samples():
+            labels = ','.join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+            labels = f'{{{labels}}}' if labels else ''
+            lines.append(f'{metric.name}{suffix}{labels} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    for metric in registry:
+        if isinstance(metric, (Counter, Histogram)):
+            metric.reset()
+
+
+REQUEST_DURATION = Histogram(
+    'market_http_request_duration_seconds',
+    'Duration of requests until response is returned',
+    ('route', 'method', 'status'),
+)
+REQUEST_STATEMENTS = Histogram(
+    'market_http_request_sql_statements',
+    'SQL statements executed by request',
+    ('route',),
+    COUNT_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    'market_http_request_sql_duration_seconds',
+    'Time of SQL statements executed by request',
+    ('route',),
+)
+
+
+class RequestStats:
+    '''
+    Duration and SQL statements of the current request. They are kept in
+    a context variable, so requests of threads and async requests sharing
+    the event loop thread are counted apart.
+    '''
+
+    def __init__(self) -> None:
+        # [start, statements, SQL duration] of request or None
+        self._current: ContextVar[Optional[list[float]]] = ContextVar(
+            'request_stats', default=None
+        )
+
+    def start(self) -> None:
+        self._current.set([time.perf_counter(), 0, 0.0])
+
+    def add_statement(self, duration: float) -> None:
+        current = self._current.get()
+        if current is not None:
+            current[1] += 1
+            current[2] += duration
+
+    def finish(self, route: str, method: str, status: int) -> None:
+        '''
+        Observes metrics of the started request once
+        '''
+        current = self._current.get()
+        if current is None:
+            return
+        self._current.set(None)
+
+        start, statements, sql_duration = current
+        REQUEST_DURATION.observe(
+            time.perf_counter() - start, route, method, str(status)
+        )
+        REQUEST_STATEMENTS.observe(statements, route)
+        REQUEST_SQL_DURATION.observe(sql_duration, route)
+
+
+request_stats = RequestStats()
+
+
+def init_app(app: Flask) -> None:
+    app.before_request(request_stats.start)
+    app.after_request(finish_request)
+
+
+def finish_request(response: Response) -> Response:
+    # Route template, not path, keeps the number of series bounded
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_stats.finish(route, request.method, response.status_code)
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics() -> Optional[Response]:
+    '''
+    GET - Metrics in Prometheus text format
+    '''
+    if request.method == 'GET':
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return None
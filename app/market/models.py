@@ -1,4 +1,5 @@
-from typing import Any
+from functools import lru_cache
+from typing import Any, Iterable
 
 from sqlalchemy import (
     CheckConstraint,
@@ -6,12 +7,15 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     ForeignKeyConstraint,
+    Index,
     Integer,
     PrimaryKeyConstraint,
     String,
     func,
+    select,
 )
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import Select
 
 from app.market.database import Base
 
@@ -23,6 +27,27 @@ def serialized(model: Base) -> Any:
     return {c.name: getattr(model, c.name) for c in model.__table__.columns}
 
 
+def select_columns(model: Base) -> Select:
+    return select(*model.__table__.columns)
+
+
+@lru_cache(maxsize=None)
+def fields(model: Base) -> tuple[str, ...]:
+    '''
+    Names of columns in the order of 'model.__table__.columns', so rows of
+    'select(*model.__table__.columns)' are serialized by zipping
+    '''
+    return tuple(c.name for c in model.__table__.columns)
+
+
+def serialized_rows(model: Base, rows: Iterable[Any]) -> list[dict[str, Any]]:
+    '''
+    The same dicts as 'serialized()' gives for ORM objects of 'model'
+    '''
+    keys = fields(model)
+    return [dict(zip(keys, row)) for row in rows]
+
+
 # 'amount', 'balance', 'purchase_cost' and 'sale_cost' are
 # multiplied by 100 and stored as integers.
 # For example 1005.45 units of some crypto turns into 100545
@@ -80,6 +105,8 @@ class Portfolio(Base):
     __table_args__ = (
         PrimaryKeyConstraint('user_id', 'crypto_id'),
         CheckConstraint('amount >= 0'),
+        # Foreign key to 'crypto'
+        Index('ix_portfolio_crypto_id', 'crypto_id'),
     )
 
     user = relationship('User', lazy='joined')
@@ -115,6 +142,10 @@ class Operation(Base):
         CheckConstraint('amount >= 0'),
         CheckConstraint('purchase_cost > 0'),
         CheckConstraint('sale_cost > 0'),
+        # History of user ordered by (created, id)
+        Index('ix_operation_user_id_created_id', 'user_id', 'created', 'id'),
+        # Composite foreign key to 'portfolio'
+        Index('ix_operation_user_id_crypto_id', 'user_id', 'crypto_id'),
     )
 
     user = relationship('User', lazy='joined')
@@ -136,3 +167,74 @@ class Operation(Base):
         self.amount = amount
         self.purchase_cost = purchase_cost
         self.sale_cost = sale_cost
+
+
+class RateTick(Base):
+    '''
+    Costs of crypto at every update, 'time' is unix time in seconds
+    '''
+
+    __tablename__ = 'rate_tick'
+
+    crypto_id = Column(Integer, ForeignKey('crypto.id'), nullable=False)
+    time = Column(Integer, nullable=False)
+    purchase_cost = Column(Integer, nullable=False)
+    sale_cost = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('crypto_id', 'time'),
+        # Rollup and retention read ticks by time of all crypto
+        Index('ix_rate_tick_time', 'time'),
+        {'sqlite_with_rowid': False},
+    )
+
+
+class RateCandle(Base):
+    '''
+    OHLC of costs for 'interval' seconds starting at unix time 'start'
+    '''
+
+    __tablename__ = 'rate_candle'
+
+    crypto_id = Column(Integer, ForeignKey('crypto.id'), nullable=False)
+    interval = Column(Integer, nullable=False)
+    start = Column(Integer, nullable=False)
+
+    purchase_open = Column(Integer, nullable=False)
+    purchase_high = Column(Integer, nullable=False)
+    purchase_low = Column(Integer, nullable=False)
+    purchase_close = Column(Integer, nullable=False)
+
+    sale_open = Column(Integer, nullable=False)
+    sale_high = Column(Integer, nullable=False)
+    sale_low = Column(Integer, nullable=False)
+    sale_close = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('crypto_id', 'interval', 'start'),
+        Index('ix_rate_candle_interval_start', 'interval', 'start'),
+        {'sqlite_with_rowid': False},
+    )
+
+
+class RateRollup(Base):
+    '''
+    Candles of 'interval' are rolled up for all time before 'until'
+    '''
+
+    __tablename__ = 'rate_rollup'
+
+    interval = Column(Integer, primary_key=True)
+    until = Column(Integer, nullable=False)
+
+
+class Lease(Base):
+    '''
+    Job 'name' is run only by 'holder' until 'expires'
+    '''
+
+    __tablename__ = 'lease'
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(200), nullable=False)
+    expires = Column(DateTime, nullable=False)
@@ -0,0 +1,155 @@
+'''
+In-memory limit order books. Orders of one crypto are matched by
+price-time priority: the best price first, the earliest order first
+among orders of the same price. Order ids grow with time, so they are
+used as time.
+'''
+import heapq
+import threading
+from typing import Optional
+
+from app.market import exceptions
+
+SIDES = ('buy', 'sell')
+
+
+class BookOrder:
+    __slots__ = ('id', 'user_id', 'side', 'price', 'remaining')
+
+    def __init__(
+        self, order_id: int, user_id: int, side: str, price: int, remaining: int
+    ) -> None:
+        self.id = order_id
+        self.user_id = user_id
+        self.side = side
+        self.price = price
+        self.remaining = remaining
+
+
+# (price, id, order), price of bids is negated, so the best order is first
+Entry = tuple[int, int, BookOrder]
+
+
+class Book:
+    '''
+    Open orders of one crypto in two heaps, bids and asks. Removed orders
+    stay in heaps until they reach the top, so adding, removing and
+    taking the best order are O(log n). 'lock' is held while the book
+    and its orders in DB are changed together. 'version' is the version
+    of orders in DB the book has.
+    '''
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.version = 0
+        self.orders: dict[int, BookOrder] = {}
+        self._heaps: dict[str, list[Entry]] = {side: [] for side in SIDES}
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def add(self, order: BookOrder) -> None:
+        self.orders[order.id] = order
+        self._push(order)
+
+    def remove(self, order_id: int) -> Optional[BookOrder]:
+        return self.orders.pop(order_id, None)
+
+    def clear(self) -> None:
+        self.orders = {}
+        self._heaps = {side: [] for side in SIDES}
+
+    def best(self, side: str) -> Optional[BookOrder]:
+        heap = self._heaps[side]
+        while heap:
+            order = heap[0][2]
+            if self.orders.get(order.id) is order:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def take(
+        self, side: str, price: int, amount: int, user_id: int
+    ) -> list[tuple[BookOrder, int]]:
+        '''
+        Pops orders of the other side crossing limit 'price' of 'side'
+        until 'amount' is taken. Returns (order, amount taken of it),
+        they are put back by 'settle' or 'restore'. Raises MarketError
+        and takes nothing if an order of 'user_id' would be taken.
+        '''
+        other = 'sell' if side == 'buy' else 'buy'
+        taken: list[tuple[BookOrder, int]] = []
+        while amount > 0:
+            order = self.best(other)
+            if order is None or (
+                order.price > price if side == 'buy' else order.price < price
+            ):
+                break
+            if order.user_id == user_id:
+                self.restore(taken)
+                raise exceptions.MarketError('Order would trade with own order')
+            heapq.heappop(self._heaps[other])
+            amount_taken = min(amount, order.remaining)
+            taken.append((order, amount_taken))
+            amount -= amount_taken
+        return taken
+
+    def settle(self, taken: list[tuple[BookOrder, int]]) -> None:
+        '''
+        Decreases taken orders, filled ones are removed
+        '''
+        for order, amount in taken:
+            order.remaining -= amount
+            if order.remaining > 0:
+                self._push(order)
+            else:
+                self.orders.pop(order.id, None)
+
+    def restore(self, taken: list[tuple[BookOrder, int]]) -> None:
+        for order, _ in taken:
+            self._push(order)
+
+    def depth(self, side: str) -> list[tuple[int, int]]:
+        '''
+        (price, amount) of every price of 'side', the best first
+        '''
+        levels: dict[int, int] = {}
+        for order in self.orders.values():
+            if order.side == side:
+                levels[order.price] = levels.get(order.price, 0) + order.remaining
+        return sorted(levels.items(), reverse=side == 'buy')
+
+    def _push(self, order: BookOrder) -> None:
+        key = -order.price if order.side == 'buy' else order.price
+        heapq.heappush(self._heaps[order.side], (key, order.id, order))
+
+
+class Books:
+    '''
+    Books by crypto id, a book is loaded from DB on first use
+    '''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._books: dict[int, Book] = {}
+
+    def get(self, crypto_id: int) -> Optional[Book]:
+        return self._books.get(crypto_id)
+
+    def put(self, crypto_id: int, book: Book) -> Book:
+        '''
+        Stores 'book' unless another one is stored, returns the stored one
+        '''
+        with self._lock:
+            return self._books.setdefault(crypto_id, book)
+
+    def drop(self, crypto_id: int) -> None:
+        with self._lock:
+            self._books.pop(crypto_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._books = {}
+
+
+books = Books()
@@ -0,0 +1,105 @@
+'''
+Models of limit orders and their fills
+'''
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+)
+
+from app.market.database import Base
+
+
+class Order(Base):
+    '''
+    Limit order to buy or sell 'amount' of crypto at 'price' or better.
+    Money of buy orders and crypto of sell orders are reserved when
+    they're placed, 'remaining' is returned when they're cancelled.
+    '''
+
+    __tablename__ = 'limit_order'
+
+    id = Column(Integer, primary_key=True)
+
+    user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    crypto_id = Column(Integer, ForeignKey('crypto.id'), nullable=False)
+
+    side = Column(String(4), nullable=False)
+    price = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+    remaining = Column(Integer, nullable=False)
+    status = Column(String(10), nullable=False, default='open')
+
+    created = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        CheckConstraint('side in ("buy", "sell")'),
+        CheckConstraint('status in ("open", "filled", "cancelled")'),
+        CheckConstraint('price > 0'),
+        CheckConstraint('amount > 0'),
+        CheckConstraint('remaining >= 0 and remaining <= amount'),
+        # Books are loaded from open orders of crypto
+        Index('ix_limit_order_crypto_id_status', 'crypto_id', 'status'),
+        Index('ix_limit_order_user_id_status', 'user_id', 'status'),
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        crypto_id: int,
+        side: str,
+        price: int,
+        amount: int,
+        remaining: int,
+    ) -> None:
+        self.user_id = user_id
+        self.crypto_id = crypto_id
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.remaining = remaining
+        self.status = 'open' if remaining else 'filled'
+
+
+class Fill(Base):
+    '''
+    Match of buy and sell orders, 'price' is the price of the earlier one
+    '''
+
+    __tablename__ = 'fill'
+
+    id = Column(Integer, primary_key=True)
+
+    crypto_id = Column(Integer, ForeignKey('crypto.id'), nullable=False)
+    buy_order_id = Column(Integer, ForeignKey('limit_order.id'), nullable=False)
+    sell_order_id = Column(Integer, ForeignKey('limit_order.id'), nullable=False)
+
+    price = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False)
+
+    created = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        CheckConstraint('price > 0'),
+        CheckConstraint('amount > 0'),
+        # Foreign keys to 'limit_order'
+        Index('ix_fill_buy_order_id', 'buy_order_id'),
+        Index('ix_fill_sell_order_id', 'sell_order_id'),
+    )
+
+
+class BookVersion(Base):
+    '''
+    Version of open orders of crypto, it's increased by every transaction
+    changing them, so a book in memory is checked against DB by version
+    '''
+
+    __tablename__ = 'order_book'
+
+    crypto_id = Column(Integer, ForeignKey('crypto.id'), primary_key=True)
+    version = Column(Integer, nullable=False)
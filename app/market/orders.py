@@ -0,0 +1,263 @@
+'''
+Limit orders of users matched against each other. Orders are matched
+by in-memory books of 'orderbook' and settled by 'settlement' with the
+same balance and portfolio updates as purchase and sale. Books are loaded
+from open orders in DB at start and when a book is first used. Every
+transaction changing orders increases version of their book in DB, a book
+behind it was changed by another process and is reloaded before matching.
+'''
+from typing import Any, Optional
+
+from flask import Blueprint, Response, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.market import exceptions, schemas, settlement, trading
+from app.market.cache import rates
+from app.market.database import create_session
+from app.market.models import Crypto
+from app.market.orderbook import Book, BookOrder, books
+from app.market.ordermodels import Fill, Order
+
+bp = Blueprint('orders', __name__)
+
+
+def load_book(crypto_id: int) -> Book:
+    book = books.get(crypto_id)
+    if book is not None:
+        return book
+
+    book = Book()
+    with create_session(readonly=True) as session:
+        fill_book(session, book, crypto_id, settlement.get_version(session, crypto_id))
+    return books.put(crypto_id, book)
+
+
+def fill_book(session: Session, book: Book, crypto_id: int, version: int) -> None:
+    '''
+    Replaces orders of 'book' by open orders of 'version' in DB
+    '''
+    rows = session.execute(
+        select(Order.id, Order.user_id, Order.side, Order.price, Order.remaining)
+        .where(Order.crypto_id == crypto_id, Order.status == 'open')
+        .order_by(Order.id)
+    ).all()
+
+    book.clear()
+    for row in rows:
+        book.add(BookOrder(*row))
+    book.version = version
+
+
+def load_books() -> None:
+    '''
+    Loads books of all crypto with open orders
+    '''
+    with create_session(readonly=True) as session:
+        crypto_ids = session.execute(
+            select(Order.crypto_id).where(Order.status == 'open').distinct()
+        ).scalars()
+    for crypto_id in crypto_ids:
+        load_book(crypto_id)
+
+
+def get_crypto_id(crypto_name: str) -> int:
+    # Ids of crypto never change
+    rate = rates.get(crypto_name)
+    if rate is not None:
+        return rate.id
+
+    with create_session(readonly=True) as session:
+        crypto_id = session.execute(
+            select(Crypto.id).where(Crypto.name == crypto_name)
+        ).scalar()
+    if crypto_id is None:
+        raise exceptions.MarketError('Crypto not found')
+    return crypto_id  # type: ignore[no-any-return]
+
+
+def place_order(
+    login: str, crypto_name: str, side: str, price: int, amount: int
+) -> dict[str, Any]:
+    '''
+    Reserves money or crypto of order, matches it with orders of the other
+    side at their prices and puts the rest into the book. The book is locked
+    until the transaction is committed. Returns the order and its fills.
+    '''
+    # Reserved money must fit SQLite INTEGER
+    trading.total(price, amount)
+    crypto_id = get_crypto_id(crypto_name)
+    try:
+        return match_order(login, crypto_id, side, price, amount)
+    except settlement.StaleBook:
+        books.drop(crypto_id)
+    return match_order(login, crypto_id, side, price, amount)
+
+
+def match_order(
+    login: str, crypto_id: int, side: str, price: int, amount: int
+) -> dict[str, Any]:
+    book = load_book(crypto_id)
+    with book.lock:
+        taken: list[tuple[BookOrder, int]] = []
+        try:
+            with create_session() as session:
+                version = settlement.next_version(session, crypto_id)
+                if book.version != version - 1:
+                    fill_book(session, book, crypto_id, version - 1)
+                user_id = trading.get_user_id(session, login)
+                taken = book.take(side, price, amount, user_id)
+                remaining = amount - sum(fill_amount for _, fill_amount in taken)
+                order = settlement.reserve(
+                    session, Order(user_id, crypto_id, side, price, amount, remaining)
+                )
+                fills = [
+                    settlement.settle(session, order, maker, fill_amount)
+                    for maker, fill_amount in taken
+                ]
+                result = serialized_order(order, fills)
+        except Exception:
+            book.restore(taken)
+            raise
+
+        book.settle(taken)
+        book.version = version
+        if result['remaining']:
+            book.add(BookOrder(result['id'], user_id, side, price, result['remaining']))
+
+    return result
+
+
+def cancel_order(login: str, order_id: int) -> dict[str, Any]:
+    '''
+    Cancels open order and returns reserved money or crypto of its rest
+    '''
+    with create_session(readonly=True) as session:
+        crypto_id = session.execute(
+            select(Order.crypto_id).where(Order.id == order_id)
+        ).scalar()
+    if crypto_id is None:
+        raise exceptions.MarketError('Order not found')
+
+    book = load_book(crypto_id)
+    with book.lock:
+        with create_session() as session:
+            user_id = trading.get_user_id(session, login)
+            order = session.execute(
+                select(Order).where(Order.id == order_id, Order.user_id == user_id)
+            ).scalar()
+            if order is None:
+                raise exceptions.MarketError('Order not found')
+            if order.status != 'open':
+                raise exceptions.MarketError('Order is not open')
+
+            if order.side == 'buy':
+                trading.credit(session, user_id, order.price * order.remaining)
+            else:
+                trading.add_to_portfolio(session, user_id, crypto_id, order.remaining)
+            order.status = 'cancelled'
+            result = serialized_order(order, [])
+            version = settlement.next_version(session, crypto_id)
+
+        book.remove(order_id)
+        # Stale book stays behind and is reloaded by the next match
+        if book.version == version - 1:
+            book.version = version
+
+    return result
+
+
+def get_orders(login: str) -> list[dict[str, Any]]:
+    '''
+    Open orders of user, the earliest first
+    '''
+    with create_session(readonly=True) as session:
+        user_id = trading.get_user_id(session, login)
+        orders = (
+            session.execute(
+                select(Order)
+                .where(Order.user_id == user_id, Order.status == 'open')
+                .order_by(Order.id)
+            )
+            .scalars()
+            .all()
+        )
+        return [serialized_order(order, []) for order in orders]
+
+
+def get_book(crypto_name: str) -> dict[str, list[dict[str, int]]]:
+    '''
+    Prices of open orders and their total amounts, the best first
+    '''
+    book = load_book(get_crypto_id(crypto_name))
+    with book.lock:
+        return {
+            side: [
+                {'price': price, 'amount': amount} for price, amount in book.depth(side)
+            ]
+            for side in ('buy', 'sell')
+        }
+
+
+def serialized_order(order: Order, fills: list[Fill]) -> dict[str, Any]:
+    return {
+        'id': order.id,
+        'side': order.side,
+        'price': order.price,
+        'amount': order.amount,
+        'remaining': order.remaining,
+        'status': order.status,
+        'fills': [{'price': fill.price, 'amount': fill.amount} for fill in fills],
+    }
+
+
+@bp.route('/users/<string:login>/orders', methods=['GET', 'POST'])
+def users_orders(login: str) -> Optional[Response]:
+    '''
+    GET - Get user's open orders
+    POST - Place limit order
+    '''
+    if request.method == 'GET':
+
+        orders_list = get_orders(login)
+
+        return jsonify(orders_list)
+
+    if request.method == 'POST':
+        data = schemas.order(request.get_json())
+
+        order = place_order(login, **data)
+
+        response = jsonify(order)
+        response.status_code = 201
+        return response
+
+    return None
+
+
+@bp.route('/users/<string:login>/orders/<int:order_id>', methods=['DELETE'])
+def users_order(login: str, order_id: int) -> Optional[Response]:
+    '''
+    DELETE - Cancel open order
+    '''
+    if request.method == 'DELETE':
+
+        order = cancel_order(login, order_id)
+
+        return jsonify(order)
+
+    return None
+
+
+@bp.route('/crypto/<string:crypto_name>/book', methods=['GET'])
+def crypto_book(crypto_name: str) -> Optional[Response]:
+    '''
+    GET - Get prices of open orders and their amounts
+    '''
+    if request.method == 'GET':
+
+        book = get_book(crypto_name)
+
+        return jsonify(book)
+
+    return None
@@ -0,0 +1,88 @@
+import abc
+from typing import Optional
+
+import numpy as np
+
+from app.market.config import (
+    MARKET_PRICE_DRIFT,
+    MARKET_PRICE_JITTER,
+    MARKET_PRICE_MODEL,
+    MARKET_PRICE_SEED,
+    MARKET_PRICE_VOLATILITY,
+)
+
+
+class PriceModel(abc.ABC):
+    '''
+    Maps costs of all crypto to new costs in one array operation.
+    Costs are integers multiplied by 100 as in models, new costs are
+    at least 1.
+    '''
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, costs: list[int]) -> list[int]:
+        new_costs = self.step(np.asarray(costs, dtype=np.int64))
+        return np.maximum(new_costs, 1).tolist()  # type: ignore[no-any-return]
+
+    @abc.abstractmethod
+    def step(self, costs: np.ndarray) -> np.ndarray:
+        '''
+        New costs, may be less than 1
+        '''
+
+
+class UniformJitter(PriceModel):
+    '''
+    Changes every cost by random whole percent from -jitter to jitter
+    '''
+
+    def __init__(self, seed: Optional[int] = None, jitter: int = MARKET_PRICE_JITTER):
+        super().__init__(seed)
+        self.jitter = jitter
+
+    def step(self, costs: np.ndarray) -> np.ndarray:
+        percents = self.rng.integers(-self.jitter, self.jitter + 1, costs.size)
+        # Integer arithmetic truncates like int() of the float cost
+        return costs * (100 + percents) // 100
+
+
+class GeometricBrownianMotion(PriceModel):
+    '''
+    Multiplies every cost by exp((drift - volatility^2 / 2) + volatility * Z)
+    with standard normal Z, drift and volatility are per update
+    '''
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        drift: float = MARKET_PRICE_DRIFT,
+        volatility: float = MARKET_PRICE_VOLATILITY,
+    ):
+        super().__init__(seed)
+        self.drift = drift
+        self.volatility = volatility
+
+    def step(self, costs: np.ndarray) -> np.ndarray:
+        shocks = self.rng.standard_normal(costs.size)
+        growth = np.exp(
+            self.drift - self.volatility**2 / 2 + self.volatility * shocks
+        )
+        return np.rint(costs * growth).astype(np.int64)
+
+
+MODELS: dict[str, type[PriceModel]] = {
+    'uniform': UniformJitter,
+    'gbm': GeometricBrownianMotion,
+}
+
+
+def make_model(
+    name: str = MARKET_PRICE_MODEL, seed: Optional[int] = MARKET_PRICE_SEED
+) -> PriceModel:
+    try:
+        model = MODELS[name]
+    except KeyError:
+        raise ValueError(f'Unknown price model: {name!r}') from None
+    return model(seed)
@@ -0,0 +1,130 @@
+'''
+Read model of users, balances and portfolios. With MARKET_READ_MODEL
+GET routes of users are served from snapshots in 'cache.users' instead
+of DB. Writes of this process invalidate snapshots of changed users on
+commit, so they are seen by the next read. Writes of other processes
+sharing DB are seen after MARKET_READ_MODEL_MAX_AGE at most. Rates are
+served by 'cache.rates' in the same way.
+'''
+import time
+from collections import defaultdict
+from typing import Collection, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.market.cache import UserSnapshot, users
+from app.market.config import MARKET_READ_MODEL
+from app.market.database import after_commit, create_session
+from app.market.models import Portfolio, User
+
+# More stale users are reloaded by one full read
+MAX_STALE_RELOAD = 500
+
+
+def load(
+    session: Session,
+    logins: Optional[Collection[str]] = None,
+    ids: Optional[Collection[int]] = None,
+) -> list[UserSnapshot]:
+    '''
+    Snapshots of all users or of users with 'logins' or 'ids' by id.
+    Both queries run in one read transaction of 'session'.
+    '''
+    loaded = time.monotonic()
+    user_query = select(User.id, User.login, User.balance).order_by(User.id)
+    portfolio_query = select(
+        Portfolio.user_id, Portfolio.crypto_id, Portfolio.amount
+    ).order_by(Portfolio.user_id, Portfolio.crypto_id)
+    if logins is not None:
+        user_query = user_query.where(User.login.in_(logins))
+        portfolio_query = portfolio_query.join(
+            User, User.id == Portfolio.user_id
+        ).where(User.login.in_(logins))
+    elif ids is not None:
+        user_query = user_query.where(User.id.in_(ids))
+        portfolio_query = portfolio_query.where(Portfolio.user_id.in_(ids))
+
+    rows = session.execute(user_query).all()
+    portfolios: dict[int, list[tuple[int, int]]] = defaultdict(list)
+    for user_id, crypto_id, amount in session.execute(portfolio_query):
+        portfolios[user_id].append((crypto_id, amount))
+
+    return [
+        UserSnapshot(user_id, login, balance, tuple(portfolios[user_id]), loaded)
+        for user_id, login, balance in rows
+    ]
+
+
+def load_all(session: Session) -> list[UserSnapshot]:
+    started = time.monotonic()
+    snapshots = load(session)
+    users.store_all(snapshots, started)
+    return snapshots
+
+
+def rebuild() -> None:
+    '''
+    Loads all users at start
+    '''
+    if MARKET_READ_MODEL:
+        with create_session(readonly=True) as session:
+            load_all(session)
+
+
+def get_user(session: Session, login: str) -> Optional[UserSnapshot]:
+    '''
+    Fresh snapshot of user, it's read from DB if it's missing or stale.
+    None if read model is disabled or user doesn't exist.
+    '''
+    if not MARKET_READ_MODEL:
+        return None
+
+    snapshot = users.get(login)
+    if snapshot is not None:
+        return snapshot
+
+    snapshots = load(session, logins=(login,))
+    users.store(snapshots)
+    return snapshots[0] if snapshots else None
+
+
+def get_all(session: Session) -> Optional[list[UserSnapshot]]:
+    '''
+    Snapshots of all users by id, stale ones are reloaded.
+    None if read model is disabled.
+    '''
+    if not MARKET_READ_MODEL:
+        return None
+
+    snapshots = users.all()
+    if snapshots is None:
+        return load_all(session)
+
+    stale = users.stale()
+    if not stale:
+        return snapshots
+    if len(stale) > MAX_STALE_RELOAD:
+        return load_all(session)
+
+    reloaded = load(session, ids=stale)
+    users.store(reloaded)
+    by_id = {snapshot.id: snapshot for snapshot in reloaded}
+    return [by_id.get(snapshot.id, snapshot) for snapshot in snapshots]
+
+
+def touch(session: Session, user_id: int) -> None:
+    '''
+    Invalidates snapshot of user after 'session' changing it is committed
+    '''
+    if MARKET_READ_MODEL:
+        after_commit(session, lambda: users.invalidate((user_id,)))
+
+
+def add(session: Session, user_id: int, login: str, balance: int) -> None:
+    '''
+    Stores snapshot of new user after 'session' adding it is committed
+    '''
+    if MARKET_READ_MODEL:
+        snapshot = UserSnapshot(user_id, login, balance, (), time.monotonic())
+        after_commit(session, lambda: users.store((snapshot,)))
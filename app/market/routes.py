@@ -1,20 +1,59 @@
-from typing import Optional, Tuple
+from typing import Any, Iterable, Optional, Tuple
 
 from flask import Blueprint, Response, jsonify, request
 
-from app.market import exceptions, market
+from app.market import (
+    batch,
+    bulk,
+    candles,
+    exceptions,
+    feed,
+    history,
+    market,
+    metrics,
+    orders,
+    schemas,
+    slowlog,
+    valuation,
+)
+from app.market.config import MARKET_PAGE_MAX_SIZE, MARKET_PAGE_SIZE
 
 bp = Blueprint('market', __name__)
+bp.register_blueprint(valuation.bp)
+bp.register_blueprint(feed.bp)
+bp.register_blueprint(candles.bp)
+bp.register_blueprint(metrics.bp)
+bp.register_blueprint(slowlog.bp)
+bp.register_blueprint(orders.bp)
 
 
 @bp.errorhandler(exceptions.DatabaseError)
 def handle_database_error(error: exceptions.DatabaseError) -> Tuple[Response, int]:
-    return jsonify(error), 500
+    return jsonify({'message': str(error)}), 500
+
+
+@bp.errorhandler(exceptions.ValidationError)
+def handle_validation_error(error: exceptions.ValidationError) -> Tuple[Response, int]:
+    return jsonify(error.as_dict()), 422
 
 
 @bp.errorhandler(exceptions.MarketError)
 def handle_market_error(error: exceptions.MarketError) -> Tuple[Response, int]:
-    return jsonify(error), 400
+    return jsonify({'message': str(error)}), 400
+
+
+def bulk_rows() -> Optional[Iterable[Any]]:
+    '''
+    Rows of bulk request: NDJSON body is read lazily line by line,
+    JSON body must be a list
+    '''
+    if request.mimetype == 'application/x-ndjson':
+        return bulk.parse_ndjson(request.stream)
+
+    data = request.get_json()
+    if not isinstance(data, list) or not data:
+        return None
+    return data
 
 
 @bp.route('/users', methods=['GET', 'POST'])
@@ -30,18 +69,31 @@ def users() -> Optional[Response]:
         return jsonify(users_list)
 
     if request.method == 'POST':
-        data = request.get_json()
+        data = schemas.user(request.get_json())
 
-        if not data:
-            return Response(status=422)
-        try:
-            login = data['login']
-        except KeyError:
+        market.add_user(data['login'])
+
+        return Response(status=201)
+
+    return None
+
+
+@bp.route('/users/bulk', methods=['POST'])
+def users_bulk() -> Optional[Response]:
+    '''
+    POST - Register list of users
+    '''
+    if request.method == 'POST':
+        rows = bulk_rows()
+
+        if rows is None:
             return Response(status=422)
 
-        market.add_user(login)
+        report = bulk.add_users(rows)
 
-        return Response(status=201)
+        response = jsonify(report)
+        response.status_code = 201
+        return response
 
     return None
 
@@ -53,31 +105,71 @@ def users_operations(login: str) -> Optional[Response]:
     POST - Sale or purchase crypto
     '''
     if request.method == 'GET':
+        if 'stream' in request.args:
+            return history.stream_operations(login, request.args['stream'])
+        if 'after' in request.args or 'limit' in request.args:
+            return operations_page(login)
 
         operations_list = market.get_operations(login)
 
         return jsonify(operations_list)
 
     if request.method == 'POST':
-        data = request.get_json()
+        data = schemas.operation(request.get_json())
 
-        if not data:
-            return Response(status=422)
-        try:
-            crypto_name = data['crypto_name']
-            operation_type = data['operation_type']
-            amount = data['amount']
-            time_str = data['time_str']
-        except KeyError:
-            return Response(status=422)
-
-        market.add_operation(login, crypto_name, operation_type, amount, time_str)
+        market.add_operation(login, **data)
 
         return Response(status=201)
 
     return None
 
 
+def operations_page(login: str) -> Response:
+    '''
+    Page of history, cursor of the next page is in 'X-Next-Cursor' header
+    '''
+    try:
+        limit = int(request.args.get('limit', MARKET_PAGE_SIZE))
+    except ValueError:
+        return Response(status=422)
+    if not 0 < limit <= MARKET_PAGE_MAX_SIZE:
+        return Response(status=422)
+
+    operations_list, cursor = history.get_operations_page(
+        login, request.args.get('after'), limit
+    )
+
+    response = jsonify(operations_list)
+    if cursor is not None:
+        response.headers['X-Next-Cursor'] = cursor
+    return response
+
+
+@bp.route('/users/<string:login>/operations/batch', methods=['POST'])
+def users_operations_batch(login: str) -> Optional[Response]:
+    '''
+    POST - Sale or purchase crypto by list of operations in one transaction
+    '''
+    if request.method == 'POST':
+        data = schemas.operations_batch(request.get_json())
+
+        try:
+            results = batch.add_operations(login, data['operations'], data['atomic'])
+        except exceptions.BatchError as error:
+            response = jsonify(error.results)
+            response.status_code = 400
+            return response
+
+        response = jsonify(results)
+        if all(result['status'] == 'ok' for result in results):
+            response.status_code = 201
+        else:
+            response.status_code = 207
+        return response
+
+    return None
+
+
 @bp.route('/users/<string:login>/balance', methods=['GET'])
 def users_balance(login: str) -> Optional[Response]:
     '''
@@ -119,19 +211,30 @@ def crypto() -> Optional[Response]:
         return jsonify(crypto_list)
 
     if request.method == 'POST':
-        data = request.get_json()
+        data = schemas.crypto(request.get_json())
 
-        if not data:
-            return Response(status=422)
-        try:
-            crypto_name = data['crypto_name']
-            purchase_cost = data['purchase_cost']
-            sale_cost = data['sale_cost']
-        except KeyError:
+        market.add_crypto(**data)
+
+        return Response(status=201)
+
+    return None
+
+
+@bp.route('/crypto/bulk', methods=['POST'])
+def crypto_bulk() -> Optional[Response]:
+    '''
+    POST - Add list of crypto
+    '''
+    if request.method == 'POST':
+        rows = bulk_rows()
+
+        if rows is None:
             return Response(status=422)
 
-        market.add_crypto(crypto_name, purchase_cost, sale_cost)
+        report = bulk.add_crypto(rows)
 
-        return Response(status=201)
+        response = jsonify(report)
+        response.status_code = 201
+        return response
 
     return None
@@ -0,0 +1,86 @@
+import heapq
+import math
+import random
+from typing import NamedTuple, Optional
+
+
+class Due(NamedTuple):
+    key: int
+    # Seconds since the due time, negative if it's taken early
+    lateness: float
+    # Whole intervals passed without update
+    missed: int
+
+
+class Schedule:
+    '''
+    Heap of next due times of keys on monotonic clock. The next due time
+    is the previous one plus interval, not the time of update plus
+    interval, so slow updates don't shift later ones. Keys that fell
+    behind by whole intervals skip them and report them as missed.
+    '''
+
+    def __init__(self, rng: Optional[random.Random] = None) -> None:
+        self._heap: list[tuple[float, int]] = []
+        # Removed keys stay in heap until popped, entry is valid
+        # if its due time is the current one of the key
+        self._due: dict[int, float] = {}
+        self._intervals: dict[int, float] = {}
+        self._rng = rng or random.Random()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._due
+
+    def keys(self) -> set[int]:
+        return set(self._due)
+
+    def add(self, key: int, interval: float, now: float, within: float) -> None:
+        '''
+        The first due time is random within 'within' seconds, so keys added
+        together are spread over the interval instead of being due at once
+        '''
+        self._intervals[key] = interval
+        self._push(key, now + self._rng.uniform(0, max(0.0, min(within, interval))))
+
+    def set_interval(self, key: int, interval: float) -> None:
+        '''
+        The new interval is used from the next due time
+        '''
+        self._intervals[key] = interval
+
+    def remove(self, key: int) -> None:
+        self._due.pop(key, None)
+        self._intervals.pop(key, None)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap:
+            due, key = self._heap[0]
+            if self._due.get(key) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: float, ahead: float = 0.0, limit: int = 0) -> list[Due]:
+        '''
+        Keys due until 'now + ahead', at most 'limit' of them if it's set,
+        are rescheduled and returned
+        '''
+        result: list[Due] = []
+        while not limit or len(result) < limit:
+            due = self.next_due()
+            if due is None or due > now + ahead:
+                break
+            key = heapq.heappop(self._heap)[1]
+            interval = self._intervals[key]
+
+            missed = max(0, math.floor((now - due) / interval))
+            self._push(key, due + (missed + 1) * interval)
+            result.append(Due(key, now - due, missed))
+        return result
+
+    def _push(self, key: int, due: float) -> None:
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
@@ -0,0 +1,210 @@
+'''
+Declarative schemas of request bodies. Every schema is compiled once into
+a validator: a chain of checks built for its fields, so a request isn't
+checked by walking the schema. Validators return values to pass to
+'market' or raise ValidationError with errors of all fields.
+'''
+from datetime import datetime, timezone
+from typing import Any, Callable, NamedTuple, Optional, Union
+
+from app.market.config import DATETIME_FORMAT, MARKET_BATCH_MAX_SIZE
+from app.market.exceptions import ValidationError
+
+Errors = list[dict[str, str]]
+# (value, path of field, errors) -> converted value, errors are appended
+Check = Callable[[Any, str, Errors], Any]
+Validator = Callable[[Any], dict[str, Any]]
+
+MAX_INT = 2**63 - 1  # SQLite INTEGER
+KIND_NAMES: dict[Union[type, str], str] = {
+    str: 'a string',
+    int: 'an integer',
+    bool: 'a boolean',
+}
+MONTHS = {
+    month: number
+    for number, month in enumerate(
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun')
+        + ('Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'),
+        1,
+    )
+}
+
+
+class Field(NamedTuple):
+    kind: Union[type, str]  # str, int, bool, list or 'time'
+    required: bool = True
+    default: Any = None
+    min: Optional[int] = None
+    max: Optional[int] = None
+    choices: tuple[Any, ...] = ()
+    items: Optional[dict[str, 'Field']] = None
+
+
+def parse_time(value: Any) -> datetime:
+    '''
+    Naive UTC time of unix time in seconds, ISO 8601 string or
+    DATETIME_FORMAT string. Raises ValueError.
+    '''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return epoch_time(value)
+    if not isinstance(value, str):
+        raise ValueError(value)
+
+    # 'Tue, 01 Mar 2022 12:00:10 GMT' by slices, strptime is much slower
+    if len(value) == 29 and value[3:5] == ', ' and value[25:] == ' GMT':
+        month = MONTHS.get(value[8:11])
+        if month is not None:
+            return datetime(
+                int(value[12:16]),
+                month,
+                int(value[5:7]),
+                int(value[17:19]),
+                int(value[20:22]),
+                int(value[23:25]),
+            )
+    if value[:1].isdigit():
+        if value.isdigit():
+            return epoch_time(int(value))
+        if value[-1:] in ('Z', 'z'):
+            value = f'{value[:-1]}+00:00'
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    return datetime.strptime(value, DATETIME_FORMAT)
+
+
+def epoch_time(seconds: float) -> datetime:
+    try:
+        return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+    except (OverflowError, OSError) as error:
+        raise ValueError(seconds) from error
+
+
+def compile_field(field: Field) -> Check:
+    '''
+    Check of one value built from the parts 'field' needs
+    '''
+    if field.kind == 'time':
+
+        def check_time(value: Any, path: str, errors: Errors) -> Any:
+            try:
+                return parse_time(value)
+            except ValueError:
+                return invalid(errors, path, 'must be unix time, ISO 8601 or HTTP date')
+
+        return check_time
+
+    if field.kind is list:
+        return compile_list(field)
+
+    kind = field.kind
+    name = KIND_NAMES[kind]
+    # Length of strings, value of integers
+    measure: Callable[[Any], int] = len if kind is str else int
+    suffix = ' long' if kind is str else ''
+    low, high = field.min, field.max
+    if kind is int and high is None:
+        high = MAX_INT
+    choices = frozenset(field.choices)
+
+    def check(value: Any, path: str, errors: Errors) -> Any:
+        # True is an instance of int, but not an integer here
+        if type(value) is not kind:  # pylint: disable=unidiomatic-typecheck
+            return invalid(errors, path, f'must be {name}')
+        if choices and value not in choices:
+            return invalid(errors, path, f'must be one of {", ".join(sorted(choices))}')
+        if low is not None and measure(value) < low:
+            return invalid(errors, path, f'must be at least {low}{suffix}')
+        if high is not None and measure(value) > high:
+            return invalid(errors, path, f'must be at most {high}{suffix}')
+        return value
+
+    return check
+
+
+def compile_list(field: Field) -> Check:
+    assert field.items is not None
+    item_checks = compile_checks(field.items)
+    low, high = field.min or 0, field.max or MAX_INT
+
+    def check(value: Any, path: str, errors: Errors) -> Any:
+        if not isinstance(value, list):
+            return invalid(errors, path, 'must be a list')
+        if not low <= len(value) <= high:
+            return invalid(errors, path, f'must have from {low} to {high} items')
+        return [
+            run_checks(item_checks, item, f'{path}[{i}]', errors)
+            for i, item in enumerate(value)
+        ]
+
+    return check
+
+
+def invalid(errors: Errors, path: str, message: str) -> None:
+    errors.append({'field': path, 'message': message})
+
+
+def compile_checks(fields: dict[str, Field]) -> list[tuple[str, Field, Check]]:
+    return [(name, field, compile_field(field)) for name, field in fields.items()]
+
+
+def run_checks(
+    checks: list[tuple[str, Field, Check]], data: Any, path: str, errors: Errors
+) -> dict[str, Any]:
+    if not isinstance(data, dict):
+        invalid(errors, path, 'must be an object')
+        return {}
+
+    values = {}
+    for name, field, check in checks:
+        field_path = f'{path}.{name}' if path else name
+        if name in data:
+            values[name] = check(data[name], field_path, errors)
+        elif field.required:
+            invalid(errors, field_path, 'is required')
+        else:
+            values[name] = field.default
+    return values
+
+
+def compile_schema(fields: dict[str, Field]) -> Validator:
+    checks = compile_checks(fields)
+
+    def validate(data: Any) -> dict[str, Any]:
+        errors: Errors = []
+        values = run_checks(checks, data, '', errors)
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    return validate
+
+
+NAME = Field(str, min=1, max=50)
+COST = Field(int, min=1)
+OPERATION = {
+    'crypto_name': NAME,
+    'operation_type': Field(str, choices=('purchase', 'sale')),
+    'amount': Field(int, min=1),
+    'time_str': Field('time'),
+}
+
+user = compile_schema({'login': NAME})
+crypto = compile_schema({'crypto_name': NAME, 'purchase_cost': COST, 'sale_cost': COST})
+operation = compile_schema(OPERATION)
+order = compile_schema(
+    {
+        'crypto_name': NAME,
+        'side': Field(str, choices=('buy', 'sell')),
+        'price': COST,
+        'amount': Field(int, min=1),
+    }
+)
+operations_batch = compile_schema(
+    {
+        'operations': Field(list, min=1, max=MARKET_BATCH_MAX_SIZE, items=OPERATION),
+        'atomic': Field(bool, required=False, default=True),
+    }
+)
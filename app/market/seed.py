@@ -0,0 +1,192 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.market import cache
+from app.market.config import MARKET_SEED_CHUNK_SIZE
+from app.market.database import Base, clear_db, create_session
+from app.market.models import Crypto, Operation, Portfolio, User
+
+# Operations are created one second apart starting from this time
+SEED_START = datetime(2022, 1, 1)
+
+# Generated columns of every table in the order of table columns
+COLUMNS = {
+    User: ('id', 'login', 'balance'),
+    Portfolio: ('user_id', 'crypto_id', 'amount'),
+    Operation: (
+        'user_id',
+        'crypto_id',
+        'operation_type',
+        'amount',
+        'purchase_cost',
+        'sale_cost',
+        'created',
+    ),
+}
+
+Rows = dict[Any, list[tuple[Any, ...]]]
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(seed_db_command)
+
+
+def seed_db(
+    users: int,
+    crypto: int,
+    operations: int,
+    holdings: int = 5,
+    seed: int = 0,
+    chunk_size: int = MARKET_SEED_CHUNK_SIZE,
+) -> dict[str, int]:
+    '''
+    Replaces database content by generated data: 'users' users, 'crypto'
+    crypto, 'holdings' portfolio rows per user and 'operations' operations
+    spread over portfolios. The same arguments give the same rows, amounts
+    of portfolios are sums of their operations. Returns numbers of rows.
+    '''
+    clear_db()
+    rng = random.Random(seed)
+    holdings = min(holdings, crypto)
+    costs = [rng.randint(100, 10000) for _ in range(crypto)]
+
+    with create_session() as session:
+        session.execute(
+            insert(Crypto),
+            [
+                {
+                    'id': i + 1,
+                    'name': f'coin{i}',
+                    'purchase_cost': cost,
+                    'sale_cost': sale_cost(cost),
+                }
+                for i, cost in enumerate(costs)
+            ],
+        )
+
+    counts = {'users': users, 'crypto': crypto, 'portfolio': 0, 'operations': 0}
+    chunk: Rows = {model: [] for model in COLUMNS}
+    for rows in user_rows(rng, users, costs, operations, holdings):
+        for model, values in rows.items():
+            chunk[model] += values
+        if len(chunk[Operation]) + len(chunk[User]) >= chunk_size:
+            insert_chunk(chunk, counts)
+    insert_chunk(chunk, counts)
+
+    cache.reset()
+    return counts
+
+
+def sale_cost(purchase_cost: int) -> int:
+    return max(1, purchase_cost * 9 // 10)
+
+
+def user_rows(
+    rng: random.Random, users: int, costs: list[int], operations: int, holdings: int
+) -> Iterator[Rows]:
+    '''
+    Rows of every user: the user, its portfolio and its operations
+    '''
+    pairs = users * holdings
+    created = 0
+    for user_id in range(1, users + 1):
+        balance = rng.randint(100, 100000) * 100
+        rows: Rows = {
+            User: [(user_id, f'user{user_id - 1}', balance)],
+            Portfolio: [],
+            Operation: [],
+        }
+
+        for crypto_index in sorted(rng.sample(range(len(costs)), holdings)):
+            pair = len(rows[Portfolio]) + (user_id - 1) * holdings
+            count = operations // pairs + (pair < operations % pairs)
+            cost, sale = costs[crypto_index], sale_cost(costs[crypto_index])
+            trades = list(operation_amounts(rng, count))
+            for operation_type, operation_amount in trades:
+                rows[Operation].append(
+                    (
+                        user_id,
+                        crypto_index + 1,
+                        operation_type,
+                        operation_amount,
+                        cost,
+                        sale,
+                        # The same text as SQLite 'CURRENT_TIMESTAMP' stores
+                        str(SEED_START + timedelta(seconds=created)),
+                    )
+                )
+                created += 1
+
+            amount = sum(a if t == 'purchase' else -a for t, a in trades)
+            rows[Portfolio].append((user_id, crypto_index + 1, amount))
+
+        yield rows
+
+
+def operation_amounts(rng: random.Random, count: int) -> Iterator[tuple[str, int]]:
+    '''
+    Types and amounts of operations with one crypto, sales never exceed
+    the amount bought before them
+    '''
+    amount = 0
+    for _ in range(count):
+        # rng.random() is several times faster than rng.randint()
+        operation_amount = (int(rng.random() * 100) + 1) * 100
+        if amount >= operation_amount and rng.random() < 0.4:
+            amount -= operation_amount
+            yield 'sale', operation_amount
+        else:
+            amount += operation_amount
+            yield 'purchase', operation_amount
+
+
+def insert_chunk(chunk: Rows, counts: dict[str, int]) -> None:
+    '''
+    Inserts and clears chunk in one transaction
+    '''
+    with create_session() as session:
+        for model, values in chunk.items():
+            if values:
+                insert_rows(session, model, values)
+
+    counts['portfolio'] += len(chunk[Portfolio])
+    counts['operations'] += len(chunk[Operation])
+    for values in chunk.values():
+        values.clear()
+
+
+def insert_rows(session: Session, model: Base, rows: list[tuple[Any, ...]]) -> None:
+    '''
+    executemany of tuples by the driver: rows are already in stored
+    format, so parameters of every row aren't processed by SQLAlchemy
+    '''
+    statement = insert(model).compile(
+        dialect=session.get_bind().dialect, column_keys=list(COLUMNS[model])
+    )
+    session.connection().exec_driver_sql(str(statement), rows)
+
+
+@click.command('seed-db')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--crypto', default=20, show_default=True)
+@click.option('--operations', default=100000, show_default=True)
+@click.option('--holdings', default=5, show_default=True, help='Crypto per user')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--chunk-size', default=MARKET_SEED_CHUNK_SIZE, show_default=True)
+@with_appcontext
+def seed_db_command(**options: int) -> None:
+    '''
+    Replace database content by generated users, crypto and operations
+    '''
+    start = time.perf_counter()
+    counts = seed_db(**options)
+    click.echo(json.dumps({**counts, 'seconds': time.perf_counter() - start}))
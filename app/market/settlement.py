@@ -0,0 +1,104 @@
+'''
+Settlement of limit orders in DB: reserves of placed orders, fills at
+prices of earlier orders and versions of books
+'''
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.market import exceptions, trading
+from app.market.orderbook import BookOrder
+from app.market.ordermodels import BookVersion, Fill, Order
+
+
+class StaleBook(exceptions.MarketError):
+    '''
+    Order of the book was changed in DB bypassing the book
+    '''
+
+
+def get_version(session: Session, crypto_id: int) -> int:
+    version = session.execute(
+        select(BookVersion.version).where(BookVersion.crypto_id == crypto_id)
+    ).scalar()
+    return version or 0
+
+
+def next_version(session: Session, crypto_id: int) -> int:
+    '''
+    Increases version of the book of crypto in transaction of 'session'
+    changing its orders, returns the new version
+    '''
+    session.execute(
+        insert(BookVersion)
+        .values(crypto_id=crypto_id, version=1)
+        .on_conflict_do_update(
+            index_elements=['crypto_id'], set_={'version': BookVersion.version + 1}
+        )
+    )
+    return get_version(session, crypto_id)
+
+
+def reserve(session: Session, order: Order) -> Order:
+    '''
+    Takes money of buy order or crypto of sell order until it's filled
+    or cancelled, so fills can't fail
+    '''
+    if order.side == 'buy':
+        trading.charge(
+            session,
+            order.user_id,
+            order.price * order.amount,
+            'Not enough money to buy',
+        )
+    else:
+        trading.take_from_portfolio(
+            session,
+            order.user_id,
+            order.crypto_id,
+            order.amount,
+            'Not enough crypto to sell',
+        )
+
+    session.add(order)
+    session.flush()
+    return order
+
+
+def settle(session: Session, order: Order, maker: BookOrder, amount: int) -> Fill:
+    '''
+    Fills 'amount' of 'order' by earlier order 'maker' at its price. Buyer
+    gets crypto and the rest of money reserved at its higher price, seller
+    gets money.
+    '''
+    filled = session.execute(
+        update(Order)
+        .where(Order.id == maker.id, Order.status == 'open', Order.remaining >= amount)
+        .values(
+            remaining=Order.remaining - amount,
+            status=case((Order.remaining == amount, 'filled'), else_='open'),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if filled.rowcount == 0:
+        raise StaleBook('Order book has changed')
+
+    if order.side == 'buy':
+        buy, sell = (order.id, order.user_id, order.price), (maker.id, maker.user_id)
+    else:
+        buy, sell = (maker.id, maker.user_id, maker.price), (order.id, order.user_id)
+
+    trading.add_to_portfolio(session, buy[1], order.crypto_id, amount)
+    trading.credit(session, sell[1], maker.price * amount)
+    if buy[2] > maker.price:
+        trading.credit(session, buy[1], (buy[2] - maker.price) * amount)
+
+    fill = Fill(
+        crypto_id=order.crypto_id,
+        buy_order_id=buy[0],
+        sell_order_id=sell[0],
+        price=maker.price,
+        amount=amount,
+    )
+    session.add(fill)
+    return fill
@@ -0,0 +1,232 @@
+import json
+import re
+import sys
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Optional
+from urllib.request import urlopen
+
+import click
+from flask import Blueprint, Flask, Response, has_request_context, jsonify, request
+
+from app.market.config import MARKET_SLOW_QUERY_THRESHOLD, MARKET_SLOW_QUERY_WINDOW
+from app.market.logger import get_logger
+
+bp = Blueprint('slowlog', __name__)
+
+SORT_KEYS = ('total_ms', 'count', 'max_ms', 'p95_ms', 'slow')
+# Frames of these modules are skipped looking for the calling function
+SKIPPED_MODULES = ('app.market.database', 'app.market.slowlog', 'sqlalchemy')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDERS = re.compile(r'\?(?:\s*,\s*\?)+')
+# Rows of multi-row VALUES after placeholders are collapsed
+ROWS = re.compile(r'(\([?.]+\))(?:\s*,\s*\1)+')
+SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    '''
+    Statement with literals replaced by '?' and lists of placeholders
+    collapsed, so 'IN (?, ?)' and 'IN (?, ?, ?)' are the same query
+    '''
+    statement = LITERALS.sub('?', statement)
+    statement = PLACEHOLDERS.sub('?...', statement)
+    statement = ROWS.sub(r'\1...', statement)
+    return SPACES.sub(' ', statement).strip()
+
+
+def parameters_shape(parameters: Any, executemany: bool = False) -> str:
+    '''
+    Types of bound parameters, e.g. '(int, str)' or '100 x (int, str)'
+    '''
+    if executemany:
+        rows = list(parameters)
+        return f'{len(rows)} x {parameters_shape(rows[0])}' if rows else '0 x ()'
+    if isinstance(parameters, dict):
+        items = ', '.join(f'{k}: {type_name(v)}' for k, v in parameters.items())
+        return f'{{{items}}}'
+    return f'({", ".join(type_name(value) for value in parameters or ())})'
+
+
+def type_name(value: Any) -> str:
+    return 'None' if value is None else type(value).__name__
+
+
+def caller() -> str:
+    '''
+    The closest function of application, e.g. 'market.get_users'
+    '''
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('app.') and not module.startswith(SKIPPED_MODULES):
+            return f'{module.rsplit(".", 1)[-1]}.{frame.f_code.co_name}'
+        frame = frame.f_back  # type: ignore[assignment]
+    return 'unknown'
+
+
+def current_route() -> Optional[str]:
+    if not has_request_context() or request.url_rule is None:
+        return None
+    return f'{request.method} {request.url_rule.rule}'
+
+
+class QueryStats:
+    '''
+    Aggregates of one fingerprint, p95 is of the last executions
+    '''
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.count = 0
+        self.slow = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window: deque[float] = deque(maxlen=MARKET_SLOW_QUERY_WINDOW)
+        self.last_slow: Optional[dict[str, Any]] = None
+
+    def add(self, duration: float, entry: Optional[dict[str, Any]] = None) -> None:
+        '''
+        'entry' of slow query log is given for slow execution
+        '''
+        with self.lock:
+            self.count += 1
+            self.total += duration
+            self.max = max(self.max, duration)
+            self.window.append(duration)
+            if entry is not None:
+                self.slow += 1
+                self.last_slow = entry
+
+    def as_dict(self, query: str) -> dict[str, Any]:
+        with self.lock:
+            ordered = sorted(self.window)
+            p95 = ordered[min(len(ordered) - 1, len(ordered) * 95 // 100)]
+            return {
+                'fingerprint': query,
+                'count': self.count,
+                'slow': self.slow,
+                'total_ms': self.total * 1000,
+                'max_ms': self.max * 1000,
+                'p95_ms': p95 * 1000,
+                'last_slow': self.last_slow,
+            }
+
+
+# Taken only to add new fingerprint, aggregates have their own locks
+_lock = threading.Lock()
+_stats: dict[str, QueryStats] = {}
+
+
+def record(
+    statement: str, parameters: Any, duration: float, executemany: bool = False
+) -> None:
+    '''
+    Adds executed statement to aggregates of its fingerprint and logs it
+    when it took longer than MARKET_SLOW_QUERY_THRESHOLD seconds
+    '''
+    query = fingerprint(statement)
+    stats = _stats.get(query)
+    if stats is None:
+        with _lock:
+            stats = _stats.setdefault(query, QueryStats())
+
+    if duration < MARKET_SLOW_QUERY_THRESHOLD:
+        stats.add(duration)
+        return
+
+    entry = {
+        'duration_ms': round(duration * 1000, 3),
+        'fingerprint': query,
+        'parameters': parameters_shape(parameters, executemany),
+        'caller': caller(),
+        'route': current_route(),
+    }
+    stats.add(duration, entry)
+    get_logger().warning(
+        'Slow query %.1f ms in %s of %s: %s %s',
+        entry['duration_ms'],
+        entry['caller'],
+        entry['route'],
+        query,
+        entry['parameters'],
+        extra={'slow_query': entry},
+    )
+
+
+def top(sort: str = 'total_ms', limit: Optional[int] = None) -> list[dict[str, Any]]:
+    with _lock:
+        items = list(_stats.items())
+    queries = [stats.as_dict(query) for query, stats in items]
+    queries.sort(key=lambda query: query[sort], reverse=True)
+    return queries[:limit]
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(slow_queries_command)
+
+
+@bp.route('/slow-queries', methods=['GET'])
+def slow_queries() -> Optional[Response]:
+    '''
+    GET - Aggregates of SQL statements of this process by fingerprint,
+    the costliest first
+    '''
+    if request.method == 'GET':
+        sort = request.args.get('sort', SORT_KEYS[0])
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return Response(status=422)
+        if sort not in SORT_KEYS or limit <= 0:
+            return Response(status=422)
+
+        return jsonify(top(sort, limit))
+
+    return None
+
+
+def echo_queries(queries: list[dict[str, Any]]) -> None:
+    click.echo(f'{"count":>8} {"slow":>6} {"total ms":>10} {"max ms":>9} {"p95 ms":>9}')
+    for query in queries:
+        click.echo(
+            f'{query["count"]:>8} {query["slow"]:>6} {query["total_ms"]:>10.1f} '
+            f'{query["max_ms"]:>9.1f} {query["p95_ms"]:>9.1f}  {query["fingerprint"]}'
+        )
+        if query['last_slow'] is not None:
+            last = query['last_slow']
+            click.echo(f'{"":>46}{last["caller"]} {last["route"]} {last["parameters"]}')
+
+
+@click.command('slow-queries')
+@click.option(
+    '--url',
+    default='http://127.0.0.1:5000',
+    show_default=True,
+    help='Running server, aggregates are kept in memory of its process',
+)
+@click.option('--sort', type=click.Choice(SORT_KEYS), default=SORT_KEYS[0])
+@click.option('--limit', default=20, show_default=True, type=click.IntRange(1))
+@click.option('--json', 'as_json', is_flag=True, help='Print queries as JSON')
+def slow_queries_command(url: str, sort: str, limit: int, as_json: bool) -> None:
+    '''
+    Rank SQL statements of running server by their cost. Aggregates are
+    of the server process answering the request, every worker of
+    a multi-process server has its own since its start.
+    '''
+    endpoint = f'{url.rstrip("/")}/market/slow-queries'
+    with urlopen(f'{endpoint}?sort={sort}&limit={limit}') as response:
+        queries = json.load(response)
+
+    if as_json:
+        click.echo(json.dumps(queries))
+    else:
+        echo_queries(queries)
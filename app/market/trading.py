@@ -0,0 +1,208 @@
+from datetime import datetime
+from typing import Union
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.market import exceptions, readmodel, schemas
+from app.market.cache import Rate, rates, user_ids
+from app.market.config import CRYPTO_UPDATE_DELTA
+from app.market.models import Crypto, Operation, Portfolio, User
+
+
+def apply_operation(
+    session: Session,
+    login: str,
+    crypto_name: str,
+    operation_type: str,
+    amount: int,
+    time_str: Union[str, datetime],
+) -> None:
+    '''
+    'time_str' is parsed by schemas.parse_time if it isn't validated yet
+    '''
+    if amount <= 0:
+        raise exceptions.MarketError('Amount must be positive')
+
+    if isinstance(time_str, datetime):
+        time = time_str
+    else:
+        try:
+            time = schemas.parse_time(time_str)
+        except ValueError as error:
+            raise exceptions.MarketError('Wrong operation time') from error
+
+    rate = get_rate(session, crypto_name)
+
+    if (time - rate.last_updated) >= CRYPTO_UPDATE_DELTA:
+        raise exceptions.MarketError('Crypto exchange rate has been updated')
+
+    user_id = get_user_id(session, login)
+
+    if operation_type == 'purchase':
+        purchase(session, user_id, rate, amount)
+    elif operation_type == 'sale':
+        sale(session, user_id, rate, amount)
+    else:
+        raise exceptions.MarketError('Wrong operation type')
+
+
+def get_rate(session: Session, crypto_name: str) -> Rate:
+    '''
+    Returns rate from cache. Rate is reloaded from DB if it's missing,
+    it's older than one update period or it was cached longer than
+    MARKET_RATE_CACHE_MAX_AGE ago, because it may be updated by another
+    process.
+    '''
+    rate = rates.fresh(crypto_name)
+    if rate is not None and datetime.utcnow() - rate.last_updated < CRYPTO_UPDATE_DELTA:
+        return rate
+
+    version = rates.version
+    crypto = session.query(Crypto).where(Crypto.name == crypto_name).one()
+    rate = to_rate(crypto)
+    rates.store([rate], version)
+
+    return rate
+
+
+def get_user_id(session: Session, login: str) -> int:
+    user_id = user_ids.get(login)
+    if user_id is not None:
+        return user_id
+
+    user_id = session.query(User.id).where(User.login == login).one().id
+    user_ids.put(login, user_id)
+
+    return user_id
+
+
+def to_rate(crypto: Crypto) -> Rate:
+    return Rate(
+        crypto.id,
+        crypto.name,
+        crypto.purchase_cost,
+        crypto.sale_cost,
+        crypto.last_updated,
+    )
+
+
+def purchase(session: Session, user_id: int, rate: Rate, amount: int) -> None:
+    '''
+    Balance is checked and changed by one conditional UPDATE, so concurrent
+    trades can't overwrite each other. Portfolio is created or increased
+    by one upsert.
+    '''
+    cost = total(rate.purchase_cost, amount)
+    charge(session, user_id, cost, 'Not enough money to purchase')
+    add_to_portfolio(session, user_id, rate.id, amount)
+
+    session.add(
+        Operation(
+            user_id,
+            rate.id,
+            'purchase',
+            amount,
+            rate.purchase_cost,
+            rate.sale_cost,
+        )
+    )
+
+
+def sale(session: Session, user_id: int, rate: Rate, amount: int) -> None:
+    '''
+    Portfolio is checked and decreased by one conditional UPDATE
+    '''
+    cost = total(rate.sale_cost, amount)
+    take_from_portfolio(session, user_id, rate.id, amount, 'Not enough crypto to sale')
+    credit(session, user_id, cost)
+
+    session.add(
+        Operation(
+            user_id,
+            rate.id,
+            'sale',
+            amount,
+            rate.purchase_cost,
+            rate.sale_cost,
+        )
+    )
+
+
+def total(cost: int, amount: int) -> int:
+    '''
+    Cost of 'amount' crypto, ValidationError is raised if it doesn't fit
+    SQLite INTEGER
+    '''
+    if cost * amount > schemas.MAX_INT:
+        raise exceptions.ValidationError(
+            [
+                {
+                    'field': 'amount',
+                    'message': f'must be at most {schemas.MAX_INT // cost}',
+                }
+            ]
+        )
+    return cost * amount
+
+
+def charge(session: Session, user_id: int, cost: int, message: str) -> None:
+    '''
+    Decreases balance by 'cost' or raises MarketError with 'message'
+    '''
+    charged = session.execute(
+        update(User)
+        .where(User.id == user_id, User.balance >= cost)
+        .values(balance=User.balance - cost)
+        .execution_options(synchronize_session=False)
+    )
+    if charged.rowcount == 0:
+        raise exceptions.MarketError(message)
+    readmodel.touch(session, user_id)
+
+
+def credit(session: Session, user_id: int, amount: int) -> None:
+    session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(balance=User.balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+    readmodel.touch(session, user_id)
+
+
+def add_to_portfolio(
+    session: Session, user_id: int, crypto_id: int, amount: int
+) -> None:
+    statement = insert(Portfolio).values(
+        user_id=user_id, crypto_id=crypto_id, amount=amount
+    )
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[Portfolio.user_id, Portfolio.crypto_id],
+            set_={'amount': Portfolio.amount + statement.excluded.amount},
+        )
+    )
+    readmodel.touch(session, user_id)
+
+
+def take_from_portfolio(
+    session: Session, user_id: int, crypto_id: int, amount: int, message: str
+) -> None:
+    '''
+    Decreases portfolio by 'amount' or raises MarketError with 'message'
+    '''
+    taken = session.execute(
+        update(Portfolio)
+        .where(
+            Portfolio.user_id == user_id,
+            Portfolio.crypto_id == crypto_id,
+            Portfolio.amount >= amount,
+        )
+        .values(amount=Portfolio.amount - amount)
+        .execution_options(synchronize_session=False)
+    )
+    if taken.rowcount == 0:
+        raise exceptions.MarketError(message)
+    readmodel.touch(session, user_id)
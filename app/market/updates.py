@@ -1,31 +1,280 @@
+import atexit
+import signal
 import threading
 import time
-from random import randint
+from datetime import datetime
+from typing import Collection, Iterable, NamedTuple, Optional
 
-from app.market import exceptions, market
-from app.market.config import CRYPTO_UPDATE_DELTA
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+
+from app.market import candles, exceptions, market, metrics, prices
+from app.market.config import (
+    MARKET_RATE_BATCH_MAX_SIZE,
+    MARKET_RATE_BATCH_WINDOW,
+    MARKET_RATE_FOLLOW_INTERVAL,
+    MARKET_RATE_INTERVAL,
+    MARKET_RATE_INTERVALS,
+    MARKET_RATE_SYNC_INTERVAL,
+)
+from app.market.database import create_session
+from app.market.leader import Lease
 from app.market.logger import get_logger
+from app.market.scheduler import Schedule
+
+
+class TickStats(NamedTuple):
+    rows: int
+    duration: float
+
+
+# Stats of the last successful update of rates
+last_tick: Optional[TickStats] = None
+
+TICK_DURATION = metrics.Histogram(
+    'market_rate_tick_duration_seconds', 'Duration of updates of due rates'
+)
+TICK_ERRORS = metrics.Counter(
+    'market_rate_tick_errors_total', 'Failed updates of rates'
+)
+LATENESS = metrics.Histogram(
+    'market_rate_update_lateness_seconds',
+    'Time from due time of rate to its update, negative are counted as 0',
+)
+MISSED = metrics.Counter(
+    'market_rate_missed_deadlines_total', 'Updates of rates skipped by delays'
+)
+
+
+# Maps costs of all crypto to new costs, MARKET_PRICE_MODEL by default
+price_model: prices.PriceModel = prices.make_model()
+
+
+def tick(ids: Optional[Collection[int]] = None) -> TickStats:
+    '''
+    Updates rates of crypto with 'ids' or of all crypto
+    '''
+    global last_tick  # pylint: disable=global-statement
+
+    start = time.perf_counter()
+    new_rates = market.update_all_crypto(price_model, ids=ids)
+    last_tick = TickStats(len(new_rates), time.perf_counter() - start)
+    TICK_DURATION.observe(last_tick.duration)
+
+    get_logger().debug('Updated %d rates in %.3f s', last_tick.rows, last_tick.duration)
+    return last_tick
+
+
+def interval_of(name: str) -> float:
+    return (MARKET_RATE_INTERVALS.get(name) or MARKET_RATE_INTERVAL).total_seconds()
 
 
-def update_rates() -> None:
-    while True:
-        time.sleep(CRYPTO_UPDATE_DELTA.seconds)
+class RateUpdater(threading.Thread):
+    '''
+    Updates every rate once per its interval. Due times are kept by
+    Schedule on monotonic clock, rates due within MARKET_RATE_BATCH_WINDOW
+    are updated in one transaction. Crypto is synced from DB every
+    MARKET_RATE_SYNC_INTERVAL, new crypto gets random phase, so writes
+    are spread over the interval instead of coming at once.
 
+    With 'lease' rates are updated only while it's held, so one of
+    updaters of processes sharing DB is active and the others stand by.
+    '''
+
+    def __init__(self, lease: Optional[Lease] = None) -> None:
+        super().__init__(name='rate-updater', daemon=True)
+        self.lease = lease
+        self.schedule = Schedule()
+        self.stopped = threading.Event()
+        self._synced = -float('inf')
+
+    def run(self) -> None:
         try:
-            crypto = market.get_crypto()
-            for crypt in crypto:
-                new_purchase_cost = int(
-                    crypt['purchase_cost'] * (1 + randint(-10, 10) / 100)
-                )
-                new_sale_cost = int(crypt['sale_cost'] * (1 + randint(-10, 10) / 100))
-                market.update_crypto(
-                    crypt['name'], max(new_purchase_cost, 1), max(new_sale_cost, 1)
-                )
-
-        except exceptions.MarketError as error:
-            get_logger().error(error)
-
-
-def run_updates() -> None:
-    updates_thread = threading.Thread(target=update_rates, daemon=True)
-    updates_thread.start()
+            while not self.stopped.is_set():
+                try:
+                    self.step()
+                except (exceptions.MarketError, exceptions.DatabaseError) as error:
+                    TICK_ERRORS.inc()
+                    get_logger().error(error)
+                    # Due rates were rescheduled, failed sync is retried later
+                    self.stopped.wait(MARKET_RATE_BATCH_WINDOW)
+        finally:
+            if self.lease is not None:
+                # Another process takes over without waiting for expiry
+                self.lease.release()
+
+    def step(self) -> None:
+        '''
+        Waits for the next due time and updates due rates
+        '''
+        if self.lease is not None and not self.lease.keep():
+            # Rates are synced with new phases when the lease is taken
+            self.schedule = Schedule()
+            self._synced = -float('inf')
+            self.stopped.wait(self.lease.heartbeat)
+            return
+
+        now = time.monotonic()
+        if now - self._synced >= MARKET_RATE_SYNC_INTERVAL.total_seconds():
+            self._synced = now
+            self.sync(now)
+
+        wake = self._synced + MARKET_RATE_SYNC_INTERVAL.total_seconds()
+        next_due = self.schedule.next_due()
+        if next_due is not None:
+            wake = min(wake, next_due)
+        if self.lease is not None:
+            wake = min(wake, self.lease.renew_at)
+        if wake > now:
+            self.stopped.wait(wake - now)
+            return
+
+        due = self.schedule.pop_due(
+            now, MARKET_RATE_BATCH_WINDOW, MARKET_RATE_BATCH_MAX_SIZE
+        )
+        for item in due:
+            LATENESS.observe(max(0.0, item.lateness))
+        missed = sum(item.missed for item in due)
+        if missed:
+            MISSED.inc(amount=missed)
+            get_logger().warning('Missed %d updates of rates', missed)
+
+        tick([item.key for item in due])
+        candles.rollup_if_due()
+
+    def sync(self, now: float) -> None:
+        '''
+        Adds new crypto to schedule and removes deleted
+        '''
+        utcnow = datetime.utcnow()
+        crypto = market.get_crypto()
+        for rate in crypto:
+            interval = interval_of(rate['name'])
+            if rate['id'] in self.schedule:
+                self.schedule.set_interval(rate['id'], interval)
+                continue
+            # Fresh rate is updated before it's older than interval,
+            # stale ones get phases over the whole interval
+            age = (utcnow - rate['last_updated']).total_seconds()
+            within = interval - age if age < interval else interval
+            self.schedule.add(rate['id'], interval, now, within)
+
+        for key in self.schedule.keys() - {rate['id'] for rate in crypto}:
+            self.schedule.remove(key)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        '''
+        Stops after the current update is committed
+        '''
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class RateFollower(threading.Thread):
+    '''
+    Reloads all rates every 'interval'. Changed rates are published to
+    the rate cache and by it to the feed, so processes standing by or
+    not running the updater get rates updated by another process.
+    '''
+
+    def __init__(
+        self, interval: float = MARKET_RATE_FOLLOW_INTERVAL.total_seconds()
+    ) -> None:
+        super().__init__(name='rate-follower', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                follow()
+            except exceptions.DatabaseError as error:
+                get_logger().error(error)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+def follow() -> None:
+    with create_session(readonly=True) as session:
+        market.load_rates(session)
+
+
+updater: Optional[RateUpdater] = None
+follower: Optional[RateFollower] = None
+
+
+def run_updates() -> RateUpdater:
+    '''
+    Starts updater once per process, it's stopped at exit.
+    Rates are updated by the process holding the lease 'rates'.
+    '''
+    global updater  # pylint: disable=global-statement
+
+    if updater is None or not updater.is_alive():
+        updater = RateUpdater(Lease('rates'))
+        updater.start()
+    return updater
+
+
+def stop_updates(timeout: Optional[float] = None) -> None:
+    if updater is not None:
+        updater.stop(timeout)
+
+
+def run_follower() -> RateFollower:
+    '''
+    Starts follower once per process, it's stopped at exit
+    '''
+    global follower  # pylint: disable=global-statement
+
+    if follower is None or not follower.is_alive():
+        follower = RateFollower()
+        follower.start()
+    return follower
+
+
+def stop_follower(timeout: Optional[float] = None) -> None:
+    if follower is not None:
+        follower.stop(timeout)
+
+
+atexit.register(stop_updates)
+atexit.register(stop_follower)
+
+
+def is_leader() -> Iterable[tuple[tuple[str, ...], float]]:
+    if updater is not None and updater.lease is not None and updater.is_alive():
+        yield (updater.lease.name,), float(updater.lease.held)
+
+
+LEADER = metrics.Gauge(
+    'market_lease_held', 'Lease is held by this process', ('lease',), is_leader
+)
+
+
+def init_app(app: Flask) -> None:
+    app.cli.add_command(run_updater_command)
+
+
+@click.command('run-updater')
+@with_appcontext
+def run_updater_command() -> None:
+    '''
+    Update rates in this process until it's interrupted or terminated.
+    Rates are updated by one of processes sharing DB, the others stand by.
+    '''
+    rate_updater = run_updates()
+    signal.signal(signal.SIGTERM, lambda *_: rate_updater.stopped.set())
+    click.echo('Updating rates, press CTRL+C to stop')
+    try:
+        while rate_updater.is_alive():
+            rate_updater.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_updates()
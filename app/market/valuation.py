@@ -0,0 +1,69 @@
+from typing import Any, Optional
+
+from flask import Blueprint, Response, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
+
+from app.market.database import db_read_session
+from app.market.models import Crypto, Portfolio, User
+
+bp = Blueprint('valuation', __name__)
+
+
+@db_read_session
+def get_valuation(login: str, session: Session) -> dict[str, Any]:
+    '''
+    Values of user's crypto at sale and purchase costs, their totals and
+    balance. Costs are taken from 'crypto' by join, so it's one query.
+    Value is 'amount * cost' like in purchase and sale.
+    '''
+    rows = session.execute(
+        select(
+            User.balance,
+            Crypto.name,
+            Portfolio.amount,
+            Portfolio.amount * Crypto.sale_cost,
+            Portfolio.amount * Crypto.purchase_cost,
+        )
+        .select_from(User)
+        .outerjoin(Portfolio, Portfolio.user_id == User.id)
+        .outerjoin(Crypto, Crypto.id == Portfolio.crypto_id)
+        .where(User.login == login)
+    ).all()
+    if not rows:
+        # The same error as other reads of unknown user
+        raise NoResultFound('No row was found when one was required')
+
+    crypto = [
+        {
+            'crypto_name': name,
+            'amount': amount,
+            'sale_value': sale_value,
+            'purchase_value': purchase_value,
+        }
+        for _, name, amount, sale_value, purchase_value in rows
+        if name is not None
+    ]
+    # Sorted here, so SQLite doesn't build temporary B-tree for ORDER BY
+    crypto.sort(key=lambda item: item['crypto_name'])
+    return {
+        'balance': rows[0].balance,
+        'crypto': crypto,
+        'sale_value': sum(item['sale_value'] for item in crypto),
+        'purchase_value': sum(item['purchase_value'] for item in crypto),
+    }
+
+
+@bp.route('/users/<string:login>/valuation', methods=['GET'])
+def users_valuation(login: str) -> Optional[Response]:
+    '''
+    GET - Get value of user's portfolio and balance
+    '''
+    if request.method == 'GET':
+
+        valuation = get_valuation(login)
+
+        return jsonify(valuation)
+
+    return None
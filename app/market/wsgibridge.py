@@ -0,0 +1,151 @@
+'''
+Flask application called from ASGI: WSGI environ, request body read
+by the worker thread and response messages of the worker.
+'''
+import asyncio
+import io
+import sys
+import threading
+from typing import IO, Any, Awaitable, Callable, Optional, Union
+
+from app.market.aroutes import Scope
+
+Message = dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class ReceiveStream(io.RawIOBase):
+    '''
+    Request body read by worker thread from 'receive' of the event loop
+    as the application reads it. Body read before is passed as 'body'.
+    '''
+
+    def __init__(
+        self,
+        receive: Receive,
+        loop: asyncio.AbstractEventLoop,
+        body: Optional[bytes] = None,
+    ) -> None:
+        super().__init__()
+        self.receive = receive
+        self.loop = loop
+        self.chunk = body or b''
+        self.more_body = body is None
+        # Set after the last message of the body
+        self.received = asyncio.Event()
+        if body is not None:
+            self.received.set()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self.chunk and self.more_body:
+            message = asyncio.run_coroutine_threadsafe(
+                self._receive(), self.loop
+            ).result()
+            # 'http.disconnect' ends the body too
+            self.chunk = message.get('body', b'')
+            self.more_body = message.get('more_body', False)
+            if not self.more_body:
+                self.loop.call_soon_threadsafe(self.received.set)
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+    def finish(self) -> None:
+        '''
+        Skips the body left unread by the application
+        '''
+        buffer = bytearray(65536)
+        while self.readinto(buffer):
+            pass
+
+    async def wait_disconnect(self) -> None:
+        '''
+        Messages are read by the worker until the end of the body
+        '''
+        await self.received.wait()
+        await wait_disconnect(self.receive)
+
+    async def _receive(self) -> Message:
+        return await self.receive()
+
+
+async def forward(
+    queue: 'asyncio.Queue[tuple[str, Any]]', send: Send, disconnected: threading.Event
+) -> None:
+    '''
+    Sends messages of the worker until its end. After disconnect they are
+    dropped, but the queue is read, so the worker isn't blocked by it.
+    '''
+    kind = ''
+    try:
+        while (item := await queue.get())[0] != 'end':
+            kind, value = item
+            if not disconnected.is_set():
+                await send(flask_message(kind, value))
+        kind = 'end'
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.set()
+        while kind != 'end':
+            kind, _ = await queue.get()
+
+
+def flask_message(kind: str, value: Any) -> Message:
+    if kind == 'start':
+        status, headers = value
+        return {
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers
+            ],
+        }
+    return {'type': 'http.response.body', 'body': value, 'more_body': True}
+
+
+async def wait_disconnect(receive: Receive) -> None:
+    '''
+    Messages after the request body are only 'http.disconnect'
+    '''
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def wsgi_environ(scope: Scope, body: Union[bytes, IO[bytes]]) -> dict[str, Any]:
+    '''
+    Body of unknown length is a stream read to its end
+    '''
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if isinstance(body, bytes):
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ['wsgi.input'] = io.BytesIO(body)
+    else:
+        environ['wsgi.input'] = body
+        environ['wsgi.input_terminated'] = True
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        environ[key] = value.decode('latin-1')
+    return environ
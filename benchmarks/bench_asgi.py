@@ -0,0 +1,173 @@
+'''
+Sync WSGI application in a thread pool against async ASGI application
+under many concurrent clients, every client sends requests one by one
+
+    python -m benchmarks.bench_asgi [concurrency] [requests_per_client] [threads]
+'''
+import asyncio
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from werkzeug.test import run_wsgi_app
+
+from app.market import amarket, market
+from app.market.asgi import MarketApp
+from app.market.wsgibridge import wsgi_environ
+from app.market.config import DATETIME_FORMAT
+from app.market.database import engines
+from app.market.market import utcnow
+from benchmarks.common import temp_app
+
+Request = tuple[str, str, Optional[dict[str, Any]]]
+# Request -> status code
+Call = Callable[[Request], Awaitable[int]]
+
+READS: list[Request] = [
+    ('GET', '/market/users/Annet/balance', None),
+    ('GET', '/market/users/Annet/portfolio', None),
+    ('GET', '/market/crypto', None),
+    ('GET', '/market/users/Annet/operations', None),
+]
+
+
+def purchase() -> Request:
+    return (
+        'POST',
+        '/market/users/Annet/operations',
+        {
+            'crypto_name': 'Favicoin',
+            'operation_type': 'purchase',
+            'amount': 1,
+            'time_str': utcnow().strftime(DATETIME_FORMAT),
+        },
+    )
+
+
+def workload(mixed: bool) -> Callable[[int], Request]:
+    # Every fifth request of mixed workload is a purchase
+    def request(index: int) -> Request:
+        if mixed and index % 5 == 4:
+            return purchase()
+        return READS[index % len(READS)]
+
+    return request
+
+
+def scope(request: Request) -> tuple[dict[str, Any], bytes]:
+    method, path, data = request
+    body = b'' if data is None else json.dumps(data).encode()
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/json')],
+    }, body
+
+
+def wsgi_call(app: Any, pool: ThreadPoolExecutor) -> Call:
+    def call_sync(request: Request) -> int:
+        environ = wsgi_environ(*scope(request))
+        app_iter, status, _ = run_wsgi_app(app.wsgi_app, environ, buffered=True)
+        b''.join(app_iter)
+        return int(status.split(' ', 1)[0])
+
+    async def call(request: Request) -> int:
+        return await asyncio.get_running_loop().run_in_executor(
+            pool, call_sync, request
+        )
+
+    return call
+
+
+def asgi_call(app: MarketApp) -> Call:
+    async def call(request: Request) -> int:
+        request_scope, body = scope(request)
+        status = 0
+        messages = [{'type': 'http.request', 'body': body}]
+
+        async def receive() -> dict[str, Any]:
+            if not messages:
+                # Client waits for the response until it's cancelled
+                await asyncio.Future()
+            return messages.pop()
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await app(request_scope, receive, send)
+        return status
+
+    return call
+
+
+async def load(
+    call: Call, make_request: Callable[[int], Request], concurrency: int, count: int
+) -> tuple[float, list[float], int]:
+    '''
+    Returns (duration, latencies, errors)
+    '''
+    latencies: list[float] = []
+    errors = 0
+
+    async def client(number: int) -> None:
+        nonlocal errors
+        for index in range(count):
+            start = time.perf_counter()
+            status = await call(make_request(number + index))
+            latencies.append(time.perf_counter() - start)
+            errors += status >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def report(name: str, duration: float, latencies: list[float], errors: int) -> None:
+    p50, p99 = (statistics.quantiles(latencies, n=100)[i] for i in (49, 98))
+    print(
+        f'{name:<24} {len(latencies) / duration:>9.1f} req/s  '
+        f'p50 {p50 * 1000:>8.1f} ms  p99 {p99 * 1000:>8.1f} ms  errors {errors}'
+    )
+
+
+def main(concurrency: int = 1000, count: int = 5, threads: int = 32) -> None:
+    for mixed in (False, True):
+        workload_name = 'mixed' if mixed else 'reads'
+
+        with temp_app() as app:
+            market.add_user('Annet')
+            market.add_crypto('Favicoin', 1, 1)
+            with ThreadPoolExecutor(threads) as pool:
+                result = asyncio.run(
+                    load(wsgi_call(app, pool), workload(mixed), concurrency, count)
+                )
+            report(f'wsgi x{threads} {workload_name}', *result)
+
+        with temp_app() as app:
+            market.add_user('Annet')
+            market.add_crypto('Favicoin', 1, 1)
+            asgi_app = MarketApp(app, str(engines['write'].url))
+
+            async def run_asgi(
+                asgi_app: MarketApp = asgi_app, mixed: bool = mixed
+            ) -> tuple[float, list[float], int]:
+                await amarket.init_db(asgi_app.db_url)
+                try:
+                    return await load(
+                        asgi_call(asgi_app), workload(mixed), concurrency, count
+                    )
+                finally:
+                    await amarket.dispose_db()
+
+            report(f'asgi {workload_name}', *asyncio.run(run_asgi()))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
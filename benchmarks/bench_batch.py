@@ -0,0 +1,53 @@
+'''
+Trades through POST /operations one by one against POST /operations/batch
+
+    python -m benchmarks.bench_batch [trades] [batch_size]
+'''
+import sys
+
+from flask.testing import FlaskClient
+
+from app.market import market
+from app.market.config import DATETIME_FORMAT
+from app.market.market import utcnow
+from benchmarks.common import report, temp_app, timed
+
+
+def operation() -> dict[str, object]:
+    return {
+        'crypto_name': 'Favicoin',
+        'operation_type': 'purchase',
+        'amount': 1,
+        'time_str': utcnow().strftime(DATETIME_FORMAT),
+    }
+
+
+def one_by_one(client: FlaskClient, count: int) -> None:
+    for _ in range(count):
+        response = client.post('/market/users/Annet/operations', json=operation())
+        assert response.status_code == 201, response.status_code
+
+
+def batched(client: FlaskClient, count: int, batch_size: int) -> None:
+    for start in range(0, count, batch_size):
+        operations = [operation() for _ in range(min(batch_size, count - start))]
+        response = client.post(
+            '/market/users/Annet/operations/batch',
+            json={'operations': operations, 'atomic': False},
+        )
+        assert response.status_code == 201, response.status_code
+
+
+def main(count: int = 2000, batch_size: int = 100) -> None:
+    for name, run in (
+        ('one by one', lambda client: one_by_one(client, count)),
+        (f'batch of {batch_size}', lambda client: batched(client, count, batch_size)),
+    ):
+        with temp_app() as app:
+            market.add_user('Annet')
+            market.add_crypto('Favicoin', 1, 1)
+            report(name, count, timed(run, app.test_client()))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,66 @@
+'''
+Trades of concurrent threads committed one by one against group commit
+of the writer thread with different batch sizes. With synchronous=FULL
+every commit waits for fsync, with NORMAL (default in WAL) it doesn't.
+
+    python -m benchmarks.bench_groupcommit [threads] [trades per thread]
+'''
+import sys
+import threading
+from unittest import mock
+
+from app.market import database, groupcommit, market
+from app.market.config import (
+    DATETIME_FORMAT,
+    MARKET_DB_PRAGMAS,
+    MARKET_GROUP_COMMIT_MAX_WAIT,
+)
+from app.market.market import utcnow
+from benchmarks.common import report, temp_app, timed
+
+BATCH_SIZES = (10, 100)
+
+
+def trades(count: int) -> None:
+    for _ in range(count):
+        market.add_operation(
+            'Annet', 'Favicoin', 'purchase', 1, utcnow().strftime(DATETIME_FORMAT)
+        )
+
+
+def concurrent(threads: int, count: int) -> None:
+    workers = [threading.Thread(target=trades, args=(count,)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def main(threads: int = 16, count: int = 200) -> None:
+    total = threads * count
+    for synchronous in ('NORMAL', 'FULL'):
+        pragmas = {**MARKET_DB_PRAGMAS, 'synchronous': synchronous}
+        with mock.patch.object(database, 'MARKET_DB_PRAGMAS', pragmas):
+            with temp_app():
+                market.add_user('Annet')
+                market.add_crypto('Favicoin', 1, 1)
+                seconds = timed(concurrent, threads, count)
+                report(f'{synchronous}: commit per trade', total, seconds)
+
+            for batch_size in BATCH_SIZES:
+                writer = groupcommit.GroupCommitWriter(
+                    batch_size, MARKET_GROUP_COMMIT_MAX_WAIT
+                )
+                with temp_app(), mock.patch.multiple(
+                    groupcommit, MARKET_GROUP_COMMIT=True, writer=writer
+                ):
+                    market.add_user('Annet')
+                    market.add_crypto('Favicoin', 1, 1)
+                    writer.start()
+                    seconds = timed(concurrent, threads, count)
+                    writer.stop()
+                report(f'{synchronous}: group commit of {batch_size}', total, seconds)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,49 @@
+'''
+Matching of orders by in-memory book of different sizes: time per order
+should grow as log of the number of resting orders
+
+    python -m benchmarks.bench_orderbook [size ...]
+'''
+import random
+import sys
+
+from app.market.orderbook import Book, BookOrder
+from benchmarks.common import report, timed
+
+SIZES = (1000, 10000, 100000, 1000000)
+ORDERS = 100000
+
+
+def filled_book(size: int, rng: random.Random) -> Book:
+    book = Book()
+    for order_id in range(size):
+        side = 'buy' if order_id % 2 else 'sell'
+        price = rng.randint(1, 100) if side == 'buy' else rng.randint(101, 200)
+        book.add(BookOrder(order_id, 0, side, price, 10))
+    return book
+
+
+def match(book: Book, count: int, rng: random.Random, next_id: int) -> None:
+    '''
+    Crossing orders of one unit, every filled order is replaced by a new one
+    '''
+    for order_id in range(next_id, next_id + count):
+        side = rng.choice(('buy', 'sell'))
+        taken = book.take(side, 200 if side == 'buy' else 1, 1, 1)
+        book.settle(taken)
+        for order, _ in taken:
+            if order.remaining == 0:
+                book.add(BookOrder(order_id, 0, order.side, order.price, 10))
+
+
+def main(sizes: tuple[int, ...] = SIZES) -> None:
+    for size in sizes:
+        rng = random.Random(0)
+        book = filled_book(size, rng)
+        report(
+            f'match in book of {size}', ORDERS, timed(match, book, ORDERS, rng, size)
+        )
+
+
+if __name__ == '__main__':
+    main(tuple(int(arg) for arg in sys.argv[1:]) or SIZES)
@@ -0,0 +1,30 @@
+'''
+New costs of all crypto by price models compared to the loop
+of randint calls they replaced
+
+    python -m benchmarks.bench_prices [count ...]
+'''
+import sys
+from random import randint
+
+from app.market import prices
+from benchmarks.common import report, timed
+
+COUNTS = (1000, 10000, 100000, 1000000)
+
+
+def loop_jitter(costs: list[int]) -> list[int]:
+    return [max(int(cost * (1 + randint(-10, 10) / 100)), 1) for cost in costs]
+
+
+def main(counts: tuple[int, ...] = COUNTS) -> None:
+    for count in counts:
+        costs = [200] * count
+        report(f'loop jitter of {count}', count, timed(loop_jitter, costs))
+        for name in prices.MODELS:
+            model = prices.make_model(name, seed=0)
+            report(f'{name} model of {count}', count, timed(model, costs))
+
+
+if __name__ == '__main__':
+    main(tuple(int(arg) for arg in sys.argv[1:]) or COUNTS)
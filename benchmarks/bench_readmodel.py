@@ -0,0 +1,66 @@
+'''
+Reads of balances, portfolios and users from DB against the read model
+on seeded database. Snapshots are reused only within
+MARKET_READ_MODEL_MAX_AGE, so reads of a few hot users hit the read model
+and reads spread over all users mostly reload them. Trades invalidate
+snapshots of their users.
+
+    python -m benchmarks.bench_readmodel [users] [reads]
+'''
+import random
+import sys
+from unittest import mock
+
+from app.market import market, readmodel
+from app.market.config import DATETIME_FORMAT
+from app.market.market import utcnow
+from app.market.seed import seed_db
+from benchmarks.common import report, temp_app, timed
+
+HOT_USERS = 100
+
+
+def reads(logins: list[str], count: int) -> None:
+    rng = random.Random(0)
+    for _ in range(count):
+        login = rng.choice(logins)
+        market.get_balance(login)
+        market.get_portfolio(login)
+
+
+def trades_and_reads(logins: list[str], count: int) -> None:
+    '''
+    Every read follows a sale of crypto its user holds
+    '''
+    names = {crypto['id']: crypto['name'] for crypto in market.get_crypto()}
+    for login in logins[:count]:
+        crypto_id = market.get_portfolio(login)[0]['crypto_id']
+        market.add_operation(
+            login, names[crypto_id], 'sale', 1, utcnow().strftime(DATETIME_FORMAT)
+        )
+        market.get_balance(login)
+
+
+def main(users: int = 10000, count: int = 10000) -> None:
+    with temp_app():
+        seed_db(users=users, crypto=10, operations=users * 5)
+        logins = [user['login'] for user in market.get_users()]
+
+        for enabled in (False, True):
+            name = 'read model' if enabled else 'DB'
+            with mock.patch.object(readmodel, 'MARKET_READ_MODEL', enabled):
+                readmodel.rebuild()
+                seconds = timed(reads, logins[:HOT_USERS], count)
+                report(f'{name}: {HOT_USERS} hot users', count, seconds)
+                seconds = timed(reads, logins, count)
+                report(f'{name}: all users', count, seconds)
+                market.update_all_crypto(lambda costs: costs)
+                seconds = timed(trades_and_reads, logins, count // 10)
+                report(f'{name}: trade and read', count // 10, seconds)
+                market.get_users()
+                seconds = timed(lambda: [market.get_users() for _ in range(100)])
+                report(f'{name}: all users list', 100, seconds)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,47 @@
+'''
+Validation of operation bodies by compiled schema with time in every
+accepted format compared to strptime of HTTP date it replaced
+
+    python -m benchmarks.bench_schemas [count]
+'''
+import sys
+from datetime import datetime
+from typing import Any
+
+from app.market import schemas
+from app.market.config import DATETIME_FORMAT
+from benchmarks.common import report, timed
+
+COUNT = 100000
+TIMES = {
+    'http date': 'Tue, 01 Mar 2022 12:00:10 GMT',
+    'iso': '2022-03-01T12:00:10Z',
+    'epoch': 1646136010,
+}
+
+
+def validate(bodies: list[dict[str, Any]]) -> None:
+    for body in bodies:
+        schemas.operation(body)
+
+
+def strptime(times: list[str]) -> None:
+    for time_str in times:
+        datetime.strptime(time_str, DATETIME_FORMAT)
+
+
+def main(count: int = COUNT) -> None:
+    times = [TIMES['http date']] * count
+    report('strptime of http date', count, timed(strptime, times))
+    for name, time_str in TIMES.items():
+        body = {
+            'crypto_name': 'Favicoin',
+            'operation_type': 'purchase',
+            'amount': 10,
+            'time_str': time_str,
+        }
+        report(f'operation with {name}', count, timed(validate, [body] * count))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT)
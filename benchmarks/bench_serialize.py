@@ -0,0 +1,89 @@
+'''
+Rows per second of read functions: ORM objects with 'serialized()'
+against column tuples with 'serialized_rows()'
+
+    python -m benchmarks.bench_serialize [rows]
+'''
+import sys
+from typing import Any, Callable
+
+from sqlalchemy import insert
+
+from app.market import bulk, market
+from app.market.cache import rates
+from app.market.database import create_session
+from app.market.models import Crypto, Operation, Portfolio, User, serialized
+from benchmarks.common import report, temp_app, timed
+
+
+def seed(count: int) -> None:
+    bulk.add_users({'login': f'user{i}'} for i in range(count))
+    bulk.add_crypto(
+        {'crypto_name': f'coin{i}', 'purchase_cost': 200, 'sale_cost': 100}
+        for i in range(count)
+    )
+    with create_session() as session:
+        session.execute(
+            insert(Portfolio),
+            [{'user_id': 1, 'crypto_id': i + 1, 'amount': 10} for i in range(count)],
+        )
+        session.execute(
+            insert(Operation),
+            [
+                {
+                    'user_id': 1,
+                    'crypto_id': i + 1,
+                    'operation_type': 'purchase',
+                    'amount': 10,
+                    'purchase_cost': 200,
+                    'sale_cost': 100,
+                }
+                for i in range(count)
+            ],
+        )
+
+
+def orm_read(model: Any, where: tuple[Any, ...] = ()) -> Callable[[], Any]:
+    # Read path before column tuples: ORM objects with joined eager loads
+    def read() -> Any:
+        with create_session(readonly=True) as session:
+            query = session.query(model)
+            if where:
+                query = query.join(User, User.id == model.user_id).where(*where)
+            return serialized(query.all())
+
+    return read
+
+
+def uncached(func: Callable[..., Any]) -> Callable[[], Any]:
+    def read() -> Any:
+        rates.reset()
+        return func()
+
+    return read
+
+
+def main(count: int = 100000) -> None:
+    with temp_app():
+        seed(count)
+
+        for name, before, after in (
+            ('users', orm_read(User), market.get_users),
+            (
+                'operations',
+                orm_read(Operation, (User.login == 'user0',)),
+                lambda: market.get_operations('user0'),
+            ),
+            (
+                'portfolio',
+                orm_read(Portfolio, (User.login == 'user0',)),
+                lambda: market.get_portfolio('user0'),
+            ),
+            ('crypto', orm_read(Crypto), uncached(market.get_crypto)),
+        ):
+            report(f'{name} orm', count, timed(before))
+            report(f'{name} rows', count, timed(after))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,171 @@
+'''
+Every function of app.market.market and every route under /market timed
+at several dataset sizes generated by 'seed_db'. Results are written as
+JSON; with --compare, medians are printed against a previous run.
+
+    python -m benchmarks.bench_suite [--sizes small,medium] [--repeat 20]
+        [--output bench.json] [--compare previous.json]
+'''
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+from flask import Flask
+from sqlalchemy import update
+
+from app.market.database import create_session
+from app.market.models import User
+from app.market.seed import seed_db
+from benchmarks.common import temp_app
+from benchmarks.suite_cases import (
+    SEED,
+    SIZES,
+    TRADER,
+    Case,
+    Size,
+    function_cases,
+    route_cases,
+)
+
+# Regressions are reported when median is slower than previous by this ratio
+THRESHOLD = 1.2
+
+
+def market_routes(app: Flask) -> set[tuple[str, str]]:
+    return {
+        (rule.rule, method)
+        for rule in app.url_map.iter_rules()
+        if rule.rule.startswith('/market')
+        for method in (rule.methods or set()) - {'HEAD', 'OPTIONS'}
+    }
+
+
+def measure(case: Case, repeat: int) -> dict[str, float]:
+    '''
+    Milliseconds of 'repeat' calls after one warm-up call
+    '''
+    case()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case()
+        times.append((time.perf_counter() - start) * 1000)
+
+    times.sort()
+    return {
+        'min': times[0],
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'max': times[-1],
+    }
+
+
+def run_size(name: str, size: Size, repeat: int) -> dict[str, Any]:
+    with temp_app() as app:
+        start = time.perf_counter()
+        rows = seed_db(*size, seed=SEED)
+        seed_seconds = time.perf_counter() - start
+
+        # Benchmark trades must not run out of money
+        with create_session() as session:
+            session.execute(
+                update(User).where(User.login == TRADER).values(balance=10**15)
+            )
+
+        results: dict[str, Any] = {}
+        for case_name, case in function_cases().items():
+            results[f'market.{case_name}'] = measure(case, repeat)
+
+        cases = route_cases(app.test_client())
+        for (rule, method), case in cases.items():
+            results[f'{method} {rule}'] = measure(case, repeat)
+
+    missing = sorted(
+        f'{method} {rule}' for rule, method in market_routes(app) - set(cases)
+    )
+    for route in missing:
+        print(f'{name}: no benchmark case for {route}')
+
+    return {
+        'size': size._asdict(),
+        'rows': rows,
+        'seed_seconds': seed_seconds,
+        'results': results,
+        'missing': missing,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], previous: dict[str, Any]) -> list[str]:
+    '''
+    Lines of 'size name old new ratio' for results present in both runs,
+    regressions are marked by '!'
+    '''
+    lines = []
+    for size, run in current['sizes'].items():
+        old_run = previous['sizes'].get(size, {'results': {}})
+        for name, result in run['results'].items():
+            old = old_run['results'].get(name)
+            if old is None:
+                continue
+            ratio = result['median'] / old['median']
+            mark = '!' if ratio > THRESHOLD else ' '
+            lines.append(
+                f'{mark} {size:<8} {name:<60} {old["median"]:9.3f}ms '
+                f'{result["median"]:9.3f}ms {ratio:6.2f}x'
+            )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='small,medium')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    current = {
+        'meta': {
+            'time': datetime.utcnow().isoformat(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': SEED,
+            'repeat': args.repeat,
+        },
+        'sizes': {},
+    }
+    for name in args.sizes.split(','):
+        print(f'{name}: {SIZES[name]}')
+        current['sizes'][name] = run_size(name, SIZES[name], args.repeat)
+        for case_name, result in current['sizes'][name]['results'].items():
+            print(f'  {case_name:<70} {result["median"]:9.3f}ms')
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(current, file, indent=2, sort_keys=True)
+    print(f'Results are written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print('\n'.join(compare(current, json.load(file))))
+
+
+if __name__ == '__main__':
+    main()
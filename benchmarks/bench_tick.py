@@ -0,0 +1,27 @@
+'''
+Duration of one rates update tick depending on number of crypto
+
+    python -m benchmarks.bench_tick [count ...]
+'''
+import sys
+
+from app.market import bulk, updates
+from benchmarks.common import report, temp_app
+
+
+COUNTS = (10, 100, 1000, 10000, 100000)
+
+
+def main(counts: tuple[int, ...] = COUNTS) -> None:
+    for count in counts:
+        with temp_app():
+            bulk.add_crypto(
+                {'crypto_name': f'coin{i}', 'purchase_cost': 200, 'sale_cost': 100}
+                for i in range(count)
+            )
+            stats = updates.tick()
+            report(f'tick of {count} crypto', stats.rows, stats.duration)
+
+
+if __name__ == '__main__':
+    main(tuple(int(arg) for arg in sys.argv[1:]) or COUNTS)
@@ -0,0 +1,36 @@
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from unittest import mock
+
+from flask import Flask
+
+from app import create_app
+from app.market.database import init_db
+
+
+@contextmanager
+def temp_app() -> Iterator[Flask]:
+    '''
+    Application bound to a fresh SQLite database in temporary directory.
+    Rates are not updated in background to keep runs comparable.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        with mock.patch('app.market.updates.run_updates'), mock.patch(
+            'app.market.updates.run_follower'
+        ):
+            app = create_app()
+        init_db(f'sqlite:///{Path(directory) / "bench.sqlite"}')
+        yield app
+
+
+def timed(func: Callable[..., Any], *args: Any, **kwargs: Any) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def report(name: str, count: int, seconds: float) -> None:
+    print(f'{name:<40} {count:>8} in {seconds:8.3f}s  {count / seconds:>10.1f}/s')
@@ -0,0 +1,173 @@
+'''
+Cases of 'bench_suite': every function of app.market.market and every
+route under /market on database seeded by 'seed_db'.
+'''
+import itertools
+from functools import partial
+from typing import Any, Callable, NamedTuple, Optional
+
+from flask.testing import FlaskClient
+
+from app.market import market, orders
+from app.market.config import DATETIME_FORMAT
+
+
+class Size(NamedTuple):
+    users: int
+    crypto: int
+    operations: int
+
+
+SIZES = {
+    'small': Size(100, 10, 10_000),
+    'medium': Size(1_000, 50, 200_000),
+    'large': Size(10_000, 100, 2_000_000),
+}
+SEED = 0
+# Seeded users, reads are timed on one of them and trades on another,
+# so history read by cases doesn't grow with the number of repeats
+LOGIN = 'user0'
+TRADER = 'user1'
+CRYPTO = 'coin0'
+
+Case = Callable[[], Any]
+
+counter = itertools.count()
+
+
+def now_str() -> str:
+    return market.utcnow().strftime(DATETIME_FORMAT)
+
+
+def unique(prefix: str) -> str:
+    return f'{prefix}{next(counter)}'
+
+
+def operation() -> dict[str, Any]:
+    return {
+        'crypto_name': CRYPTO,
+        'operation_type': 'purchase',
+        'amount': 1,
+        'time_str': now_str(),
+    }
+
+
+def order() -> dict[str, Any]:
+    return {'crypto_name': CRYPTO, 'side': 'buy', 'price': 1, 'amount': 1}
+
+
+def crypto(name: str) -> dict[str, Any]:
+    return {'crypto_name': name, 'purchase_cost': 200, 'sale_cost': 100}
+
+
+def function_cases() -> dict[str, Case]:
+    # Functions of 'db_session' are typed with their 'session' argument,
+    # 'partial' makes them cases
+    return {
+        'get_users': partial(market.get_users),
+        'add_user': lambda: market.add_user(unique('bench')),
+        'get_operations': partial(market.get_operations, LOGIN),
+        'add_operation': lambda: market.add_operation(
+            TRADER, CRYPTO, 'purchase', 1, now_str()
+        ),
+        'get_balance': partial(market.get_balance, LOGIN),
+        'get_portfolio': partial(market.get_portfolio, LOGIN),
+        'get_crypto': partial(market.get_crypto),
+        'add_crypto': lambda: market.add_crypto(unique('benchcoin'), 200, 100),
+        'update_crypto': partial(market.update_crypto, CRYPTO, 200, 100),
+        'update_all_crypto': lambda: market.update_all_crypto(lambda costs: costs),
+    }
+
+
+def route_cases(client: FlaskClient) -> dict[tuple[str, str], Case]:
+    '''
+    Cases by (rule, method); requests must succeed. JSON body of request
+    is made by 'body' for every call.
+    '''
+    users = f'/market/users/{LOGIN}'
+    trader = f'/market/users/{TRADER}'
+
+    def request(method: str, url: str, body: Optional[Case] = None) -> Case:
+        def run() -> None:
+            kwargs = {} if body is None else {'json': body()}
+            response = client.open(url, method=method, **kwargs)
+            # Body of streamed responses is read by 'get_data'
+            response.get_data()
+            assert response.status_code < 300, (url, response.status_code)
+
+        return run
+
+    def stream_first_event() -> None:
+        response = client.get('/market/crypto/stream')
+        next(iter(response.response))
+        response.close()
+
+    def cancel() -> None:
+        # Timed with placing of the order it cancels
+        order_id = orders.place_order(TRADER, **order())['id']
+        request('DELETE', f'{trader}/orders/{order_id}')()
+
+    return {
+        ('/market/users', 'GET'): request('GET', '/market/users'),
+        ('/market/users', 'POST'): request(
+            'POST', '/market/users', lambda: {'login': unique('bench')}
+        ),
+        ('/market/users/bulk', 'POST'): request(
+            'POST',
+            '/market/users/bulk',
+            lambda: [{'login': unique('bulk')} for _ in range(100)],
+        ),
+        ('/market/users/<string:login>/operations', 'GET'): request(
+            'GET', f'{users}/operations'
+        ),
+        ('/market/users/<string:login>/operations', 'POST'): request(
+            'POST', f'{trader}/operations', operation
+        ),
+        ('/market/users/<string:login>/operations/batch', 'POST'): request(
+            'POST',
+            f'{trader}/operations/batch',
+            lambda: {'operations': [operation() for _ in range(10)], 'atomic': True},
+        ),
+        ('/market/users/<string:login>/balance', 'GET'): request(
+            'GET', f'{users}/balance'
+        ),
+        ('/market/users/<string:login>/portfolio', 'GET'): request(
+            'GET', f'{users}/portfolio'
+        ),
+        ('/market/users/<string:login>/valuation', 'GET'): request(
+            'GET', f'{users}/valuation'
+        ),
+        ('/market/crypto', 'GET'): request('GET', '/market/crypto'),
+        ('/market/crypto', 'POST'): request(
+            'POST', '/market/crypto', lambda: crypto(unique('benchcoin'))
+        ),
+        ('/market/crypto/bulk', 'POST'): request(
+            'POST',
+            '/market/crypto/bulk',
+            lambda: [crypto(unique('bulkcoin')) for _ in range(100)],
+        ),
+        ('/market/crypto/stream', 'GET'): stream_first_event,
+        ('/market/metrics', 'GET'): request('GET', '/market/metrics'),
+        ('/market/slow-queries', 'GET'): request('GET', '/market/slow-queries'),
+        ('/market/crypto/<string:crypto_name>/candles', 'GET'): request(
+            'GET', f'/market/crypto/{CRYPTO}/candles?interval=1h'
+        ),
+        ('/market/users/<string:login>/orders', 'GET'): request(
+            'GET', f'{trader}/orders'
+        ),
+        # Bids far below rates rest in the book without fills
+        ('/market/users/<string:login>/orders', 'POST'): request(
+            'POST', f'{trader}/orders', order
+        ),
+        ('/market/users/<string:login>/orders/<int:order_id>', 'DELETE'): cancel,
+        ('/market/crypto/<string:crypto_name>/book', 'GET'): request(
+            'GET', f'/market/crypto/{CRYPTO}/book'
+        ),
+        # Extra cases of the same routes, not required to cover them
+        ('/market/users/<string:login>/operations?limit=100', 'GET'): request(
+            'GET', f'{users}/operations?limit=100'
+        ),
+        ('/market/users/<string:login>/operations?stream=ndjson', 'GET'): request(
+            'GET', f'{users}/operations?stream=ndjson'
+        ),
+    }
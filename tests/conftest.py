@@ -4,5 +4,8 @@ from app import create_app
 
 
 @pytest.fixture(autouse=True)
-def app():
+def app(monkeypatch):
+    # Background updates would change rates in the middle of tests
+    monkeypatch.setattr('app.market.updates.run_updates', lambda: None)
+    monkeypatch.setattr('app.market.updates.run_follower', lambda: None)
     return create_app()
@@ -1,9 +1,12 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from app.market.config import DATETIME_FORMAT, MARKET_DB_URL_TEST
-from app.market.database import clear_db, init_db
+from app.market.database import clear_db, create_session, init_db
 from app.market.exceptions import DatabaseError
 
 
@@ -37,6 +40,7 @@ def db():
 
 def mock_db_exception(mocker):
     mocker.patch('sqlalchemy.orm.Session.add', side_effect=DatabaseError)
+    mocker.patch('sqlalchemy.orm.Session.execute', side_effect=DatabaseError)
     mocker.patch('sqlalchemy.orm.Query.all', side_effect=DatabaseError)
     mocker.patch('sqlalchemy.orm.Query.one', side_effect=DatabaseError)
     mocker.patch('sqlalchemy.orm.Query.first', side_effect=DatabaseError)
@@ -45,3 +49,46 @@ def mock_db_exception(mocker):
 
 def formatted_now(time_shift=timedelta()):
     return datetime.strftime(datetime.utcnow() + time_shift, DATETIME_FORMAT)
+
+
+@contextmanager
+def captured_statements():
+    '''
+    Collects (statement, parameters) of all executed SQL statements
+    '''
+    statements = []
+
+    def before_cursor_execute(_conn, _cursor, statement, parameters, _context, many):
+        statements.append((statement, parameters[0] if many else parameters))
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def query_plan(statement, parameters):
+    with create_session() as session:
+        rows = session.connection().exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {statement}', parameters
+        )
+        return [row.detail for row in rows]
+
+
+def full_scans(statements, allowed_tables=()):
+    '''
+    Steps of query plans of SELECT/UPDATE/DELETE statements which read
+    whole table or sort result in temporary B-tree
+    '''
+    scans = []
+    for statement, parameters in statements:
+        if not statement.lstrip().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        for step in query_plan(statement, parameters):
+            table = step.split()[1]
+            if (
+                step.startswith('SCAN') and table not in allowed_tables
+            ) or 'TEMP B-TREE' in step:
+                scans.append((step, statement))
+    return scans
@@ -0,0 +1,255 @@
+import asyncio
+import json
+
+import pytest
+
+from app.market import amarket, exceptions, market, metrics
+from app.market.asgi import MarketApp
+from app.market.config import MARKET_DB_URL_TEST
+from tests.market.conftest import formatted_now
+
+
+@pytest.fixture(name='asgi_app')
+def fixture_asgi_app(app):
+    return MarketApp(app, MARKET_DB_URL_TEST)
+
+
+async def call(
+    asgi_app, method, path, query='', body=None, content_type='application/json'
+):
+    '''
+    Returns (status, headers, body) of response
+    '''
+    data = b'' if body is None else json.dumps(body).encode()
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'content-type', content_type.encode())],
+    }
+    messages = []
+    requests = [{'type': 'http.request', 'body': data}]
+
+    async def receive():
+        if not requests:
+            # Client waits for the response until it's cancelled
+            await asyncio.Future()
+        return requests.pop()
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    headers = {k.decode(): v.decode() for k, v in messages[0]['headers']}
+    return (
+        messages[0]['status'],
+        headers,
+        b''.join(m.get('body', b'') for m in messages[1:]),
+    )
+
+
+def run(asgi_app, *requests):
+    '''
+    Runs requests one by one in new event loop with its own async engine
+    '''
+
+    async def scenario():
+        await amarket.init_db(MARKET_DB_URL_TEST)
+        try:
+            return [await call(asgi_app, *request) for request in requests]
+        finally:
+            await amarket.dispose_db()
+
+    return asyncio.run(scenario())
+
+
+def fill_db():
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+    market.add_operation('Annet', 'Geckcoin', 'purchase', 5, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'sale', 5, formatted_now())
+
+
+@pytest.mark.parametrize(
+    'path, query',
+    [
+        ('/market/users', ''),
+        ('/market/users/Annet/operations', ''),
+        ('/market/users/Annet/operations', 'limit=2'),
+        ('/market/users/Annet/operations', 'stream=ndjson'),
+        ('/market/users/Annet/balance', ''),
+        ('/market/users/Annet/portfolio', ''),
+        ('/market/users/Bella/portfolio', ''),
+        ('/market/crypto', ''),
+    ],
+)
+def test_get_as_flask(client, asgi_app, path, query):
+    fill_db()
+
+    expected = client.get(f'{path}?{query}')
+    ((status, headers, body),) = run(asgi_app, ('GET', path, query))
+
+    assert status == expected.status_code, 'Wrong status code'
+    assert body == expected.data, 'Body differs from Flask'
+    assert headers.get('x-next-cursor') == expected.headers.get(
+        'X-Next-Cursor'
+    ), 'Wrong cursor'
+
+
+def test_post(asgi_app):
+    responses = run(
+        asgi_app,
+        ('POST', '/market/users', '', {'login': 'Annet'}),
+        (
+            'POST',
+            '/market/crypto',
+            '',
+            {'crypto_name': 'Favicoin', 'purchase_cost': 200, 'sale_cost': 100},
+        ),
+        (
+            'POST',
+            '/market/users/Annet/operations',
+            '',
+            {
+                'crypto_name': 'Favicoin',
+                'operation_type': 'purchase',
+                'amount': 10,
+                'time_str': formatted_now(),
+            },
+        ),
+    )
+
+    assert [status for status, _, _ in responses] == [
+        201,
+        201,
+        201,
+    ], 'Wrong status codes'
+    assert market.get_portfolio('Annet')[0]['amount'] == 10, 'Wrong portfolio'
+
+
+@pytest.mark.parametrize(
+    'atomic, status_code, count', [(True, 400, 0), (False, 207, 1)]
+)
+def test_operations_batch_post(asgi_app, atomic, status_code, count):
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    operations = [
+        {
+            'crypto_name': 'Favicoin',
+            'operation_type': 'purchase',
+            'amount': 10,
+            'time_str': formatted_now(),
+        },
+        {
+            'crypto_name': 'Unknown',
+            'operation_type': 'purchase',
+            'amount': 10,
+            'time_str': formatted_now(),
+        },
+    ]
+
+    ((status, _, body),) = run(
+        asgi_app,
+        (
+            'POST',
+            '/market/users/Annet/operations/batch',
+            '',
+            {'operations': operations, 'atomic': atomic},
+        ),
+    )
+
+    assert status == status_code, 'Wrong status code'
+    assert len(json.loads(body)) == 2, 'Wrong number of results'
+    assert len(market.get_operations('Annet')) == count, 'Wrong number of operations'
+
+
+@pytest.mark.parametrize(
+    'method, path, query, body, content_type',
+    [
+        ('POST', '/market/users', '', {}, 'application/json'),
+        ('POST', '/market/users', '', {'login': 'Annet'}, 'text/plain'),
+        (
+            'POST',
+            '/market/users/Annet/operations',
+            '',
+            {'amount': 10},
+            'application/json',
+        ),
+        (
+            'POST',
+            '/market/users/Annet/operations/batch',
+            '',
+            {'operations': []},
+            'application/json',
+        ),
+        ('POST', '/market/crypto', '', {'crypto_name': 'Favicoin'}, 'application/json'),
+        (
+            'GET',
+            '/market/users/Annet/operations',
+            'limit=abc',
+            None,
+            'application/json',
+        ),
+        (
+            'GET',
+            '/market/users/Annet/operations',
+            'after=abc',
+            None,
+            'application/json',
+        ),
+        ('GET', '/market/users/Bella/balance', '', None, 'application/json'),
+        ('DELETE', '/market/users', '', None, 'application/json'),
+        ('GET', '/market/unknown', '', None, 'application/json'),
+    ],
+)
+def test_errors_as_flask(client, asgi_app, method, path, query, body, content_type):
+    fill_db()
+
+    expected = client.open(
+        f'{path}?{query}',
+        method=method,
+        data=json.dumps(body),
+        content_type=content_type,
+    )
+    ((status, _, data),) = run(asgi_app, (method, path, query, body, content_type))
+
+    assert status == expected.status_code, 'Wrong status code'
+    if status == 400:
+        assert data == expected.data, 'Message differs from Flask'
+    if status == 422 and expected.is_json:
+        assert json.loads(data) == expected.get_json(), 'Errors differ from Flask'
+
+
+def test_request_metrics(asgi_app):
+    market.add_user('Annet')
+    metrics.reset()
+
+    run(asgi_app, ('GET', '/market/users/Annet/balance'))
+
+    route = '/market/users/<string:login>/balance'
+    duration = dict(
+        (labels, value)
+        for suffix, _, labels, value in metrics.REQUEST_DURATION.samples()
+        if suffix == '_count'
+    )
+    statements = dict(
+        (suffix, value)
+        for suffix, _, labels, value in metrics.REQUEST_STATEMENTS.samples()
+        if labels == (route,)
+    )
+    assert duration[(route, 'GET', '200')] == 1, 'Request was not counted'
+    assert statements['_sum'] >= 2, 'Statements of request were not counted'
+
+
+def test_db_error(asgi_app, mocker):
+    mocker.patch(
+        'app.market.market.get_users', side_effect=exceptions.DatabaseError('Failed')
+    )
+
+    ((status, _, body),) = run(asgi_app, ('GET', '/market/users'))
+
+    assert status == 500, 'Wrong status code'
+    assert json.loads(body) == {'message': 'Failed'}, 'Wrong message'
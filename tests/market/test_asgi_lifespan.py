@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.market import amarket
+from app.market.asgi import MarketApp
+from app.market.config import MARKET_DB_URL_TEST
+
+
+@pytest.fixture(name='asgi_app')
+def fixture_asgi_app(app):
+    return MarketApp(app, MARKET_DB_URL_TEST)
+
+
+def test_lifespan(asgi_app):
+    messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    async def scenario():
+        await asgi_app({'type': 'lifespan'}, receive, send)
+
+    asyncio.run(scenario())
+
+    assert sent == [
+        'lifespan.startup.complete',
+        'lifespan.shutdown.complete',
+    ], 'Wrong lifespan'
+    assert not amarket.engines, 'Engine was not disposed'
+
+
+def test_engine_is_started_once(asgi_app, mocker):
+    started = amarket.init_db
+
+    async def slow_init_db(url):
+        await asyncio.sleep(0.05)
+        await started(url)
+
+    init_db = mocker.patch.object(amarket, 'init_db', side_effect=slow_init_db)
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    async def scenario():
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/market/users',
+            'query_string': b'',
+            'headers': [],
+        }
+        # Server without lifespan support
+        try:
+            await asyncio.gather(*(asgi_app(scope, receive, send) for _ in range(5)))
+        finally:
+            await amarket.dispose_db()
+
+    asyncio.run(scenario())
+
+    assert statuses == [200] * 5, 'Request failed'
+    assert init_db.call_count == 1, 'Engine was started again'
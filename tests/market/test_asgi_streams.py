@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.market import amarket, bulk, market
+from app.market.asgi import MarketApp
+from app.market.cache import Rate
+from app.market.config import MARKET_DB_URL_TEST
+from app.market.feed import feed
+
+
+@pytest.fixture(autouse=True)
+def reset_feed():
+    feed.reset()
+    yield
+    feed.reset()
+
+
+def stream_scope(path, query=''):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [],
+    }
+
+
+def test_stream_ends_on_disconnect(app, mocker):
+    unsubscribe = mocker.spy(feed, 'unsubscribe')
+    asgi_app = MarketApp(app, MARKET_DB_URL_TEST)
+    sent = []
+
+    async def scenario():
+        disconnect = asyncio.Event()
+        requests = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message.get('body', b'').startswith(b'id: 0'):
+                disconnect.set()
+
+        await amarket.init_db(MARKET_DB_URL_TEST)
+        try:
+            call = asyncio.ensure_future(
+                asgi_app(stream_scope('/market/crypto/stream'), receive, send)
+            )
+            await disconnect.wait()
+            await asyncio.sleep(0.05)
+            # Worker notices disconnect at the next event
+            feed.publish([Rate(1, 'Favicoin', 200, 100, datetime.utcnow())])
+            await asyncio.wait_for(call, 5)
+        finally:
+            await amarket.dispose_db()
+
+    asyncio.run(scenario())
+
+    assert unsubscribe.called, 'Subscriber of closed stream was kept'
+    assert [m['type'] for m in sent] == [
+        'http.response.start',
+        'http.response.body',
+    ], 'Event was sent after disconnect'
+    assert asgi_app.streams == 0, 'Stream was not finished'
+
+
+@pytest.mark.parametrize(
+    'path, query, status_code',
+    [
+        ('/market/crypto/stream', '', 503),
+        ('/market/users/Annet/operations', 'stream=ndjson', 503),
+        ('/market/crypto/Favicoin/candles', '', 400),
+    ],
+)
+def test_streams_are_limited(app, path, query, status_code):
+    asgi_app = MarketApp(app, MARKET_DB_URL_TEST, max_streams=0)
+    sent = []
+    requests = [{'type': 'http.request', 'body': b''}]
+
+    async def receive():
+        if not requests:
+            await asyncio.Future()
+        return requests.pop()
+
+    async def send(message):
+        sent.append(message)
+
+    async def scenario():
+        await amarket.init_db(MARKET_DB_URL_TEST)
+        try:
+            await asgi_app(stream_scope(path, query), receive, send)
+        finally:
+            await amarket.dispose_db()
+
+    asyncio.run(scenario())
+
+    assert sent[0]['status'] == status_code, 'Wrong status code'
+
+
+def test_bulk_body_is_streamed(app, mocker):
+    asgi_app = MarketApp(app, MARKET_DB_URL_TEST)
+    parse_ndjson = bulk.parse_ndjson
+    parsed = []
+
+    def parse(lines):
+        for row in parse_ndjson(lines):
+            parsed.append(row)
+            yield row
+
+    mocker.patch.object(bulk, 'parse_ndjson', parse)
+    chunks = [b'{"login": "Annet"}\n{"login": "Be', b'lla"}\n']
+    sent = []
+
+    async def receive():
+        if not chunks:
+            await asyncio.Future()
+        if len(chunks) == 1:
+            # Buffered body would never get the last chunk
+            while not parsed:
+                await asyncio.sleep(0.01)
+        body = chunks.pop(0)
+        return {'type': 'http.request', 'body': body, 'more_body': bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': '/market/users/bulk',
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/x-ndjson')],
+    }
+    asyncio.run(asyncio.wait_for(asgi_app(scope, receive, send), 5))
+
+    assert sent[0]['status'] == 201, 'Wrong status code'
+    assert [row['login'] for row in parsed] == ['Annet', 'Bella'], 'Wrong rows'
+    assert len(market.get_users()) == 2, 'Users were not added'
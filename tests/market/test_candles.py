@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.market import candles, market
+from app.market.cache import rolled
+from app.market.database import clear_db, create_session
+from app.market.exceptions import MarketError
+from app.market.models import RateCandle, RateTick
+
+START = 1646136000  # Tue, 01 Mar 2022 12:00:00 GMT
+TICK = 10
+
+
+def add_ticks(crypto_id, since, until):
+    '''
+    Every 10 seconds, costs go up and down to have different OHLC
+    '''
+    ticks = [
+        {
+            'crypto_id': crypto_id,
+            'time': time,
+            'purchase_cost': 200 + (time // TICK) % 7 * 10,
+            'sale_cost': 100 + (time // TICK) % 5 * 10,
+        }
+        for time in range(since, until, TICK)
+    ]
+    with create_session() as session:
+        session.execute(RateTick.__table__.insert(), ticks)
+    return ticks
+
+
+def expected_candles(ticks, interval, since, until):
+    result: dict[int, dict[str, Any]] = {}
+    for tick in ticks:
+        start = tick['time'] - tick['time'] % interval
+        if not since <= start < until:
+            continue
+        candle = result.setdefault(
+            start,
+            {'start': start, 'purchase': [], 'sale': []},
+        )
+        candle['purchase'].append(tick['purchase_cost'])
+        candle['sale'].append(tick['sale_cost'])
+
+    return [
+        {
+            'start': c['start'],
+            'purchase_open': c['purchase'][0],
+            'purchase_high': max(c['purchase']),
+            'purchase_low': min(c['purchase']),
+            'purchase_close': c['purchase'][-1],
+            'sale_open': c['sale'][0],
+            'sale_high': max(c['sale']),
+            'sale_low': min(c['sale']),
+            'sale_close': c['sale'][-1],
+        }
+        for c in result.values()
+    ]
+
+
+def at(seconds):
+    return datetime.utcfromtimestamp(START + seconds)
+
+
+def test_update_records_ticks():
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+
+    market.update_all_crypto(lambda costs: [cost * 2 for cost in costs])
+    market.update_crypto('Favicoin', 500, 300)
+
+    with create_session() as session:
+        ticks = session.execute(
+            select(RateTick.crypto_id, func.max(RateTick.purchase_cost)).group_by(
+                RateTick.crypto_id
+            )
+        ).all()
+
+    assert sorted(ticks) == [(1, 500), (2, 800)], 'Ticks were not recorded'
+
+
+@pytest.mark.parametrize(
+    ('interval', 'since', 'until'),
+    [
+        (60, START, START + 3 * 3600),
+        (60, START + 125, START + 3600 + 30),
+        (3600, START, START + 3 * 3600),
+        (86400, START - 86400, START + 86400),
+    ],
+)
+def test_get_candles(interval, since, until):
+    market.add_crypto('Favicoin', 200, 100)
+    ticks = add_ticks(1, START, START + 2 * 3600 + 600)
+
+    watermarks = candles.rollup(at(2 * 3600 + 300))
+
+    assert watermarks == {
+        60: START + 2 * 3600 + 300,
+        3600: START + 2 * 3600,
+        86400: START - START % 86400,
+    }, 'Wrong watermarks'
+    aligned = since - since % interval
+    assert candles.get_candles('Favicoin', interval, since, until) == expected_candles(
+        ticks, interval, aligned, until
+    ), 'Wrong candles'
+
+
+def test_get_candles_without_rolled_ticks():
+    market.add_crypto('Favicoin', 200, 100)
+    ticks = add_ticks(1, START, START + 3600 + 120)
+    candles.rollup(at(3600 + 60))
+
+    # Rolled up ticks are not needed for candles
+    with create_session() as session:
+        session.execute(delete(RateTick).where(RateTick.time < START + 3600 + 60))
+
+    assert candles.get_candles(
+        'Favicoin', 3600, START, START + 7200
+    ) == expected_candles(ticks, 3600, START, START + 7200), 'Wrong candles'
+
+
+def test_rollup_prunes_by_retention(monkeypatch):
+    monkeypatch.setitem(candles.MARKET_RATE_RETENTION, 0, timedelta(minutes=10))
+    monkeypatch.setitem(candles.MARKET_RATE_RETENTION, 60, timedelta(hours=1))
+    market.add_crypto('Favicoin', 200, 100)
+    add_ticks(1, START, START + 3 * 3600)
+
+    candles.rollup(at(3 * 3600))
+
+    with create_session() as session:
+        oldest_tick = session.execute(select(func.min(RateTick.time))).scalar()
+        oldest_minute = session.execute(
+            select(func.min(RateCandle.start)).where(RateCandle.interval == 60)
+        ).scalar()
+        hours = session.execute(
+            select(func.count()).where(RateCandle.interval == 3600)
+        ).scalar()
+
+    assert oldest_tick == START + 3 * 3600 - 600, 'Ticks were not pruned'
+    assert oldest_minute == START + 2 * 3600, 'Minute candles were not pruned'
+    assert hours == 3, 'Hour candles were pruned'
+
+
+def test_rollup_if_due(mocker):
+    rollup = mocker.patch('app.market.candles.rollup')
+    rolled.until = START + 60
+
+    candles.rollup_if_due(at(119))
+    assert not rollup.called, 'Rollup before the end of candle'
+
+    candles.rollup_if_due(at(120))
+    assert rollup.called, 'Rollup was not called'
+
+
+def test_get_candles_unknown_crypto():
+    with pytest.raises(MarketError):
+        candles.get_candles('Favicoin', 60, START, START + 60)
+
+
+@pytest.mark.parametrize(
+    ('query', 'status_code', 'count'),
+    [
+        (f'interval=1m&from={START}&to={START + 600}', 200, 10),
+        (f'interval=1h&to={START + 3600}', 200, 1),
+        ('interval=1w', 422, None),
+        ('from=abc', 422, None),
+        (f'from={START}&to={START}', 422, None),
+        (f'interval=1m&from={START}&to={START + 61 * 1000}', 422, None),
+        (f'to={10**23}', 422, None),
+        (f'from={-10**23}&to={START}', 422, None),
+        ('from=-60&to=0', 422, None),
+    ],
+)
+def test_crypto_candles_get(client, query, status_code, count):
+    market.add_crypto('Favicoin', 200, 100)
+    add_ticks(1, START, START + 600)
+
+    response = client.get(f'/market/crypto/Favicoin/candles?{query}')
+
+    assert response.status_code == status_code, 'Wrong status code'
+    if count is not None:
+        assert len(response.get_json()) == count, 'Wrong number of candles'
+
+
+def test_clear_db_resets_rollup():
+    rolled.until = START + 60
+
+    clear_db()
+
+    assert rolled.until == 0, 'Rollup was not reset'
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app.market import market
+from app.market.connections import is_file_db
+from app.market.database import create_session, engines, init_db
+from app.market.exceptions import DatabaseError
+from app.market.models import User
+from tests.market.conftest import formatted_now
+
+
+def pragma(name, readonly=False):
+    with create_session(readonly=readonly) as session:
+        return session.execute(text(f'PRAGMA {name}')).scalar()
+
+
+@pytest.mark.parametrize('readonly', [False, True])
+def test_pragmas(readonly):
+    assert pragma('journal_mode', readonly) == 'wal', 'Wrong journal_mode'
+    assert pragma('busy_timeout', readonly) == 5000, 'Wrong busy_timeout'
+    assert pragma('synchronous', readonly) == 1, 'Wrong synchronous'
+    assert pragma('query_only', readonly) == readonly, 'Wrong query_only'
+
+
+def test_engines():
+    engine, read_engine = engines['write'], engines['read']
+
+    assert engine is not read_engine, 'Reads and writes use one engine'
+    assert isinstance(engine.pool, QueuePool), 'Wrong pool class'
+    assert is_file_db(engine), 'Wrong type of database'
+
+
+def test_read_session_is_readonly():
+    with pytest.raises(DatabaseError):
+        with create_session(readonly=True) as session:
+            session.add(User('Annet'))
+
+
+def test_memory_db_uses_one_engine():
+    init_db('sqlite://')
+
+    with create_session() as session:
+        assert session.get_bind() is engines['write'], 'Wrong write engine'
+    assert not is_file_db(engines['write']), 'Wrong type of database'
+    assert (
+        engines['write'] is engines['read']
+    ), 'Memory database is split between engines'
+
+
+def test_memory_db_concurrent_reads():
+    init_db('sqlite://')
+    market.add_user('Annet')
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: market.get_users(), range(80)))
+
+    assert isinstance(engines['write'].pool, StaticPool), 'Wrong pool class'
+    assert all(len(users) == 1 for users in results), 'Reads used other databases'
+
+
+def test_concurrent_trades():
+    market.add_crypto('Favicoin', 200, 100)
+    logins = [f'user{i}' for i in range(8)]
+    for login in logins:
+        market.add_user(login)
+
+    def trade(login):
+        for _ in range(10):
+            market.add_operation(login, 'Favicoin', 'purchase', 1, formatted_now())
+            market.get_portfolio(login)
+
+    with ThreadPoolExecutor(len(logins)) as executor:
+        list(executor.map(trade, logins))
+
+    for login in logins:
+        assert market.get_portfolio(login)[0]['amount'] == 10, 'Trade was lost'
@@ -0,0 +1,179 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.market import market, updates
+from app.market.cache import Rate
+from app.market.feed import RateFeed, feed
+
+NOW = datetime(2022, 3, 1, 12, 0, 0)
+FAVICOIN = Rate(1, 'Favicoin', 200, 100, NOW)
+GECKCOIN = Rate(2, 'Geckcoin', 400, 200, NOW)
+
+
+@pytest.fixture(autouse=True)
+def reset_feed():
+    feed.reset()
+    yield
+    feed.reset()
+
+
+def data(text):
+    '''
+    (event type, data) of SSE message
+    '''
+    fields = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+def ticked(rate, purchase_cost=None):
+    return rate._replace(
+        purchase_cost=purchase_cost or rate.purchase_cost,
+        last_updated=rate.last_updated + timedelta(seconds=10),
+    )
+
+
+def test_publish_sends_changed_rates():
+    rate_feed = RateFeed()
+    subscriber = rate_feed.subscribe()
+    rate_feed.publish([FAVICOIN, GECKCOIN])
+    rate_feed.publish([ticked(FAVICOIN), ticked(GECKCOIN, 500)])
+
+    texts = [subscriber.queue.get_nowait().text for _ in range(3)]
+
+    assert data(texts[0]) == ('snapshot', {'last_updated': None, 'rates': []})
+    assert [r['name'] for r in data(texts[1])[1]['rates']] == ['Favicoin', 'Geckcoin']
+    event_type, tick = data(texts[2])
+    assert event_type == 'rates', 'Wrong event type'
+    assert [r['name'] for r in tick['rates']] == ['Geckcoin'], 'Wrong diff'
+    assert tick['last_updated'] == 'Tue, 01 Mar 2022 12:00:10 GMT', 'Wrong time'
+
+
+def test_publish_fans_out_one_event():
+    rate_feed = RateFeed()
+    subscribers = [rate_feed.subscribe(0) for _ in range(3)]
+
+    event = rate_feed.publish([FAVICOIN])
+
+    for subscriber in subscribers:
+        assert subscriber.queue.get_nowait() is event, 'Event was encoded again'
+
+
+def test_slow_subscriber_is_evicted():
+    rate_feed = RateFeed(queue_size=2)
+    slow = rate_feed.subscribe()
+    fast = rate_feed.subscribe()
+
+    rate_feed.publish([FAVICOIN])
+    fast.queue.get_nowait()
+    fast.queue.get_nowait()
+    rate_feed.publish([ticked(FAVICOIN, 250)])
+
+    assert slow.evicted and not fast.evicted, 'Wrong subscriber was evicted'
+    assert len(list(rate_feed.events(slow, keepalive=0.01))) == 2, 'Wrong events'
+    assert fast.queue.get_nowait().id == 2, 'Event was not sent'
+
+
+@pytest.mark.parametrize(
+    ('last_event_id', 'ids', 'event_type'),
+    [
+        (1, [2, 3], 'rates'),
+        (3, [], None),
+        (0, [3], 'snapshot'),
+        (100, [3], 'snapshot'),
+    ],
+)
+def test_subscribe_resumes(last_event_id, ids, event_type):
+    rate_feed = RateFeed(history=2)
+    for cost in (200, 250, 300):
+        rate_feed.publish([FAVICOIN._replace(purchase_cost=cost)])
+
+    subscriber = rate_feed.subscribe(last_event_id)
+    events = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+    assert [e.id for e in events] == ids, 'Wrong events'
+    if event_type is not None:
+        assert data(events[0].text)[0] == event_type, 'Wrong event type'
+
+
+def test_events_keepalive():
+    rate_feed = RateFeed()
+    subscriber = rate_feed.subscribe()
+    events = rate_feed.events(subscriber, keepalive=0.01)
+
+    assert next(events).startswith('id: 0'), 'Snapshot was not sent'
+    assert next(events) == ': keepalive\n\n', 'Keepalive was not sent'
+    events.close()
+    assert rate_feed.publish([FAVICOIN]) is not None
+
+
+def test_tick_publishes_to_feed():
+    market.add_crypto('Favicoin', 200, 100)
+    subscriber = feed.subscribe(0)
+
+    updates.tick()
+
+    event_type, tick = data(subscriber.queue.get_nowait().text)
+    assert event_type == 'rates', 'Wrong event type'
+    assert tick['rates'][0]['name'] == 'Favicoin', 'Rates were not published'
+
+
+def test_update_crypto_publishes_to_feed():
+    market.add_crypto('Favicoin', 200, 100)
+    market.get_crypto()
+    subscriber = feed.subscribe(feed.last_id)
+
+    market.update_crypto('Favicoin', 250, 150)
+
+    _, tick = data(subscriber.queue.get_nowait().text)
+    assert tick['rates'][0]['purchase_cost'] == 250, 'Update was not published'
+
+
+def test_same_rates_are_not_published():
+    rate_feed = RateFeed()
+    rate_feed.publish([FAVICOIN])
+
+    assert rate_feed.publish([FAVICOIN]) is None, 'Same rate was published'
+
+
+def test_crypto_stream_get(client):
+    feed.publish([FAVICOIN])
+
+    response = client.get('/market/crypto/stream')
+    first = next(response.response)
+    response.close()
+
+    assert response.status_code == 200, 'Wrong status code'
+    assert response.mimetype == 'text/event-stream', 'Wrong mimetype'
+    assert data(first.decode())[0] == 'snapshot', 'Snapshot was not sent'
+
+
+def test_crypto_stream_snapshot_of_unpublished_rates(client):
+    market.add_crypto('Favicoin', 200, 100)
+    feed.reset()
+
+    response = client.get('/market/crypto/stream')
+    first = next(response.response)
+    response.close()
+
+    event_type, snapshot = data(first.decode())
+    assert event_type == 'snapshot', 'Snapshot was not sent'
+    assert [r['name'] for r in snapshot['rates']] == ['Favicoin'], 'Empty snapshot'
+
+
+def test_crypto_stream_get_resume(client):
+    feed.publish([FAVICOIN])
+    feed.publish([ticked(FAVICOIN, 250)])
+
+    response = client.get('/market/crypto/stream', headers={'Last-Event-ID': '1'})
+    first = next(response.response)
+    response.close()
+
+    assert first.decode().startswith('id: 2\n'), 'Stream was not resumed'
+
+
+def test_crypto_stream_get_invalid(client):
+    response = client.get('/market/crypto/stream', headers={'Last-Event-ID': 'abc'})
+
+    assert response.status_code == 422, 'Wrong status code'
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.market import amarket, groupcommit, market, metrics
+from app.market.exceptions import DatabaseError, MarketError
+from app.market.groupcommit import GroupCommitWriter
+from tests.market.conftest import formatted_now
+
+
+@pytest.fixture(name='writer', autouse=True)
+def fixture_writer(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(groupcommit, 'MARKET_GROUP_COMMIT', True)
+    # Long wait, so concurrent trades get into one batch
+    group_writer = GroupCommitWriter(batch_size=10, max_wait=1)
+    group_writer.start()
+    monkeypatch.setattr(groupcommit, 'writer', group_writer)
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    yield group_writer
+    group_writer.stop(timeout=5)
+
+
+def batch_sizes():
+    return {
+        suffix: value
+        for suffix, _, _, value in groupcommit.BATCH_SIZE.samples()
+        if suffix in ('_sum', '_count')
+    }
+
+
+def trade(amount, errors):
+    try:
+        market.add_operation('Annet', 'Favicoin', 'purchase', amount, formatted_now())
+    except MarketError as error:
+        errors.append(error)
+
+
+def test_bad_trade_fails_alone():
+    errors: list[MarketError] = []
+    # Balance is 100000, the last trade costs more
+    amounts = [10] * 9 + [10**6]
+    threads = [threading.Thread(target=trade, args=(a, errors)) for a in amounts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert [str(error) for error in errors] == ['Not enough money to purchase']
+    assert len(market.get_operations('Annet')) == 9, 'Wrong number of operations'
+    assert market.get_balance('Annet') == {'balance': 100000 - 9 * 10 * 200}
+    assert batch_sizes() == {'_sum': 10, '_count': 1}, 'Trades were not grouped'
+
+
+def test_failed_commit_fails_every_call(mocker):
+    mocker.patch(
+        'app.market.groupcommit.create_session', side_effect=DatabaseError('Failed')
+    )
+    futures = [
+        groupcommit.submit(
+            market.add_operation, 'Annet', 'Favicoin', 'purchase', 1, formatted_now()
+        )
+        for _ in range(10)
+    ]
+
+    for future in futures:
+        with pytest.raises(DatabaseError, match='Failed'):
+            future.result(5)
+
+
+def test_unexpected_error_fails_batch(writer, mocker):
+    mocker.patch(
+        'app.market.groupcommit.create_session', side_effect=RuntimeError('Bug')
+    )
+    futures = [writer.submit(lambda session: None) for _ in range(3)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match='Bug'):
+            future.result(5)
+    assert writer.is_alive(), 'Writer died'
+
+    mocker.stopall()
+    assert writer.submit(lambda session: 'done').result(5) == 'done'
+
+
+def test_dead_writer_is_replaced(monkeypatch):
+    # Never started, as if its thread died
+    dead = GroupCommitWriter()
+    monkeypatch.setattr(groupcommit, 'writer', dead)
+
+    restarted = groupcommit.get_writer()
+
+    assert restarted is not dead, 'Dead writer was used'
+    assert restarted.is_alive(), 'Writer is not started'
+    groupcommit.stop_writer(timeout=5)
+
+
+def test_stop_commits_queued_calls(writer):
+    future = writer.submit(lambda session: 'done')
+
+    writer.stop(timeout=5)
+
+    assert future.result(0) == 'done', 'Queued call was not committed'
+    assert not writer.is_alive(), 'Writer is not stopped'
+    with pytest.raises(MarketError):
+        writer.submit(lambda session: None)
+
+
+def test_writer_is_restarted(writer):
+    writer.stop(timeout=5)
+
+    market.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+
+    restarted = groupcommit.writer
+    assert restarted is not writer, 'Stopped writer was used'
+    assert restarted is not None and restarted.is_alive(), 'Writer is not started'
+    groupcommit.stop_writer(timeout=5)
+
+
+def test_async_trade():
+    asyncio.run(
+        amarket.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+    )
+
+    assert len(market.get_operations('Annet')) == 1, 'Trade was not committed'
+    assert batch_sizes()['_count'] == 1, 'Trade was not committed by writer'
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(groupcommit, 'MARKET_GROUP_COMMIT', False)
+
+    market.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+
+    assert len(market.get_operations('Annet')) == 1, 'Trade was not committed'
+    assert batch_sizes() == {}, 'Trade was committed by writer'
@@ -0,0 +1,149 @@
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+
+from app.market import leader, market, metrics, updates
+from app.market.cache import rates
+from app.market.database import create_session
+from app.market.feed import feed
+from app.market.leader import Lease, acquire, release
+from app.market.models import Crypto
+
+# Saved before 'app' fixture replaces it
+run_updates = updates.run_updates
+
+TTL = timedelta(seconds=15)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def transitions():
+    return {labels: value for _, _, labels, value in leader.TRANSITIONS.samples()}
+
+
+def test_acquire():
+    assert acquire('rates', 'a', TTL), 'Free lease was not taken'
+    assert not acquire('rates', 'b', TTL), 'Held lease was taken'
+    assert acquire('rates', 'a', TTL), 'Lease was not renewed'
+    assert acquire('candles', 'b', TTL), 'Lease of another job was not taken'
+
+
+def test_acquire_expired():
+    acquire('rates', 'a', timedelta(0))
+
+    assert acquire('rates', 'b', TTL), 'Expired lease was not taken'
+    assert not acquire('rates', 'a', TTL), 'Lease was taken back'
+
+
+def test_release():
+    acquire('rates', 'a', TTL)
+    release('rates', 'b')
+    assert not acquire('rates', 'b', TTL), 'Lease was released by another holder'
+
+    release('rates', 'a')
+    assert acquire('rates', 'b', TTL), 'Released lease was not taken'
+
+
+def test_keep_renews_on_heartbeat(mocker):
+    lease = Lease('rates', heartbeat=timedelta(seconds=60))
+    spy = mocker.patch('app.market.leader.acquire', return_value=True)
+
+    assert lease.keep() and lease.keep(), 'Lease is not held'
+
+    assert spy.call_count == 1, 'Lease was renewed before heartbeat'
+
+
+def test_takeover():
+    ttl, heartbeat = timedelta(milliseconds=100), timedelta(0)
+    first = Lease('rates', ttl, heartbeat, holder='first')
+    second = Lease('rates', ttl, heartbeat, holder='second')
+
+    assert first.keep() and not second.keep(), 'Lease is held twice'
+    time.sleep(0.15)
+    assert not first.held, 'Expired lease is held'
+    assert second.keep() and not first.keep(), 'Expired lease was not taken over'
+
+    second.release()
+    assert first.keep(), 'Released lease was not taken'
+    assert transitions() == {
+        ('rates', 'taken'): 3,
+        ('rates', 'lost'): 1,
+        ('rates', 'released'): 1,
+    }, 'Wrong transitions'
+
+
+def test_standby_updater_doesnt_update(mocker):
+    acquire('rates', 'other', TTL)
+    lease = Lease('rates')
+    updater = updates.RateUpdater(lease)
+    updater.schedule.add(1, 9, now=0, within=0)
+    tick = mocker.patch('app.market.updates.tick')
+    wait = mocker.patch.object(updater.stopped, 'wait')
+
+    updater.step()
+
+    assert not tick.called, 'Standby updater updated rates'
+    assert len(updater.schedule) == 0, 'Schedule was kept without lease'
+    wait.assert_called_once_with(lease.heartbeat)
+
+
+def test_standby_follows_leader(mocker):
+    market.add_crypto('Favicoin', 200, 100)
+    market.get_crypto()
+    leader_lease = Lease('rates', holder='leader')
+    standby = updates.RateUpdater(Lease('rates', holder='standby'))
+    subscriber = feed.subscribe(feed.last_id)
+    assert leader_lease.keep(), 'Leader has no lease'
+
+    # Rates committed by the leader process aren't published in this one
+    with mock.patch.object(rates, 'publish'):
+        updates.tick()
+    with create_session() as session:
+        purchase_cost = session.query(Crypto.purchase_cost).scalar()
+    tick = mocker.patch('app.market.updates.tick')
+    mocker.patch.object(standby.stopped, 'wait')
+    standby.step()
+    updates.follow()
+
+    assert not tick.called, 'Standby updater updated rates'
+    text = subscriber.queue.get_nowait().text
+    tick_data = json.loads(text.split('data: ')[1])
+    assert tick_data['rates'][0]['purchase_cost'] == purchase_cost, 'Wrong event'
+    rate = rates.fresh('Favicoin')
+    assert rate is not None and rate.purchase_cost == purchase_cost, 'Stale cache'
+
+
+def test_run_updates_with_lease():
+    lease = run_updates().lease
+    assert lease is not None
+    try:
+        for _ in range(50):
+            if lease.held:
+                break
+            time.sleep(0.01)
+        assert 'market_lease_held{lease="rates"} 1' in metrics.render()
+        assert not acquire('rates', 'other', TTL), 'Lease was not taken'
+    finally:
+        updates.stop_updates(timeout=5)
+
+    assert acquire('rates', 'other', TTL), 'Lease was not released on stop'
+
+
+def test_run_updater_command(app, mocker):
+    updater = updates.RateUpdater(Lease('rates'))
+    mocker.patch('app.market.updates.run_updates', return_value=updater)
+    handler = mocker.patch('app.market.updates.signal.signal')
+    stop = mocker.patch('app.market.updates.stop_updates')
+
+    result = app.test_cli_runner().invoke(args=['run-updater'])
+
+    assert result.exit_code == 0, result.output
+    handler.call_args.args[1]()
+    assert updater.stopped.is_set(), 'SIGTERM does not stop updater'
+    assert stop.called, 'Updater was not stopped'
@@ -0,0 +1,132 @@
+import json
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+from werkzeug.serving import make_server
+
+from app.market import loadtest, market
+from app.market.database import create_session
+from app.market.loadclient import Samples, app_sender, error_kind, http_sender
+from app.market.models import Crypto
+
+
+@pytest.mark.parametrize(
+    ('text', 'mix'),
+    [
+        ('purchase=5,sale=3', {'purchase': 5, 'sale': 3}),
+        ('history=1', {'history': 1}),
+        ('purchase=0', None),
+        ('purchase=x', None),
+        ('transfer=1', None),
+    ],
+)
+def test_parse_mix(text, mix):
+    if mix is None:
+        with pytest.raises(ValueError):
+            loadtest.parse_mix(text)
+    else:
+        assert loadtest.parse_mix(text) == mix, 'Wrong mix'
+
+
+@pytest.mark.parametrize(
+    ('status', 'body', 'kind'),
+    [
+        (201, None, None),
+        (400, {'message': 'Crypto exchange rate has been updated'}, 'stale_rate'),
+        (400, {'message': 'Not enough money to purchase'}, 'insufficient_funds'),
+        (400, {'message': 'Not enough crypto to sale'}, 'insufficient_crypto'),
+        (
+            500,
+            {'message': '(sqlite3.OperationalError) database is locked'},
+            'db_locked',
+        ),
+        (422, None, 'http_422'),
+    ],
+)
+def test_error_kind(status, body, kind):
+    assert error_kind(status, body) == kind, 'Wrong error kind'
+
+
+def test_report():
+    samples: list[Samples] = [
+        {'purchase': [(0.001 * i, None) for i in range(1, 101)]},
+        {'purchase': [(0.5, 'stale_rate')], 'sale': [(0.002, None)]},
+    ]
+
+    result = loadtest.report(samples, 2.0)
+
+    purchase = result['endpoints']['purchase']
+    assert (result['requests'], result['trades_per_second']) == (102, 50.5)
+    assert (purchase['ok'], purchase['errors']) == (100, {'stale_rate': 1})
+    assert purchase['latency_ms'] == pytest.approx(
+        {'p50': 51, 'p90': 91, 'p99': 100, 'max': 500}
+    ), 'Wrong percentiles'
+
+
+def test_run_load(app):
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+
+    result = loadtest.run_load(lambda: app_sender(app), 4, 0.5, seed=1)
+
+    endpoints = result['endpoints']
+    assert set(endpoints) <= {*loadtest.DEFAULT_MIX, 'rates'}, 'Unknown endpoint'
+    assert endpoints['register']['ok'] >= 4, 'Virtual users were not registered'
+    assert endpoints['purchase']['ok'] > 0, 'No trades'
+    assert 'stale_rate' not in endpoints['purchase']['errors'], 'Stale rates'
+    assert len(market.get_users()) == endpoints['register']['ok'], 'Wrong users'
+
+
+def test_run_load_stale_rates(app):
+    market.add_crypto('Favicoin', 200, 100)
+    with create_session() as session:
+        session.execute(update(Crypto).values(last_updated=datetime(2022, 1, 1)))
+
+    result = loadtest.run_load(lambda: app_sender(app), 2, 0.3, {'purchase': 1})
+
+    purchase = result['endpoints']['purchase']
+    assert purchase['errors'] == {'stale_rate': purchase['requests']}, 'Not stale'
+    # Old rates are re-read before every trade
+    assert result['endpoints']['rates']['requests'] == purchase['requests']
+
+
+def test_run_load_over_http(app):
+    market.add_crypto('Favicoin', 200, 100)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}'
+        result = loadtest.run_load(lambda: http_sender(url), 2, 0.3, seed=1)
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert result['endpoints']['register']['ok'] >= 2, 'No requests over HTTP'
+
+
+def test_run_load_connection_error():
+    result = loadtest.run_load(lambda: http_sender('http://127.0.0.1:1'), 1, 0.1)
+
+    errors = result['endpoints']['register']['errors']
+    assert errors == {'connection': result['endpoints']['register']['requests']}
+
+
+@pytest.mark.parametrize(
+    ('args', 'exit_code'),
+    [
+        (['--users', '2', '--duration', '0.2', '--json'], 0),
+        (['--users', '2', '--duration', '0.2'], 0),
+        (['--mix', 'transfer=1'], 2),
+    ],
+)
+def test_loadtest_command(app, args, exit_code):
+    market.add_crypto('Favicoin', 200, 100)
+
+    result = app.test_cli_runner().invoke(args=['loadtest', *args])
+
+    assert result.exit_code == exit_code, result.output
+    if '--json' in args:
+        assert json.loads(result.output)['requests'] > 0, 'Wrong report'
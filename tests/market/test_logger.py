@@ -0,0 +1,111 @@
+import io
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+from app import create_app
+from app.market import logger, metrics
+
+
+@pytest.fixture(name='stream')
+def fixture_stream():
+    '''
+    Market logger writing to returned stream, restored after test
+    '''
+    output = io.StringIO()
+    yield output
+    logger.init()
+
+
+def flushed(output):
+    # Stopping listener writes queued records
+    logger.shutdown()
+    return output.getvalue()
+
+
+def test_init_replaces_handler():
+    create_app()
+    create_app()
+
+    handlers = logger.get_logger().handlers
+    assert len(handlers) == 1, 'Handler was added again'
+    assert isinstance(handlers[0], logger.DroppingQueueHandler)
+
+
+def test_text_format(stream):
+    logger.init('text', stream)
+
+    logger.get_logger().info('Updated %d rates', 3)
+
+    line = flushed(stream)
+    assert line.startswith('INFO '), 'Wrong level'
+    assert ' test_text_format(' in line, 'No function'
+    assert line.endswith(') Updated 3 rates\n'), 'Wrong message'
+
+
+def test_json_format(stream):
+    logger.init('json', stream)
+
+    logger.get_logger().warning('Slow %s', 'query', extra={'slow_query': {'a': 1}})
+    try:
+        raise ValueError('error')
+    except ValueError:
+        logger.get_logger().exception('Failed')
+
+    first, second = map(json.loads, flushed(stream).splitlines())
+    assert first['message'] == 'Slow query' and first['level'] == 'WARNING'
+    assert first['slow_query'] == {'a': 1}, 'Extra field is missing'
+    assert first['function'] == 'test_json_format'
+    assert 'ValueError: error' in second['exception'], 'Exception is missing'
+
+
+def test_arguments_are_merged_on_call(stream):
+    logger.init('text', stream)
+    values = [1]
+
+    logger.get_logger().info('Values %s', values)
+    values.append(2)
+
+    assert flushed(stream).endswith('Values [1]\n'), 'Changed arguments were logged'
+
+
+@pytest.mark.usefixtures('stream')
+def test_shutdown_with_full_queue():
+    writing = threading.Event()
+    written = threading.Event()
+
+    class SlowStream(io.StringIO):
+        def write(self, text):
+            writing.set()
+            written.wait(5)
+            return super().write(text)
+
+    output = SlowStream()
+    logger.init('text', output, queue_size=2)
+    logger.get_logger().warning('Record 0')
+    writing.wait(5)
+    # The first record is being written, the others fill the queue
+    logger.get_logger().warning('Record 1')
+    logger.get_logger().warning('Record 2')
+    threading.Timer(0.2, written.set).start()
+
+    assert flushed(output).count('Record') == 3, 'Queued records were not written'
+
+
+@pytest.mark.parametrize(
+    ('drop', 'messages'),
+    [('newest', ['0', '1']), ('oldest', ['2', '3'])],
+)
+def test_full_queue(drop, messages):
+    metrics.reset()
+    records: queue.Queue[logging.LogRecord] = queue.Queue(2)
+    handler = logger.DroppingQueueHandler(records, drop)
+
+    for i in range(4):
+        handler.handle(logging.makeLogRecord({'msg': str(i)}))
+
+    assert [records.get_nowait().msg for _ in range(2)] == messages
+    assert list(logger.DROPPED.samples()) == [('', (), (), 2)], 'Drops not counted'
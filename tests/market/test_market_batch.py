@@ -0,0 +1,142 @@
+import pytest
+
+from app.market import batch, market
+from app.market.exceptions import BatchError
+from tests.market.conftest import formatted_now
+
+
+def operation(operation_type, amount, crypto_name='Favicoin'):
+    return {
+        'crypto_name': crypto_name,
+        'operation_type': operation_type,
+        'amount': amount,
+        'time_str': formatted_now(),
+    }
+
+
+@pytest.fixture(autouse=True)
+def fill_db():
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+
+
+@pytest.mark.parametrize('atomic', [True, False])
+def test_add_operations_success(atomic):
+    results = batch.add_operations(
+        'Annet', [operation('purchase', 10), operation('sale', 4)], atomic
+    )
+
+    assert results == [{'status': 'ok'}] * 2, 'Wrong results'
+    assert len(market.get_operations('Annet')) == 2, 'Wrong number of operations'
+    assert (
+        market.get_balance('Annet')['balance'] == 1000 * 100 - 200 * 10 + 100 * 4
+    ), 'Balance changed wrong'
+
+
+def test_add_operations_atomic_fail():
+    with pytest.raises(BatchError) as error:
+        batch.add_operations(
+            'Annet',
+            [operation('purchase', 10), operation('sale', 20), operation('buy', 1)],
+        )
+
+    statuses = [result['status'] for result in error.value.results]
+    assert statuses == ['rolled_back', 'error', 'error'], 'Wrong results'
+    assert not market.get_operations('Annet'), 'Batch was not rolled back'
+    assert market.get_balance('Annet')['balance'] == 1000 * 100, 'Balance changed'
+
+
+def test_add_operations_best_effort():
+    results = batch.add_operations(
+        'Annet',
+        [
+            operation('purchase', 10),
+            operation('sale', 20),
+            operation('purchase', 10, 'Geckcoin'),
+            operation('sale', 10),
+        ],
+        atomic=False,
+    )
+
+    statuses = [result['status'] for result in results]
+    assert statuses == ['ok', 'error', 'error', 'ok'], 'Wrong results'
+    assert results[1]['error'] == 'Not enough crypto to sale', 'Wrong error'
+    assert len(market.get_operations('Annet')) == 2, 'Wrong number of operations'
+    assert market.get_portfolio('Annet')[0]['amount'] == 0, 'Wrong portfolio'
+
+
+def test_add_operations_cost_overflow():
+    results = batch.add_operations(
+        'Annet',
+        [operation('purchase', 2**62), operation('sale', 2**62)],
+        atomic=False,
+    )
+
+    assert results == [{'status': 'error', 'error': 'Invalid request'}] * 2
+    assert market.get_balance('Annet')['balance'] == 1000 * 100, 'Balance changed'
+
+
+def test_users_operations_batch_post(client):
+    response = client.post(
+        '/market/users/Annet/operations/batch',
+        json={'operations': [operation('purchase', 10)] * 2},
+    )
+
+    assert response.status_code == 201, 'Wrong status code'
+    assert response.get_json() == [{'status': 'ok'}] * 2, 'Wrong results'
+
+
+@pytest.mark.parametrize(
+    ('atomic', 'status_code', 'count'),
+    [(True, 400, 0), (False, 207, 1)],
+)
+def test_users_operations_batch_post_fail(client, atomic, status_code, count):
+    response = client.post(
+        '/market/users/Annet/operations/batch',
+        json={
+            'operations': [operation('purchase', 10), operation('purchase', 10**6)],
+            'atomic': atomic,
+        },
+    )
+
+    assert response.status_code == status_code, 'Wrong status code'
+    assert response.get_json()[1]['status'] == 'error', 'Wrong results'
+    assert len(market.get_operations('Annet')) == count, 'Wrong number of operations'
+
+
+@pytest.mark.parametrize(
+    'json',
+    [
+        {},
+        {'atomic': True},
+        {'operations': []},
+        {'operations': {}},
+        {'operations': [{'crypto_name': 'Favicoin'}]},
+    ],
+)
+def test_users_operations_batch_post_invalid(client, json):
+    response = client.post('/market/users/Annet/operations/batch', json=json)
+
+    assert response.status_code == 422, 'Wrong status code'
+
+
+def test_invalid_request_errors(client):
+    response = client.post(
+        '/market/users/Annet/operations/batch',
+        json={'operations': [{'crypto_name': '', 'amount': 1.5}], 'atomic': 1},
+    )
+
+    assert response.status_code == 422, 'Wrong status code'
+    assert response.get_json() == {
+        'message': 'Invalid request',
+        'errors': [
+            {
+                'field': 'operations[0].crypto_name',
+                'message': 'must be at least 1 long',
+            },
+            {'field': 'operations[0].operation_type', 'message': 'is required'},
+            {'field': 'operations[0].amount', 'message': 'must be an integer'},
+            {'field': 'operations[0].time_str', 'message': 'is required'},
+            {'field': 'atomic', 'message': 'must be a boolean'},
+        ],
+    }, 'Wrong errors'
@@ -0,0 +1,143 @@
+import json
+from typing import Union
+
+import pytest
+
+from app.market import bulk, market
+from app.market.database import create_session
+from app.market.models import User
+
+
+def test_add_users_success():
+    report = bulk.add_users(({'login': f'user{i}'} for i in range(10)), chunk_size=3)
+
+    assert report == {'created': 10, 'conflicts': [], 'invalid': []}, 'Wrong report'
+    with create_session() as session:
+        users = session.query(User).all()
+        assert len(users) == 10, 'Wrong number of users'
+        assert all(user.balance == 1000 * 100 for user in users), 'Wrong balance'
+
+
+def test_add_users_conflicts():
+    market.add_user('Annet')
+
+    report = bulk.add_users(
+        [
+            {'login': 'Annet'},
+            {'login': 'Bella'},
+            {'login': ''},
+            {'login': 'Bella'},
+            {'name': 'Clare'},
+            None,
+            {'login': 'Diana'},
+        ],
+        chunk_size=4,
+    )
+
+    assert report['created'] == 2, 'Wrong number of created users'
+    assert report['conflicts'] == [
+        {'row': 3, 'login': 'Bella'},
+        {'row': 0, 'login': 'Annet'},
+    ], 'Wrong conflicts'
+    assert report['invalid'] == [
+        {
+            'row': 2,
+            'errors': [{'field': 'login', 'message': 'must be at least 1 long'}],
+        },
+        {'row': 4, 'errors': [{'field': 'login', 'message': 'is required'}]},
+        {'row': 5, 'errors': [{'field': '', 'message': 'must be an object'}]},
+    ], 'Wrong invalid rows'
+    assert len(market.get_users()) == 3, 'Wrong number of users'
+
+
+@pytest.mark.parametrize(
+    ('row', 'created'),
+    [
+        ({'crypto_name': 'Geckcoin', 'purchase_cost': 400, 'sale_cost': 200}, 1),
+        ({'crypto_name': 'Favicoin', 'purchase_cost': 400, 'sale_cost': 200}, 0),
+        ({'crypto_name': 'Geckcoin', 'purchase_cost': 0, 'sale_cost': 200}, 0),
+        ({'crypto_name': 'Geckcoin', 'purchase_cost': 400, 'sale_cost': True}, 0),
+        ({'crypto_name': 'Geckcoin', 'purchase_cost': '400', 'sale_cost': 200}, 0),
+        ({'crypto_name': 'G' * 51, 'purchase_cost': 400, 'sale_cost': 200}, 0),
+        ({'crypto_name': 'Geckcoin', 'purchase_cost': 2**63, 'sale_cost': 200}, 0),
+    ],
+)
+def test_add_crypto(row, created):
+    market.add_crypto('Favicoin', 200, 100)
+    assert len(market.get_crypto()) == 1
+
+    report = bulk.add_crypto([row])
+
+    assert report['created'] == created, 'Wrong number of created crypto'
+    assert len(market.get_crypto()) == 1 + created, 'Cache was not invalidated'
+
+
+def test_parse_ndjson():
+    lines: list[Union[str, bytes]] = [
+        '{"login": "Annet"}\n',
+        '\n',
+        '{"login": \n',
+        b'{"login": "Bella"}',
+    ]
+
+    assert list(bulk.parse_ndjson(lines)) == [
+        {'login': 'Annet'},
+        None,
+        {'login': 'Bella'},
+    ], 'Wrong parsed rows'
+
+
+def test_bulk_add_commands(app, tmp_path):
+    users = tmp_path / 'users.ndjson'
+    users.write_text('{"login": "Annet"}\n{"login": "Annet"}\n')
+    crypto = tmp_path / 'crypto.ndjson'
+    crypto.write_text('{"crypto_name": "Favicoin", "purchase_cost": 2, "sale_cost": 1}')
+
+    runner = app.test_cli_runner()
+    users_result = runner.invoke(args=['bulk-add-users', str(users)])
+    crypto_result = runner.invoke(args=['bulk-add-crypto', str(crypto)])
+
+    assert json.loads(users_result.output)['created'] == 1, 'Wrong users report'
+    assert json.loads(crypto_result.output)['created'] == 1, 'Wrong crypto report'
+
+
+def test_users_bulk_post(client):
+    market.add_user('Annet')
+
+    response = client.post(
+        '/market/users/bulk', json=[{'login': 'Annet'}, {'login': 'Bella'}]
+    )
+
+    assert response.status_code == 201, 'Wrong status code'
+    assert response.get_json()['conflicts'] == [
+        {'row': 0, 'login': 'Annet'}
+    ], 'Wrong conflicts'
+
+
+def test_users_bulk_post_ndjson(client):
+    response = client.post(
+        '/market/users/bulk',
+        data='{"login": "Annet"}\n{"login": "Bella"}\n',
+        content_type='application/x-ndjson',
+    )
+
+    assert response.status_code == 201, 'Wrong status code'
+    assert len(market.get_users()) == 2, "Users weren't added"
+
+
+def test_crypto_bulk_post(client):
+    response = client.post(
+        '/market/crypto/bulk',
+        json=[{'crypto_name': 'Favicoin', 'purchase_cost': 200, 'sale_cost': 100}],
+    )
+
+    assert response.status_code == 201, 'Wrong status code'
+    assert len(market.get_crypto()) == 1, "Crypto wasn't added"
+
+
+@pytest.mark.parametrize('url', ['/market/users/bulk', '/market/crypto/bulk'])
+@pytest.mark.parametrize('body', [[], {'login': 'Annet'}])
+def test_bulk_post_invalid(client, url, body):
+    response = client.post(url, json=body)
+
+    assert response.status_code == 422, 'Wrong status code'
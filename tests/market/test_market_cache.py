@@ -0,0 +1,108 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.market import market, trading
+from app.market.cache import Rate, RateTable, rates, user_ids
+from app.market.database import create_session
+from app.market.models import Crypto, User
+from tests.market.conftest import captured_statements, formatted_now
+
+
+def test_add_operation_uses_cache():
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    with captured_statements() as statements:
+        market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    selects = [s for s, _ in statements if s.startswith('SELECT')]
+    assert not any('FROM crypto' in s for s in selects), 'Crypto was read from DB'
+    assert not any('WHERE user.login' in s for s in selects), 'User id was read from DB'
+
+
+def test_update_crypto_publishes_rate():
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_user('Annet')
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    market.update_crypto('Favicoin', 250, 150)
+
+    rate = rates.get('Favicoin')
+    assert rate is not None, 'Rate is missing in cache'
+    assert (rate.purchase_cost, rate.sale_cost) == (250, 150), 'Rate is stale'
+
+
+def test_get_crypto_uses_cache():
+    market.add_crypto('Favicoin', 200, 100)
+    first = market.get_crypto()
+
+    with captured_statements() as statements:
+        second = market.get_crypto()
+
+    assert first == second, 'Cached crypto differs from DB'
+    assert not statements, 'Crypto was read from DB'
+
+
+def test_add_crypto_invalidates_cache():
+    market.add_crypto('Favicoin', 200, 100)
+    market.get_crypto()
+
+    market.add_crypto('Geckcoin', 400, 200)
+
+    assert len(market.get_crypto()) == 2, 'New crypto is missing'
+
+
+def test_add_user_publishes_id():
+    market.add_user('Annet')
+
+    with create_session() as session:
+        user_id = session.query(User.id).where(User.login == 'Annet').one().id
+
+    assert user_ids.get('Annet') == user_id, 'Wrong cached user id'
+
+
+def test_outdated_rate_is_reloaded():
+    with create_session() as session:
+        session.add(User('Annet'))
+        session.add(Crypto('Favicoin', 200, 100))
+
+    with create_session() as session:
+        rate = trading.get_rate(session, 'Favicoin')
+        rates.publish([rate._replace(last_updated=datetime(2000, 1, 1))])
+
+        assert trading.get_rate(session, 'Favicoin') == rate, 'Rate was not reloaded'
+
+
+def test_rate_of_other_process_is_reloaded_after_max_age(monkeypatch):
+    market.add_crypto('Favicoin', 200, 100)
+    market.get_crypto()
+    with create_session() as session:
+        session.execute(update(Crypto).values(purchase_cost=300))
+
+    with create_session() as session:
+        assert trading.get_rate(session, 'Favicoin').purchase_cost == 200
+
+        monkeypatch.setattr(rates, '_max_age', 0.0)
+
+        rate = trading.get_rate(session, 'Favicoin')
+        assert rate.purchase_cost == 300, 'Rate was not reloaded'
+
+
+def test_rate_table_store_after_publish():
+    table = RateTable()
+    old = Rate(1, 'Favicoin', 200, 100, datetime.utcnow())
+
+    version = table.version
+    table.publish([old._replace(purchase_cost=250)], complete=True)
+    table.store([old], version)
+
+    assert table.get('Favicoin') == old._replace(
+        purchase_cost=250
+    ), 'Outdated load overwrote published rate'
+    assert table.all() == [old._replace(purchase_cost=250)], 'Wrong rates'
+
+    table.invalidate('Favicoin')
+    assert table.get('Favicoin') is None, 'Rate was not invalidated'
+    assert table.all() is None, 'Table is complete after invalidation'
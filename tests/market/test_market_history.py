@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from app.market import history, market
+from app.market.exceptions import MarketError
+from tests.market.conftest import formatted_now
+
+
+@pytest.fixture(autouse=True)
+def fill_db():
+    market.add_user('Annet')
+    market.add_user('Bella')
+    market.add_crypto('Favicoin', 200, 100)
+    for _ in range(5):
+        market.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+    market.add_operation('Bella', 'Favicoin', 'purchase', 1, formatted_now())
+
+
+def test_get_operations_page():
+    pages = []
+    cursor = None
+    while True:
+        page, cursor = history.get_operations_page('Annet', cursor, 2)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [2, 2, 1], 'Wrong pages'
+    assert [o['id'] for page in pages for o in page] == [
+        o['id'] for o in market.get_operations('Annet')
+    ], 'Pages differ from history'
+
+
+def test_get_operations_page_exact():
+    page, cursor = history.get_operations_page('Annet', None, 5)
+
+    assert len(page) == 5, 'Wrong page'
+    assert cursor is None, 'Cursor after the last page'
+
+
+@pytest.mark.parametrize(
+    'cursor',
+    [
+        '',
+        'abc',
+        'bm90LWN1cnNvcg==',
+        history.encode_cursor('2020-01-01 00:00:00', 10**23),
+        history.encode_cursor('2020-01-01 00:00:00', -1),
+    ],
+)
+def test_get_operations_page_wrong_cursor(cursor):
+    with pytest.raises(MarketError):
+        history.get_operations_page('Annet', cursor, 2)
+
+
+def test_iter_operations():
+    operations = list(history.iter_operations('Annet', batch_size=2))
+
+    assert operations == market.get_operations('Annet'), 'Stream differs from history'
+
+
+def test_users_operations_get_pages(client):
+    first = client.get('/market/users/Annet/operations?limit=2')
+    second = client.get(
+        f"/market/users/Annet/operations?after={first.headers['X-Next-Cursor']}"
+    )
+
+    assert len(first.get_json()) == 2, 'Wrong first page'
+    assert len(second.get_json()) == 3, 'Wrong second page'
+    assert 'X-Next-Cursor' not in second.headers, 'Cursor after the last page'
+
+
+@pytest.mark.parametrize(
+    ('query', 'status_code'),
+    [('limit=0', 422), ('limit=abc', 422), ('after=abc', 400), ('stream=xml', 422)],
+)
+def test_users_operations_get_invalid(client, query, status_code):
+    response = client.get(f'/market/users/Annet/operations?{query}')
+
+    assert response.status_code == status_code, 'Wrong status code'
+
+
+@pytest.mark.parametrize('stream', ['json', 'ndjson'])
+def test_users_operations_get_stream(client, stream):
+    expected = client.get('/market/users/Annet/operations').get_json()
+    response = client.get(f'/market/users/Annet/operations?stream={stream}')
+
+    if stream == 'json':
+        data = response.get_json()
+    else:
+        data = [json.loads(line) for line in response.data.splitlines()]
+    assert data == expected, 'Stream differs from history'
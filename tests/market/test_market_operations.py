@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from app.market import market
@@ -5,7 +7,11 @@ from app.market.config import CRYPTO_UPDATE_DELTA
 from app.market.database import create_session
 from app.market.exceptions import DatabaseError, MarketError
 from app.market.models import Crypto, Operation, User
-from tests.market.conftest import formatted_now, mock_db_exception
+from tests.market.conftest import (
+    captured_statements,
+    formatted_now,
+    mock_db_exception,
+)
 
 
 # ----------/ get_operations() /----------
@@ -236,3 +242,55 @@ def test_add_operation_time_fail(login, crypto_name, amount, time_delta):
         market.add_operation(
             login, crypto_name, 'sale', amount, formatted_now(time_delta)
         )
+
+
+@pytest.mark.parametrize('time_str', ['yesterday', '2022-13-01T12:00:10'])
+def test_add_operation_wrong_time(time_str):
+    with create_session() as session:
+        session.add(User('Annet'))
+        session.add(Crypto('Favicoin', 200, 100))
+
+    with pytest.raises(MarketError, match='Wrong operation time'):
+        market.add_operation('Annet', 'Favicoin', 'purchase', 10, time_str)
+
+
+@pytest.mark.parametrize(
+    ('operation_type', 'amount'),
+    [
+        ('purchase', 10),
+        ('sale', 5),
+    ],
+)
+def test_add_operation_statements(operation_type, amount):
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    with captured_statements() as statements:
+        market.add_operation(
+            'Annet', 'Favicoin', operation_type, amount, formatted_now()
+        )
+
+    writes = [s for s, _ in statements if s.startswith(('INSERT', 'UPDATE'))]
+    assert len(writes) == 3, 'Wrong number of writes'
+    assert not any(s.startswith('SELECT') for s, _ in statements), 'Trade reads DB'
+
+
+def test_add_operation_concurrent():
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+
+    # Balance is enough only for 50 purchases of 10
+    def purchase():
+        try:
+            market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+        except MarketError:
+            return False
+        return True
+
+    with ThreadPoolExecutor(8) as pool:
+        purchased = sum(pool.map(lambda _: purchase(), range(60)))
+
+    assert purchased == 50, 'Wrong number of purchases'
+    assert market.get_balance('Annet') == {'balance': 0}, 'Wrong balance'
+    assert market.get_portfolio('Annet')[0]['amount'] == 500, 'Wrong portfolio'
@@ -0,0 +1,76 @@
+import pytest
+
+from app.market import market, valuation
+from app.market.exceptions import DatabaseError
+from tests.market.conftest import captured_statements, formatted_now
+
+
+def test_get_valuation():
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    market.add_operation('Annet', 'Geckcoin', 'purchase', 10, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'purchase', 20, formatted_now())
+
+    with captured_statements() as statements:
+        result = valuation.get_valuation('Annet')
+
+    selects = [s for s, _ in statements if s.startswith('SELECT')]
+    assert len(selects) == 1, 'Valuation takes more than one query'
+    assert result == {
+        'balance': 100000 - 4000 - 4000,
+        'crypto': [
+            {
+                'crypto_name': 'Favicoin',
+                'amount': 20,
+                'sale_value': 2000,
+                'purchase_value': 4000,
+            },
+            {
+                'crypto_name': 'Geckcoin',
+                'amount': 10,
+                'sale_value': 2000,
+                'purchase_value': 4000,
+            },
+        ],
+        'sale_value': 4000,
+        'purchase_value': 8000,
+    }, 'Wrong valuation'
+
+
+def test_get_valuation_empty_portfolio():
+    market.add_user('Annet')
+
+    assert valuation.get_valuation('Annet') == {
+        'balance': 100000,
+        'crypto': [],
+        'sale_value': 0,
+        'purchase_value': 0,
+    }, 'Wrong valuation'
+
+
+def test_get_valuation_unknown_user():
+    with pytest.raises(DatabaseError):
+        valuation.get_valuation('Annet')
+
+
+def test_users_valuation_get(client):
+    market.add_user('Annet')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    response = client.get('/market/users/Annet/valuation')
+    data = response.get_json()
+
+    assert response.status_code == 200, 'Wrong status code'
+    assert data['sale_value'] == 1000, 'Wrong value'
+    assert data['balance'] == 98000, 'Wrong balance'
+
+
+def test_users_valuation_get_unknown(client):
+    response = client.get('/market/users/Annet/valuation')
+
+    assert response.status_code == 500, 'Wrong status code'
+    assert response.get_json() == {
+        'message': 'No row was found when one was required'
+    }, 'Wrong message'
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.market import amarket, database, market, metrics, updates
+from app.market.config import MARKET_DB_URL_TEST
+from app.market.exceptions import DatabaseError, MarketError
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+@pytest.fixture
+def registered():
+    '''
+    Metrics created by test are removed from registry after it
+    '''
+    count = len(metrics.registry)
+    yield
+    del metrics.registry[count:]
+
+
+def sample(text, line_start):
+    '''
+    Value of the first sample line starting with 'line_start'
+    '''
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+@pytest.mark.usefixtures('registered')
+def test_render():
+    counter = metrics.Counter('test_total', 'Test "counter"', ('kind',))
+    histogram = metrics.Histogram('test_seconds', 'Test histogram', (), (0.1, 1))
+    metrics.Gauge('test_gauge', 'Test gauge', ('a',), lambda: [(('x',), 1.5)])
+
+    counter.inc('a"b\n')
+    counter.inc('a"b\n', amount=2)
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    text = metrics.render()
+    assert text.endswith(
+        '# HELP test_total Test "counter"\n'
+        '# TYPE test_total counter\n'
+        'test_total{kind="a\\"b\\n"} 3\n'
+        '# HELP test_seconds Test histogram\n'
+        '# TYPE test_seconds histogram\n'
+        'test_seconds_bucket{le="0.1"} 2\n'
+        'test_seconds_bucket{le="1"} 3\n'
+        'test_seconds_bucket{le="+Inf"} 4\n'
+        'test_seconds_sum 3.65\n'
+        'test_seconds_count 4\n'
+        '# HELP test_gauge Test gauge\n'
+        '# TYPE test_gauge gauge\n'
+        'test_gauge{a="x"} 1.5\n'
+    ), 'Wrong text format'
+
+
+@pytest.mark.parametrize('threads', [8, metrics.MAX_SHARDS * 2])
+@pytest.mark.usefixtures('registered')
+def test_counter_threads(threads):
+    counter = metrics.Counter('test_total', 'Test counter')
+
+    def work():
+        for _ in range(1000):
+            counter.inc()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    counter.inc()
+
+    assert list(counter.samples()) == [('', (), (), threads * 1000 + 1)]
+
+
+def test_shards_of_finished_threads():
+    shards = metrics.Shards(2)
+
+    def work():
+        values = shards.values(('a',))
+        values[0] += 1
+        values[1] += 2
+
+    # More threads than shards, every new one merges finished ones
+    for _ in range(metrics.MAX_SHARDS * 3):
+        worker = threading.Thread(target=work)
+        worker.start()
+        worker.join()
+    work()
+
+    count = metrics.MAX_SHARDS * 3 + 1
+    assert shards.collect() == {('a',): [count, count * 2]}, 'Shards were lost'
+    assert shards.collect() == {('a',): [count, count * 2]}, 'Shards were merged twice'
+
+
+def test_request_metrics(client):
+    market.add_user('Annet')
+    client.get('/market/users/Annet/balance')
+    client.get('/market/users/Annet/balance')
+    client.get('/market/unknown')
+
+    text = client.get('/market/metrics').get_data(as_text=True)
+
+    route = 'route="/market/users/<string:login>/balance"'
+    assert (
+        sample(
+            text,
+            'market_http_request_duration_seconds_count{'
+            f'{route},method="GET",status="200"}}',
+        )
+        == 2
+    ), 'Requests were not counted'
+    assert (
+        sample(text, f'market_http_request_sql_statements_sum{{{route}}}') >= 4
+    ), 'Statements of request were not counted'
+    assert sample(text, f'market_http_request_sql_duration_seconds_sum{{{route}}}')
+    assert sample(
+        text, 'market_http_request_duration_seconds_count{route="unmatched"'
+    ), 'Unmatched request was not counted'
+
+
+def test_db_metrics(client):
+    market.add_user('Annet')
+    with pytest.raises(DatabaseError):
+        market.add_user('Annet')
+
+    text = client.get('/market/metrics').get_data(as_text=True)
+
+    assert sample(text, 'market_db_sessions_total{kind="write",event="open"}') == 2
+    assert sample(text, 'market_db_sessions_total{kind="write",event="commit"}') == 1
+    assert sample(text, 'market_db_sessions_total{kind="write",event="rollback"}') == 1
+    # Failed statements aren't counted
+    assert sample(text, 'market_sql_statements_total{statement="INSERT"}') == 1
+    assert sample(text, 'market_sql_duration_seconds_total{statement="INSERT"}') > 0
+    assert (
+        sample(text, 'market_db_pool_connections{engine="write",state="size"}') == 5
+    ), 'No pool stats'
+
+
+def test_rollback_on_any_error(client):
+    with pytest.raises(MarketError):
+        with database.create_session():
+            raise MarketError('Not enough money')
+
+    text = client.get('/market/metrics').get_data(as_text=True)
+
+    assert sample(text, 'market_db_sessions_total{kind="write",event="commit"}') is None
+    assert sample(text, 'market_db_sessions_total{kind="write",event="rollback"}') == 1
+
+
+def test_async_db_metrics(client):
+    market.add_user('Annet')
+    metrics.reset()
+
+    async def scenario():
+        await amarket.init_db(MARKET_DB_URL_TEST)
+        try:
+            users = await amarket.get_users()
+            with pytest.raises(MarketError):
+                async with amarket.session_scope(readonly=False):
+                    raise MarketError('Not enough money')
+        finally:
+            await amarket.dispose_db()
+        return users
+
+    assert len(asyncio.run(scenario())) == 1
+
+    text = client.get('/market/metrics').get_data(as_text=True)
+
+    assert sample(text, 'market_db_sessions_total{kind="read",event="open"}') == 1
+    assert sample(text, 'market_db_sessions_total{kind="read",event="commit"}') == 1
+    assert sample(text, 'market_db_sessions_total{kind="write",event="rollback"}') == 1
+
+
+def test_pool_stats_of_one_engine(mocker):
+    mocker.patch.dict(database.engines, {'read': database.engines['write']})
+
+    engines = {labels[0] for labels, _ in database.pool_stats()}
+
+    assert engines == {'write'}, 'Read engine is the write one'
+
+
+def test_tick_metrics(client, mocker):
+    market.add_crypto('Favicoin', 200, 100)
+    updates.tick()
+    updater = updates.RateUpdater()
+    mocker.patch.object(updater, 'step', side_effect=DatabaseError)
+    mocker.patch.object(
+        updater.stopped, 'wait', side_effect=lambda _: updater.stopped.set()
+    )
+    updater.run()
+
+    text = client.get('/market/metrics').get_data(as_text=True)
+
+    assert sample(text, 'market_rate_tick_duration_seconds_count') == 1
+    assert sample(text, 'market_rate_tick_errors_total') == 1
@@ -0,0 +1,40 @@
+import pytest
+from flask import json
+
+from app.market import market
+from app.market.cache import rates
+from app.market.database import create_session
+from app.market.models import Crypto, Operation, Portfolio, User, serialized
+from tests.market.conftest import formatted_now
+
+
+@pytest.fixture(autouse=True)
+def fill_db():
+    market.add_user('Annet')
+    market.add_user('Bella')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+    market.add_operation('Annet', 'Geckcoin', 'purchase', 5, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'sale', 5, formatted_now())
+    rates.reset()
+
+
+@pytest.mark.parametrize(
+    ('func', 'model', 'where'),
+    [
+        (market.get_users, User, ()),
+        (lambda: market.get_operations('Annet'), Operation, (Operation.user_id == 1,)),
+        (lambda: market.get_portfolio('Annet'), Portfolio, (Portfolio.user_id == 1,)),
+        (market.get_crypto, Crypto, ()),
+    ],
+)
+def test_rows_serialized_as_orm(app, func, model, where):
+    with create_session() as session:
+        query = session.query(model).where(*where)
+        if model is Operation:
+            query = query.order_by(Operation.created, Operation.id)
+        objects = serialized(query.all())
+
+    with app.app_context():
+        assert json.dumps(func()) == json.dumps(objects), 'JSON differs from ORM'
@@ -0,0 +1,60 @@
+import pytest
+
+from app.market.exceptions import MarketError
+from app.market.orderbook import Book, BookOrder
+
+
+@pytest.fixture(name='book')
+def fixture_book():
+    book = Book()
+    for order_id, side, price in [
+        (1, 'sell', 150),
+        (2, 'sell', 140),
+        (3, 'sell', 150),
+        (4, 'buy', 100),
+        (5, 'buy', 120),
+    ]:
+        book.add(BookOrder(order_id, 0, side, price, 10))
+    return book
+
+
+@pytest.mark.parametrize(
+    ('side', 'price', 'amount', 'taken'),
+    [
+        ('buy', 150, 25, [(2, 10), (1, 10), (3, 5)]),
+        ('buy', 145, 25, [(2, 10)]),
+        ('buy', 130, 5, []),
+        ('sell', 100, 15, [(5, 10), (4, 5)]),
+    ],
+)
+def test_take_by_price_and_time(book, side, price, amount, taken):
+    assert [(o.id, a) for o, a in book.take(side, price, amount, 1)] == taken
+
+
+def test_settle_and_restore(book):
+    book.settle(book.take('buy', 150, 15, 1))
+
+    assert book.depth('sell') == [(150, 15)], 'Wrong sell side'
+    assert book.best('sell').id == 1, 'Partially filled order lost priority'
+
+    book.restore(book.take('buy', 150, 15, 1))
+    assert book.depth('sell') == [(150, 15)], 'Taken orders were not restored'
+    assert len(book) == 4
+
+
+def test_removed_order_is_skipped(book):
+    book.remove(5)
+
+    assert book.best('buy').id == 4, 'Removed order is the best'
+    assert book.depth('buy') == [(100, 10)]
+    assert book.remove(5) is None
+
+
+def test_own_order_is_not_taken(book):
+    book.add(BookOrder(6, 1, 'sell', 145, 10))
+
+    with pytest.raises(MarketError):
+        book.take('buy', 150, 25, 1)
+
+    assert book.depth('sell') == [(140, 10), (145, 10), (150, 20)], 'Orders were lost'
+    assert [(o.id, a) for o, a in book.take('buy', 140, 10, 1)] == [(2, 10)]
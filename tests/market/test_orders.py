@@ -0,0 +1,256 @@
+import threading
+
+import pytest
+
+from app.market import market, orders
+from app.market.exceptions import MarketError
+from app.market.orderbook import books
+from tests.market.conftest import formatted_now
+
+BALANCE = 100000
+
+
+@pytest.fixture(autouse=True)
+def users():
+    market.add_user('Annet')
+    market.add_user('Bella')
+    market.add_crypto('Favicoin', 200, 100)
+    # Annet sells crypto bought from the market
+    market.add_operation('Annet', 'Favicoin', 'purchase', 100, formatted_now())
+
+
+def balance(login):
+    return market.get_balance(login)['balance']
+
+
+def amount(login):
+    portfolio = market.get_portfolio(login)
+    return portfolio[0]['amount'] if portfolio else 0
+
+
+def test_partial_fill_at_maker_price():
+    sell = orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 160, 4)
+
+    assert sell['status'] == 'open' and sell['remaining'] == 10
+    assert buy == {
+        'id': buy['id'],
+        'side': 'buy',
+        'price': 160,
+        'amount': 4,
+        'remaining': 0,
+        'status': 'filled',
+        'fills': [{'price': 150, 'amount': 4}],
+    }, 'Wrong order'
+    assert balance('Bella') == BALANCE - 4 * 150, 'Buyer paid more than maker price'
+    assert amount('Bella') == 4, 'Buyer did not get crypto'
+    assert balance('Annet') == BALANCE - 100 * 200 + 4 * 150, 'Seller was not paid'
+    assert amount('Annet') == 90, 'Crypto of sell order is not reserved'
+    assert orders.get_book('Favicoin') == {
+        'buy': [],
+        'sell': [{'price': 150, 'amount': 6}],
+    }, 'Wrong book'
+
+
+def test_price_time_priority():
+    market.add_user('Clare')
+    market.add_operation('Clare', 'Favicoin', 'purchase', 100, formatted_now())
+    early = orders.place_order('Annet', 'Favicoin', 'sell', 150, 5)
+    late = orders.place_order('Clare', 'Favicoin', 'sell', 150, 5)
+    cheap = orders.place_order('Annet', 'Favicoin', 'sell', 140, 5)
+    orders.place_order('Annet', 'Favicoin', 'sell', 170, 5)
+
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 160, 12)
+
+    assert buy['fills'] == [
+        {'price': 140, 'amount': 5},
+        {'price': 150, 'amount': 5},
+        {'price': 150, 'amount': 2},
+    ], 'Wrong fills'
+    open_ids = {order['id'] for order in orders.get_orders('Annet')}
+    assert cheap['id'] not in open_ids, 'The best price was not filled first'
+    assert early['id'] not in open_ids, 'The earlier order was not filled first'
+    assert orders.get_orders('Clare')[0] == {**late, 'remaining': 3}, 'Wrong rest'
+    assert balance('Bella') == BALANCE - (5 * 140 + 7 * 150), 'Wrong cost'
+
+
+def test_sell_matches_bids():
+    orders.place_order('Bella', 'Favicoin', 'buy', 120, 5)
+    orders.place_order('Bella', 'Favicoin', 'buy', 130, 5)
+
+    sell = orders.place_order('Annet', 'Favicoin', 'sell', 125, 8)
+
+    assert sell['fills'] == [{'price': 130, 'amount': 5}], 'Wrong fills'
+    assert sell['remaining'] == 3, 'Wrong remaining'
+    assert orders.get_book('Favicoin') == {
+        'buy': [{'price': 120, 'amount': 5}],
+        'sell': [{'price': 125, 'amount': 3}],
+    }, 'Wrong book'
+    assert balance('Bella') == BALANCE - 5 * 120 - 5 * 130, 'Bids are not reserved'
+
+
+def test_cancel_returns_reserve():
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 100, 10)
+    sell = orders.place_order('Annet', 'Favicoin', 'sell', 300, 10)
+
+    assert orders.cancel_order('Bella', buy['id'])['status'] == 'cancelled'
+    orders.cancel_order('Annet', sell['id'])
+
+    assert balance('Bella') == BALANCE, 'Money was not returned'
+    assert amount('Annet') == 100, 'Crypto was not returned'
+    assert orders.get_book('Favicoin') == {'buy': [], 'sell': []}, 'Wrong book'
+    with pytest.raises(MarketError, match='not open'):
+        orders.cancel_order('Bella', buy['id'])
+    with pytest.raises(MarketError, match='not found'):
+        orders.cancel_order('Annet', buy['id'])
+
+
+@pytest.mark.parametrize(
+    ('login', 'side', 'message'),
+    [('Bella', 'buy', 'Not enough money'), ('Bella', 'sell', 'Not enough crypto')],
+)
+def test_reserve_fail(login, side, message):
+    orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    orders.place_order('Annet', 'Favicoin', 'buy', 50, 10)
+
+    with pytest.raises(MarketError, match=message):
+        orders.place_order(login, 'Favicoin', side, 150, 10**6)
+
+    assert len(orders.load_book(market.get_crypto()[0]['id'])) == 2, 'Book was changed'
+    assert orders.place_order('Bella', 'Favicoin', 'buy', 150, 1)[
+        'fills'
+    ], 'Not restored'
+
+
+def test_book_is_rebuilt():
+    sell = orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    books.reset()
+
+    orders.load_books()
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 150, 10)
+
+    assert buy['fills'] == [{'price': 150, 'amount': 10}], 'Book was not rebuilt'
+    assert orders.get_orders('Annet') == [], 'Order was not filled'
+    assert sell['id'] not in orders.load_book(market.get_crypto()[0]['id']).orders
+
+
+def test_stale_book_is_reloaded():
+    sell = orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    book = orders.load_book(market.get_crypto()[0]['id'])
+    # Cancelled by another process, this book still has it
+    order = book.orders[sell['id']]
+    orders.cancel_order('Annet', sell['id'])
+    book.add(order)
+    orders.place_order('Annet', 'Favicoin', 'sell', 160, 10)
+
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 160, 10)
+
+    assert buy['fills'] == [{'price': 160, 'amount': 10}], 'Stale order was filled'
+    assert books.get(market.get_crypto()[0]['id']) is not book, 'Book was not reloaded'
+
+
+def test_book_of_another_process_is_reloaded():
+    crypto_id = market.get_crypto()[0]['id']
+    book = orders.load_book(crypto_id)
+    # Another process with its own book places an order
+    books.drop(crypto_id)
+    orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    books.drop(crypto_id)
+    books.put(crypto_id, book)
+
+    buy = orders.place_order('Bella', 'Favicoin', 'buy', 150, 10)
+
+    assert buy['fills'] == [{'price': 150, 'amount': 10}], 'Book was not reloaded'
+    assert not book.orders and book.version == 2, 'Wrong book'
+
+
+def test_self_trade_is_rejected():
+    market.add_operation('Bella', 'Favicoin', 'purchase', 10, formatted_now())
+    orders.place_order('Bella', 'Favicoin', 'sell', 140, 10)
+    orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+
+    with pytest.raises(MarketError, match='own order'):
+        orders.place_order('Annet', 'Favicoin', 'buy', 160, 15)
+
+    assert balance('Annet') == BALANCE - 100 * 200, 'Money was reserved'
+    assert orders.get_book('Favicoin') == {
+        'buy': [],
+        'sell': [{'price': 140, 'amount': 10}, {'price': 150, 'amount': 10}],
+    }, 'Book was changed'
+
+
+def test_concurrent_orders():
+    def place(side, price):
+        orders.place_order(
+            'Annet' if side == 'sell' else 'Bella', 'Favicoin', side, price, 1
+        )
+
+    threads = [
+        threading.Thread(target=place, args=(side, 150))
+        for side in ('buy', 'sell')
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert orders.get_book('Favicoin') == {'buy': [], 'sell': []}, 'Orders left'
+    assert amount('Bella') == 20, 'Wrong amount bought'
+    assert balance('Bella') == BALANCE - 20 * 150, 'Wrong balance'
+
+
+def test_unknown_crypto():
+    with pytest.raises(MarketError, match='Crypto not found'):
+        orders.place_order('Annet', 'Unknown', 'buy', 1, 1)
+
+
+def test_routes(client):
+    response = client.post(
+        '/market/users/Annet/orders',
+        json={'crypto_name': 'Favicoin', 'side': 'sell', 'price': 150, 'amount': 10},
+    )
+    order = response.get_json()
+
+    assert response.status_code == 201, 'Wrong status code'
+    assert client.get('/market/users/Annet/orders').get_json() == [order]
+    assert client.get('/market/crypto/Favicoin/book').get_json() == {
+        'buy': [],
+        'sell': [{'price': 150, 'amount': 10}],
+    }, 'Wrong book'
+
+    response = client.delete(f'/market/users/Annet/orders/{order["id"]}')
+    assert response.status_code == 200, 'Wrong status code'
+    assert response.get_json()['status'] == 'cancelled', 'Order was not cancelled'
+
+    response = client.delete(f'/market/users/Annet/orders/{order["id"]}')
+    assert response.status_code == 400, 'Wrong status code'
+
+
+def test_routes_invalid(client):
+    response = client.post(
+        '/market/users/Annet/orders',
+        json={'crypto_name': 'Favicoin', 'side': 'bid', 'price': 0, 'amount': 10},
+    )
+
+    assert response.status_code == 422, 'Wrong status code'
+    assert [error['field'] for error in response.get_json()['errors']] == [
+        'side',
+        'price',
+    ], 'Wrong errors'
+
+
+def test_routes_cost_overflow(client):
+    response = client.post(
+        '/market/users/Bella/orders',
+        json={
+            'crypto_name': 'Favicoin',
+            'side': 'buy',
+            'price': 2**40,
+            'amount': 2**40,
+        },
+    )
+
+    assert response.status_code == 422, 'Wrong status code'
+    assert response.get_json()['errors'][0]['field'] == 'amount', 'Wrong errors'
+    assert balance('Bella') == BALANCE, 'Money was reserved'
@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+from app.market import prices
+
+
+@pytest.mark.parametrize('name', list(prices.MODELS))
+def test_same_seed_gives_same_costs(name):
+    costs = list(range(100, 10100, 100))
+
+    first = prices.make_model(name, seed=1)
+    second = prices.make_model(name, seed=1)
+
+    assert first(costs) == second(costs), 'Costs differ'
+    assert first(costs) == second(costs), 'The next costs differ'
+    assert prices.make_model(name, seed=2)(costs) != first(costs), 'Same costs'
+
+
+@pytest.mark.parametrize('name', list(prices.MODELS))
+def test_cost_is_at_least_one(name):
+    costs = prices.make_model(name, seed=0)([1] * 1000)
+
+    assert min(costs) == 1, 'Cost is less than 1'
+    assert all(isinstance(cost, int) for cost in costs), 'Cost is not integer'
+
+
+def test_uniform_jitter():
+    costs = [1000, 29, 100000] * 1000
+
+    new_costs = prices.UniformJitter(seed=0)(costs)
+
+    for cost, new_cost in zip(costs, new_costs):
+        assert new_cost in {cost * (100 + p) // 100 for p in range(-10, 11)}
+    assert {new - old for old, new in zip(costs, new_costs) if old == 1000} == set(
+        range(-100, 101, 10)
+    ), 'Not every percent was used'
+
+
+@pytest.mark.parametrize(
+    ('drift', 'volatility', 'expected'),
+    [
+        (0.0, 0.0, [100, 12345]),
+        (math.log(2), 0.0, [200, 24690]),
+    ],
+)
+def test_gbm_without_volatility(drift, volatility, expected):
+    model = prices.GeometricBrownianMotion(drift=drift, volatility=volatility)
+
+    assert model([100, 12345]) == expected, 'Wrong drift'
+
+
+def test_gbm_is_lognormal():
+    model = prices.GeometricBrownianMotion(seed=0, drift=0.0, volatility=0.1)
+
+    logs = [math.log(cost / 10**6) for cost in model([10**6] * 10000)]
+
+    mean = sum(logs) / len(logs)
+    deviation = math.sqrt(sum((x - mean) ** 2 for x in logs) / len(logs))
+    assert mean == pytest.approx(-0.005, abs=0.003), 'Wrong mean of log returns'
+    assert deviation == pytest.approx(0.1, rel=0.03), 'Wrong volatility'
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError):
+        prices.make_model('random')
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import text
+
+from app.market import candles, history, market, valuation
+from app.market.database import create_indexes, create_session, engines
+from tests.market.conftest import captured_statements, formatted_now, full_scans
+
+
+def trade():
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'sale', 5, formatted_now())
+
+
+def history_page():
+    _, cursor = history.get_operations_page('Annet', None, 1)
+    history.get_operations_page('Annet', cursor, 1)
+
+
+@pytest.fixture(autouse=True)
+def fill_db():
+    market.add_user('Annet')
+    market.add_user('Bella')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    trade()
+
+
+# Functions reading whole table by design are allowed to scan it
+@pytest.mark.parametrize(
+    ('func', 'allowed_tables'),
+    [
+        (market.get_users, ('user',)),
+        (lambda: market.add_user('Clare'), ()),
+        (lambda: market.get_operations('Annet'), ()),
+        (trade, ()),
+        (lambda: market.get_balance('Annet'), ()),
+        (lambda: market.get_portfolio('Annet'), ()),
+        (lambda: valuation.get_valuation('Annet'), ()),
+        (market.get_crypto, ('crypto',)),
+        (lambda: market.add_crypto('Hellcoin', 600, 300), ()),
+        (lambda: market.update_crypto('Favicoin', 250, 150), ()),
+        (lambda: market.update_all_crypto(lambda costs: costs), ('crypto',)),
+        (history_page, ()),
+        (lambda: list(history.iter_operations('Annet')), ()),
+        (lambda: candles.get_candles('Favicoin', 3600, 0, 7200), ('rate_rollup',)),
+    ],
+)
+def test_no_full_scans(func, allowed_tables):
+    with captured_statements() as statements:
+        func()
+
+    assert statements, 'No statements were captured'
+    assert not full_scans(statements, allowed_tables), 'Query plan has full scan'
+
+
+def test_create_indexes_on_existing_db(app):
+    with create_session() as session:
+        session.execute(text('DROP INDEX ix_operation_user_id_created_id'))
+
+    with captured_statements() as statements:
+        market.get_operations('Annet')
+    assert full_scans(statements), 'Index was not dropped'
+
+    assert create_indexes(engines['write']) == [
+        'ix_operation_user_id_created_id'
+    ], 'Wrong created indexes'
+    result = app.test_cli_runner().invoke(args=['create-indexes'])
+    assert result.output == 'All indexes exist\n', 'Wrong output'
+
+    with captured_statements() as statements:
+        market.get_operations('Annet')
+    assert not full_scans(statements), 'Query plan has full scan'
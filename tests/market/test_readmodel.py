@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import update
+
+from app.market import bulk, market, orders, readmodel
+from app.market.cache import UserSnapshot, UserTable, users
+from app.market.database import create_session
+from app.market.exceptions import DatabaseError
+from app.market.models import User
+from tests.market.conftest import captured_statements, formatted_now
+
+BALANCE = 100000
+
+
+@pytest.fixture(autouse=True)
+def fill_db(monkeypatch):
+    monkeypatch.setattr('app.market.readmodel.MARKET_READ_MODEL', True)
+    market.add_user('Annet')
+    market.add_user('Bella')
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+
+
+def read_all():
+    return market.get_users(), [
+        (market.get_balance(login), market.get_portfolio(login))
+        for login in ('Annet', 'Bella')
+    ]
+
+
+def change_balance_elsewhere(login, balance):
+    '''
+    Write of another process, it doesn't invalidate read model
+    '''
+    with create_session() as session:
+        session.execute(update(User).where(User.login == login).values(balance=balance))
+
+
+@pytest.mark.parametrize(
+    'func',
+    [
+        market.get_users,
+        lambda: market.get_balance('Annet'),
+        lambda: market.get_portfolio('Annet'),
+    ],
+)
+def test_reads_dont_use_db(func):
+    market.get_users()
+
+    with captured_statements() as statements:
+        func()
+
+    assert not statements, 'Read model was not used'
+
+
+def test_same_results_as_db(monkeypatch):
+    market.add_operation('Annet', 'Geckcoin', 'purchase', 3, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+    market.add_operation('Annet', 'Favicoin', 'sale', 10, formatted_now())
+    from_model = read_all()
+
+    monkeypatch.setattr('app.market.readmodel.MARKET_READ_MODEL', False)
+
+    assert from_model == read_all(), 'Read model differs from DB'
+
+
+def test_trade_is_seen_at_once():
+    market.get_users()
+    market.get_portfolio('Annet')
+
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+
+    assert market.get_balance('Annet') == {'balance': BALANCE - 2000}
+    assert market.get_portfolio('Annet') == [
+        {'user_id': 1, 'crypto_id': 1, 'amount': 10}
+    ], 'Portfolio is stale'
+    assert market.get_users()[0]['balance'] == BALANCE - 2000, 'Users are stale'
+
+
+def test_fill_is_seen_by_maker():
+    market.add_operation('Annet', 'Favicoin', 'purchase', 10, formatted_now())
+    orders.place_order('Annet', 'Favicoin', 'sell', 150, 10)
+    market.get_balance('Annet')
+
+    orders.place_order('Bella', 'Favicoin', 'buy', 150, 10)
+
+    assert market.get_balance('Annet') == {'balance': BALANCE - 2000 + 1500}
+
+
+def test_write_of_other_process_is_seen_after_max_age(monkeypatch):
+    market.get_users()
+    change_balance_elsewhere('Annet', 5)
+
+    assert market.get_balance('Annet') == {'balance': BALANCE}, 'Read model missed'
+
+    monkeypatch.setattr(users, 'max_age', 0.0)
+
+    assert market.get_balance('Annet') == {'balance': 5}, 'Stale balance'
+    assert market.get_users()[0]['balance'] == 5, 'Stale users'
+
+
+def test_new_users_are_listed():
+    market.get_users()
+
+    market.add_user('Clare')
+    bulk.add_users([{'login': 'Diana'}])
+
+    assert [user['login'] for user in market.get_users()] == [
+        'Annet',
+        'Bella',
+        'Clare',
+        'Diana',
+    ], 'New users are missing'
+
+
+def test_stale_users_are_reloaded_by_id():
+    market.get_users()
+    market.add_operation('Bella', 'Favicoin', 'purchase', 1, formatted_now())
+
+    with captured_statements() as statements:
+        assert market.get_users()[1]['balance'] == BALANCE - 200
+
+    selects = [s for s, _ in statements if s.startswith('SELECT')]
+    assert len(selects) == 2, 'Users were not reloaded together'
+    assert all('IN (?)' in select for select in selects), 'Users were fully reloaded'
+
+
+def test_unknown_user_falls_back_to_db():
+    with pytest.raises(DatabaseError):
+        market.get_balance('Clare')
+
+    assert market.get_portfolio('Clare') == [], 'Wrong portfolio'
+
+
+def test_rebuild_loads_all_users():
+    users.reset()
+
+    readmodel.rebuild()
+
+    assert users.get('Annet') is not None and users.get('Bella') is not None
+    assert users.all() is not None, 'Users are incomplete'
+
+
+def test_snapshot_is_consistent():
+    market.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+    stop = threading.Event()
+    errors = []
+
+    def trade():
+        while not stop.is_set():
+            market.add_operation('Annet', 'Favicoin', 'purchase', 1, formatted_now())
+
+    def read():
+        while not stop.is_set():
+            with create_session(readonly=True) as session:
+                snapshot = readmodel.get_user(session, 'Annet')
+            assert snapshot is not None
+            amount = dict(snapshot.portfolio)[1]
+            if snapshot.balance + amount * 200 != BALANCE:
+                errors.append(snapshot)
+
+    threads = [threading.Thread(target=trade)] + [
+        threading.Thread(target=read) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, 'Balance and portfolio are of different transactions'
+    assert market.get_balance('Annet')['balance'] < BALANCE - 200, 'No trades'
+
+
+def test_user_table():
+    table = UserTable(max_age=60)
+    now = time.monotonic()
+    old = UserSnapshot(1, 'Annet', 10, (), now - 1)
+    new = UserSnapshot(1, 'Annet', 20, (), now)
+
+    table.store([new, old])
+    assert table.get('Annet') == new, 'Newer snapshot was replaced'
+    assert table.all() is None, 'Users are complete'
+
+    table.invalidate([1])
+    assert table.get('Annet') is None, 'Changed user is fresh'
+    assert table.stale() == {1}, 'Changed user is not stale'
+
+    table.store_all([old], now - 2)
+    assert table.all() == [new], 'Snapshot stored during load was lost'
+
+    reloaded = UserSnapshot(1, 'Annet', 30, (), time.monotonic())
+    table.store([reloaded])
+    assert table.get('Annet') == reloaded, 'Reloaded snapshot is not fresh'
+    assert not table.stale(), 'Reloaded user is stale'
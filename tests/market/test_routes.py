@@ -89,6 +89,12 @@ def test_users_operations_post(client):
             'amount': 10,
             # 'time_str': formatted_now(),
         },
+        {
+            'crypto_name': 'Favicoin',
+            'operation_type': 'purchase',
+            'amount': 2**62,
+            'time_str': formatted_now(),
+        },
     ],
 )
 def test_users_operations_post_invalid(client, json):
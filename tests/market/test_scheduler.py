@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from app.market.scheduler import Due, Schedule
+
+
+@pytest.fixture(name='schedule')
+def fixture_schedule():
+    return Schedule(random.Random(0))
+
+
+def test_due_times_dont_drift(schedule):
+    schedule.add(1, 10, now=0, within=0)
+
+    (due,) = schedule.pop_due(0.7)
+    assert (due.key, due.missed) == (1, 0)
+    assert due.lateness == pytest.approx(0.7), 'Wrong lateness'
+    assert schedule.next_due() == 10, 'Due time moved by lateness'
+    assert schedule.pop_due(9.9) == [], 'Popped before due time'
+    assert [due.key for due in schedule.pop_due(10.3)] == [1]
+    assert schedule.next_due() == 20, 'Due time moved by lateness'
+
+
+def test_missed_intervals_are_skipped(schedule):
+    schedule.add(1, 10, now=0, within=0)
+
+    assert schedule.pop_due(35) == [Due(1, 35, 3)], 'Wrong missed count'
+    assert schedule.next_due() == 40, 'Missed intervals were not skipped'
+
+
+def test_phases_are_spread(schedule):
+    for key in range(1000):
+        schedule.add(key, 10, now=100, within=10)
+
+    due = [schedule.next_due()]
+    seconds = set()
+    while due[-1] is not None and due[-1] < 110:
+        (_,) = schedule.pop_due(due[-1])
+        seconds.add(int(due[-1] - 100))
+        due.append(schedule.next_due())
+
+    assert len(due) == 1001, 'Phase is out of interval'
+    assert seconds == set(range(10)), 'Phases are not spread'
+
+
+@pytest.mark.parametrize(
+    ('ahead', 'limit', 'keys'),
+    [(0, 0, [1]), (1, 0, [1, 2]), (1, 1, [1]), (5, 0, [1, 2, 3])],
+)
+def test_pop_due_ahead_and_limit(schedule, ahead, limit, keys):
+    for key in (1, 2, 3):
+        schedule.add(key, 10, now=key - 1, within=0)
+
+    assert [item.key for item in schedule.pop_due(0, ahead, limit)] == keys
+
+
+def test_remove_and_add_again(schedule):
+    schedule.add(1, 10, now=0, within=0)
+    schedule.add(2, 10, now=5, within=0)
+    schedule.remove(1)
+
+    assert 1 not in schedule and len(schedule) == 1
+    assert schedule.next_due() == 5, 'Removed key is due'
+
+    schedule.add(1, 10, now=7, within=0)
+    assert [item.key for item in schedule.pop_due(8)] == [2, 1]
+    assert schedule.keys() == {1, 2}
+
+
+def test_set_interval(schedule):
+    schedule.add(1, 10, now=0, within=0)
+    schedule.set_interval(1, 2)
+
+    schedule.pop_due(0)
+
+    assert schedule.next_due() == 2, 'New interval is not used'
+
+
+def test_empty(schedule):
+    assert schedule.next_due() is None
+    assert schedule.pop_due(100) == []
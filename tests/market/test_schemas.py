@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+
+from app.market import schemas
+from app.market.config import MARKET_BATCH_MAX_SIZE
+from app.market.exceptions import ValidationError
+from app.market.schemas import parse_time
+
+TIME = datetime(2022, 3, 1, 12, 0, 10)
+
+
+@pytest.mark.parametrize(
+    'value',
+    [
+        'Tue, 01 Mar 2022 12:00:10 GMT',
+        '2022-03-01T12:00:10',
+        '2022-03-01T12:00:10Z',
+        '2022-03-01T15:00:10+03:00',
+        1646136010,
+        1646136010.0,
+        '1646136010',
+    ],
+)
+def test_parse_time(value):
+    assert parse_time(value) == TIME, 'Wrong time'
+
+
+@pytest.mark.parametrize(
+    'value',
+    [
+        'Tue, 31 Feb 2022 12:00:10 GMT',
+        'Tue, 01 Mar 2022 12:00 GMT',
+        '2022-13-01T12:00:10',
+        'yesterday',
+        '',
+        10**20,
+        True,
+        None,
+        [],
+    ],
+)
+def test_parse_time_invalid(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def errors(validator, data):
+    with pytest.raises(ValidationError) as error:
+        validator(data)
+    return {item['field']: item['message'] for item in error.value.errors}
+
+
+def test_operation():
+    data = {
+        'crypto_name': 'Favicoin',
+        'operation_type': 'sale',
+        'amount': 10,
+        'time_str': '2022-03-01T12:00:10',
+    }
+
+    assert schemas.operation(data) == {**data, 'time_str': TIME}, 'Wrong values'
+
+
+@pytest.mark.parametrize(
+    ('data', 'expected'),
+    [
+        (None, {'': 'must be an object'}),
+        ([], {'': 'must be an object'}),
+        ({}, {'login': 'is required'}),
+        ({'login': ''}, {'login': 'must be at least 1 long'}),
+        ({'login': 'A' * 51}, {'login': 'must be at most 50 long'}),
+        ({'login': 1}, {'login': 'must be a string'}),
+    ],
+)
+def test_user_invalid(data, expected):
+    assert errors(schemas.user, data) == expected, 'Wrong errors'
+
+
+@pytest.mark.parametrize(
+    ('field', 'value', 'message'),
+    [
+        ('purchase_cost', 0, 'must be at least 1'),
+        ('purchase_cost', True, 'must be an integer'),
+        ('purchase_cost', '100', 'must be an integer'),
+        ('sale_cost', 2**63, f'must be at most {2**63 - 1}'),
+    ],
+)
+def test_crypto_invalid(field, value, message):
+    data = {'crypto_name': 'Favicoin', 'purchase_cost': 200, 'sale_cost': 100}
+
+    assert errors(schemas.crypto, {**data, field: value}) == {field: message}
+
+
+def test_operations_batch_defaults():
+    operation = {
+        'crypto_name': 'Favicoin',
+        'operation_type': 'purchase',
+        'amount': 1,
+        'time_str': 1646136010,
+    }
+
+    data = schemas.operations_batch({'operations': [operation]})
+
+    assert data == {'operations': [{**operation, 'time_str': TIME}], 'atomic': True}
+
+
+@pytest.mark.parametrize(
+    ('operations', 'expected'),
+    [
+        ({}, {'operations': 'must be a list'}),
+        ([], {'operations': f'must have from 1 to {MARKET_BATCH_MAX_SIZE} items'}),
+        ([1], {'operations[0]': 'must be an object'}),
+        (
+            [{'operation_type': 'gift', 'amount': 0, 'time_str': 'now'}],
+            {
+                'operations[0].crypto_name': 'is required',
+                'operations[0].operation_type': 'must be one of purchase, sale',
+                'operations[0].amount': 'must be at least 1',
+                'operations[0].time_str': 'must be unix time, ISO 8601 or HTTP date',
+            },
+        ),
+    ],
+)
+def test_operations_batch_invalid(operations, expected):
+    assert errors(schemas.operations_batch, {'operations': operations}) == expected
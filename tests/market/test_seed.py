@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from sqlalchemy import case, func, select
+
+from app.market import market
+from app.market.database import create_session
+from app.market.models import Operation, Portfolio
+from app.market.seed import seed_db
+from tests.market.conftest import formatted_now
+
+
+def dump():
+    # Rates are seeded as updated now
+    crypto = [
+        {k: v for k, v in row.items() if k != 'last_updated'}
+        for row in market.get_crypto()
+    ]
+    return (
+        market.get_users(),
+        crypto,
+        [market.get_operations(user['login']) for user in market.get_users()],
+        [market.get_portfolio(user['login']) for user in market.get_users()],
+    )
+
+
+@pytest.mark.parametrize(
+    ('args', 'counts'),
+    [
+        ((5, 3, 100), (5, 3, 15, 100)),
+        ((5, 3, 7, 5), (5, 3, 15, 7)),
+        ((4, 2, 9, 1, 0, 2), (4, 2, 4, 9)),
+        ((3, 1, 0), (3, 1, 3, 0)),
+    ],
+)
+def test_seed_db(args, counts):
+    result = seed_db(*args)
+
+    assert result == dict(
+        zip(('users', 'crypto', 'portfolio', 'operations'), counts)
+    ), 'Wrong numbers of rows'
+    users, crypto, operations, portfolio = dump()
+    assert (
+        len(users),
+        len(crypto),
+        sum(map(len, portfolio)),
+        sum(map(len, operations)),
+    ) == counts, 'Wrong rows'
+
+
+def test_seed_db_is_deterministic():
+    seed_db(5, 3, 100, seed=1)
+    first = dump()
+    seed_db(5, 3, 100, seed=1)
+    assert dump() == first, 'The same seed gave other rows'
+
+    seed_db(5, 3, 100, seed=2)
+    assert dump() != first, 'Another seed gave the same rows'
+
+
+def test_seed_db_portfolio_is_sum_of_operations():
+    seed_db(10, 5, 1000)
+
+    signed = case(
+        (Operation.operation_type == 'sale', -Operation.amount),
+        else_=Operation.amount,
+    )
+    with create_session(readonly=True) as session:
+        sums = session.execute(
+            select(Operation.user_id, Operation.crypto_id, func.sum(signed)).group_by(
+                Operation.user_id, Operation.crypto_id
+            )
+        ).all()
+        portfolio = session.execute(
+            select(Portfolio.user_id, Portfolio.crypto_id, Portfolio.amount)
+        ).all()
+
+    assert sorted(sums) == sorted(portfolio), 'Portfolio differs from operations'
+
+
+def test_seeded_user_can_trade():
+    seed_db(2, 2, 10)
+    crypto_id = market.get_portfolio('user0')[0]['crypto_id']
+
+    market.add_operation('user0', f'coin{crypto_id - 1}', 'sale', 1, formatted_now())
+
+    # 10 operations over 4 portfolios, the first two get 3
+    assert len(market.get_operations('user0')) == 7, 'Operation was not added'
+
+
+def test_seed_db_command(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['seed-db', '--users', '3', '--operations', '30'])
+
+    report = json.loads(result.output)
+    assert (report['users'], report['operations']) == (3, 30), 'Wrong report'
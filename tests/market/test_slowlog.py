@@ -0,0 +1,144 @@
+import json
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from app.market import market, slowlog
+
+
+@pytest.fixture(autouse=True)
+def reset_slowlog():
+    slowlog.reset()
+
+
+@pytest.fixture
+def all_slow(monkeypatch):
+    monkeypatch.setattr('app.market.slowlog.MARKET_SLOW_QUERY_THRESHOLD', 0)
+
+
+@pytest.mark.parametrize(
+    ('statement', 'expected'),
+    [
+        (
+            'SELECT * FROM user WHERE login = ?  LIMIT 10',
+            'SELECT * FROM user WHERE login = ? LIMIT ?',
+        ),
+        (
+            "SELECT id FROM crypto WHERE name IN ('coin1', 'it''s', 2.5)",
+            'SELECT id FROM crypto WHERE name IN (?...)',
+        ),
+        (
+            'SELECT id FROM crypto WHERE id IN (?, ?, ?)',
+            'SELECT id FROM crypto WHERE id IN (?...)',
+        ),
+        (
+            'INSERT INTO portfolio (user_id, crypto_id) VALUES (?, ?), (?, ?), (?, ?)',
+            'INSERT INTO portfolio (user_id, crypto_id) VALUES (?...)...',
+        ),
+        ('SELECT anon_1.user1 FROM anon_1', 'SELECT anon_1.user1 FROM anon_1'),
+    ],
+)
+def test_fingerprint(statement, expected):
+    assert slowlog.fingerprint(statement) == expected, 'Wrong fingerprint'
+
+
+@pytest.mark.parametrize(
+    ('parameters', 'executemany', 'shape'),
+    [
+        ((1, 'a', None), False, '(int, str, None)'),
+        ((), False, '()'),
+        ({'login': 'a', 'id': 1}, False, '{login: str, id: int}'),
+        ([(1, 'a'), (2, 'b')], True, '2 x (int, str)'),
+        ([], True, '0 x ()'),
+    ],
+)
+def test_parameters_shape(parameters, executemany, shape):
+    assert slowlog.parameters_shape(parameters, executemany) == shape, 'Wrong shape'
+
+
+def test_aggregates():
+    for duration in range(1, 101):
+        slowlog.record('SELECT 1', (), duration / 1000)
+    slowlog.record('SELECT 2', (), 1)
+
+    queries = slowlog.top()
+
+    assert [query['fingerprint'] for query in queries] == ['SELECT ?'], 'Not merged'
+    last_slow = queries[0].pop('last_slow')
+    assert queries[0] == pytest.approx(
+        {
+            'fingerprint': 'SELECT ?',
+            'count': 101,
+            'slow': 2,
+            'total_ms': 6050,
+            'max_ms': 1000,
+            'p95_ms': 96,
+        }
+    ), 'Wrong aggregates'
+    assert last_slow['duration_ms'] == 1000, 'Wrong last slow query'
+
+
+@pytest.mark.usefixtures('all_slow')
+def test_slow_query_log(client, caplog):
+    market.add_user('Annet')
+    caplog.clear()
+
+    client.get('/market/users')
+
+    entries = [
+        r.slow_query
+        for r in caplog.records
+        if getattr(r, 'slow_query', {}).get('fingerprint', '').startswith('SELECT')
+    ]
+    assert entries, 'Slow query was not logged'
+    assert entries[0]['caller'] == 'market.get_users', 'Wrong caller'
+    assert entries[0]['route'] == 'GET /market/users', 'Wrong route'
+
+
+def test_fast_query_is_not_logged(caplog):
+    market.get_users()
+
+    assert not any(hasattr(r, 'slow_query') for r in caplog.records), 'Logged'
+    assert slowlog.top()[0]['last_slow'] is None, 'Counted as slow'
+
+
+@pytest.mark.usefixtures('all_slow')
+def test_slow_queries_route(client):
+    market.add_user('Annet')
+    market.get_users()
+
+    response = client.get('/market/slow-queries?sort=count&limit=1')
+    assert response.status_code == 200
+    (query,) = response.get_json()
+    assert query['count'] >= 1 and query['last_slow']['route'] is None
+
+    assert client.delete('/market/slow-queries').status_code == 405, 'Reset'
+
+
+@pytest.mark.parametrize('query', ['sort=time', 'limit=x', 'limit=0'])
+def test_slow_queries_route_wrong_args(client, query):
+    assert client.get(f'/market/slow-queries?{query}').status_code == 422
+
+
+@pytest.mark.parametrize('args', [['--json'], ['--sort', 'max_ms']])
+@pytest.mark.usefixtures('all_slow')
+def test_slow_queries_command(app, args):
+    market.add_user('Annet')
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_port}'
+        result = app.test_cli_runner().invoke(
+            args=['slow-queries', '--url', url, *args]
+        )
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert result.exit_code == 0, result.output
+    if '--json' in args:
+        assert json.loads(result.output)[0]['count'] >= 1, 'Wrong queries'
+    else:
+        assert 'INSERT INTO user' in result.output, 'Wrong queries'
@@ -0,0 +1,221 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.market import cache, market, metrics, updates
+from app.market.cache import Rate, rates
+from app.market.database import create_session
+from app.market.exceptions import DatabaseError
+from app.market.models import Crypto
+from app.market.updates import TICK_DURATION
+
+# Saved before 'app' fixture replaces it
+run_updates = updates.run_updates
+run_follower = updates.run_follower
+
+
+def test_jitter():
+    costs = updates.price_model([100, 1000, 1])
+
+    assert 90 <= costs[0] <= 110, 'Cost changed too much'
+    assert 900 <= costs[1] <= 1100, 'Cost changed too much'
+    assert costs[2] == 1, 'Cost is less than 1'
+
+
+def test_tick_success():
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+
+    stats = updates.tick()
+
+    assert stats.rows == 2, 'Wrong number of updated rows'
+    assert updates.last_tick == stats, 'Stats are not exposed'
+    with create_session() as session:
+        crypto = session.query(Crypto).order_by(Crypto.id).all()
+        cached = [rates.get('Favicoin'), rates.get('Geckcoin')]
+        assert [c.purchase_cost for c in crypto] == [
+            r and r.purchase_cost for r in cached
+        ], 'Rates are not published'
+        assert len({c.last_updated for c in crypto}) == 1, 'Rates updated separately'
+
+
+def test_tick_empty():
+    assert updates.tick().rows == 0, 'Wrong number of updated rows'
+
+
+def test_update_all_crypto_consistent():
+    market.add_crypto('Favicoin', 200, 100)
+
+    market.update_all_crypto(lambda costs: [cost * 2 for cost in costs])
+
+    assert market.get_crypto()[0]['purchase_cost'] == 400, 'Wrong purchase_cost'
+    assert market.get_crypto()[0]['sale_cost'] == 200, 'Wrong sale_cost'
+
+
+@pytest.mark.parametrize('full', [True, False])
+def test_update_all_crypto_completes_cache(full):
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    ids = None if full else [market.get_crypto()[0]['id']]
+    rates.invalidate()
+
+    market.update_all_crypto(lambda costs: costs, ids=ids)
+
+    assert (rates.all() is not None) == full, 'Wrong completeness of cache'
+
+
+@pytest.fixture(name='updater')
+def fixture_updater():
+    rate_updater = updates.RateUpdater()
+    yield rate_updater
+    rate_updater.stop()
+
+
+def test_tick_of_some_crypto():
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    favicoin, geckcoin = market.get_crypto()
+
+    stats = updates.tick([favicoin['id']])
+
+    assert stats.rows == 1, 'Wrong number of updated rows'
+    assert market.get_crypto()[1] == geckcoin, 'Other rate was updated'
+
+
+def test_sync(updater, monkeypatch):
+    monkeypatch.setitem(updates.MARKET_RATE_INTERVALS, 'Geckcoin', timedelta(seconds=3))
+    market.add_crypto('Favicoin', 200, 100)
+    market.add_crypto('Geckcoin', 400, 200)
+    with create_session() as session:
+        session.execute(
+            update(Crypto)
+            .where(Crypto.name == 'Favicoin')
+            .values(last_updated=datetime(2022, 1, 1))
+        )
+    cache.reset()
+
+    updater.sync(now=100)
+
+    interval = updates.MARKET_RATE_INTERVAL.total_seconds()
+    due = updater.schedule.pop_due(100, interval)
+    geckcoin = [item.lateness for item in due if item.key == 2]
+    assert {item.key for item in due} == {1, 2}, 'Crypto was not scheduled'
+    # Fresh rate is due before it's older than its interval
+    assert -3 <= geckcoin[0] <= 0, 'Wrong phase of fresh rate'
+    assert geckcoin[1] == pytest.approx(geckcoin[0] - 3), 'Wrong interval'
+
+    with create_session() as session:
+        session.execute(delete(Crypto).where(Crypto.name == 'Favicoin'))
+    cache.reset()
+    updater.sync(now=101)
+
+    assert updater.schedule.keys() == {2}, 'Deleted crypto was not removed'
+
+
+def test_step_updates_due_rates(updater, mocker, caplog):
+    tick = mocker.patch('app.market.updates.tick')
+    updater.schedule.add(1, 9, now=time.monotonic() - 95, within=0)
+    # Scheduled rate isn't in DB, so it's kept only without sync
+    mocker.patch.object(updater, 'sync')
+    metrics.reset()
+
+    updater.step()
+
+    tick.assert_called_once_with([1])
+    text = metrics.render()
+    assert 'market_rate_missed_deadlines_total 10' in text, 'Missed are not counted'
+    assert 'market_rate_update_lateness_seconds_count 1' in text
+    assert 'Missed 10 updates of rates' in caplog.text, 'Missed are not logged'
+
+
+def test_step_waits_for_due_time(updater, mocker):
+    tick = mocker.patch('app.market.updates.tick')
+    wait = mocker.patch.object(updater.stopped, 'wait')
+
+    updater.step()
+
+    assert not tick.called, 'Updated without due rates'
+    assert wait.call_args.args[0] == pytest.approx(
+        updates.MARKET_RATE_SYNC_INTERVAL.total_seconds(), abs=0.1
+    ), 'Wrong wait until sync'
+
+
+def test_updater_survives_errors(updater, mocker, monkeypatch):
+    monkeypatch.setattr(updates, 'MARKET_RATE_BATCH_WINDOW', 0)
+    results = iter([DatabaseError('locked'), None])
+
+    def step():
+        error = next(results)
+        if error is not None:
+            raise error
+        updater.stopped.set()
+
+    mocker.patch.object(updater, 'step', side_effect=step)
+    metrics.reset()
+
+    updater.run()
+
+    assert next(results, 'done') == 'done', 'Updater stopped on error'
+    assert 'market_rate_tick_errors_total 1' in metrics.render()
+
+
+def test_run_updates(monkeypatch):
+    monkeypatch.setattr(updates, 'MARKET_RATE_INTERVAL', timedelta(milliseconds=50))
+    monkeypatch.setattr(updates, 'MARKET_RATE_BATCH_WINDOW', 0.01)
+    market.add_crypto('Favicoin', 200, 100)
+    metrics.reset()
+
+    updater = run_updates()
+    try:
+        assert run_updates() is updater, 'Another updater was started'
+        time.sleep(0.5)
+    finally:
+        updates.stop_updates(timeout=5)
+
+    assert not updater.is_alive(), 'Updater was not stopped'
+    ticks = dict((suffix, value) for suffix, _, _, value in TICK_DURATION.samples())
+    assert ticks['_count'] >= 3, 'Rates were not updated every interval'
+
+
+def test_follow_publishes_rates_of_other_process(mocker):
+    market.add_crypto('Favicoin', 200, 100)
+    market.get_crypto()
+    with create_session() as session:
+        session.execute(update(Crypto).values(purchase_cost=300))
+    published: list[Rate] = []
+    mocker.patch.object(rates, '_listeners', [published.extend])
+
+    updates.follow()
+
+    rate = rates.get('Favicoin')
+    assert rate is not None and rate.purchase_cost == 300, 'Rate was not reloaded'
+    assert [rate.purchase_cost for rate in published] == [300], 'Not published'
+
+
+def test_follower_survives_errors(mocker):
+    follower = updates.RateFollower(interval=0)
+    results = iter([DatabaseError('locked'), None])
+
+    def follow():
+        error = next(results)
+        if error is not None:
+            raise error
+        follower.stopped.set()
+
+    mocker.patch('app.market.updates.follow', side_effect=follow)
+
+    follower.run()
+
+    assert next(results, 'done') == 'done', 'Follower stopped on error'
+
+
+def test_run_follower():
+    follower = run_follower()
+    try:
+        assert run_follower() is follower, 'Another follower was started'
+    finally:
+        updates.stop_follower(timeout=5)
+
+    assert not follower.is_alive(), 'Follower was not stopped'